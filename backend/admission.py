@@ -0,0 +1,239 @@
+"""
+SUMI X Orator - Admission control
+Cost-weighted token buckets (per guest session, per store and global) plus priority
+lanes over a shared pool of in-flight cost units. Staff admin requests are
+admitted first, then interactive guest calls, then background writes. When a
+request can't be admitted in time it raises Overloaded with a Retry-After
+hint, and endpoints degrade (canned reply, untranslated text) or return 503.
+
+Environment:
+  ADMISSION_CAPACITY     cost units allowed in flight (chat = 10)
+  SESSION_RATE / SESSION_BURST   per-session refill (units/min) and bucket size
+  GLOBAL_RATE / GLOBAL_BURST     whole-server refill (units/min) and bucket size
+  (per-store buckets: TENANT_RATE / TENANT_BURST, see tenants.py)
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import Request
+
+from metrics import Counter, Gauge, Histogram
+
+ADMISSION_CAPACITY = float(os.getenv("ADMISSION_CAPACITY", "100"))
+SESSION_RATE = float(os.getenv("SESSION_RATE", "60"))
+SESSION_BURST = float(os.getenv("SESSION_BURST", "40"))
+GLOBAL_RATE = float(os.getenv("GLOBAL_RATE", "1200"))
+GLOBAL_BURST = float(os.getenv("GLOBAL_BURST", "300"))
+MAX_SESSIONS = 5000
+
+SESSION_HEADER = "X-Session-ID"
+
+# Relative cost of one call: roughly upstream seconds x worker time
+ROUTE_COSTS = {
+    "chat": 10.0,
+    "train": 10.0,
+    "translate": 6.0,
+    "tts": 4.0,
+    "analytics": 1.0,
+    "rating": 1.0,
+    "menu": 1.0,
+    "availability": 0.5,
+    "staff": 1.0,
+}
+
+# Lane -> (priority, max queue wait in seconds); lower priority value goes first
+LANES = {
+    "staff": (0, 15.0),
+    "interactive": (1, 8.0),
+    "background": (2, 2.0),
+}
+ROUTE_LANES = {
+    "chat": "interactive", "train": "interactive", "translate": "interactive", "tts": "interactive",
+    "menu": "interactive", "availability": "background", "analytics": "background",
+    "rating": "background", "staff": "staff",
+}
+
+ADMISSION_DECISIONS = Counter(
+    "sumi_admission_total", "Admission decisions by route and outcome.", ("route", "outcome"))
+ADMISSION_QUEUED = Gauge(
+    "sumi_admission_queued", "Requests waiting in each priority lane.", ("lane",))
+ADMISSION_WAIT = Histogram(
+    "sumi_admission_wait_seconds", "Time spent queued before admission.", ("lane",),
+    buckets=(0.005, 0.05, 0.25, 1, 2.5, 5, 10, 15))
+
+
+class Overloaded(Exception):
+    """Raised when a request is refused; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class TokenBucket:
+    """Refills `rate` units per minute up to `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` units are available (0 = available now)."""
+        self._refill(time.monotonic())
+        missing = min(cost, self.burst) - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate if self.rate else float("inf")
+
+    def take(self, cost: float):
+        self.tokens -= min(cost, self.burst)
+
+
+class PriorityLanes:
+    """In-flight cost budget handed out by lane priority, FIFO within a lane.
+    All methods run on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.in_flight = 0.0
+        self._waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.queued = {lane: 0 for lane in LANES}
+        for lane in LANES:
+            ADMISSION_QUEUED.labels(lane=lane).set_function(lambda lane=lane: self.queued[lane])
+
+    def _fits(self, cost: float) -> bool:
+        # A single request larger than the pool still runs when the pool is idle
+        return self.in_flight + cost <= self.capacity or self.in_flight == 0
+
+    async def acquire(self, lane: str, cost: float):
+        priority, max_wait = LANES[lane]
+        if not self._waiters and self._fits(cost):
+            self.in_flight += cost
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), cost, future)
+        heapq.heappush(self._waiters, entry)
+        self.queued[lane] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return  # granted just as the wait timed out
+            future.cancel()
+            raise Overloaded(f"{lane} lane full", retry_after=max_wait / 2)
+        except asyncio.CancelledError:
+            # Client went away while queued: hand back units granted in the meantime
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.queued[lane] -= 1
+
+    def release(self, cost: float):
+        self.in_flight = max(0.0, self.in_flight - cost)
+        while self._waiters:
+            _, _, next_cost, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(next_cost):
+                break
+            heapq.heappop(self._waiters)
+            self.in_flight += next_cost
+            future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lanes = PriorityLanes(ADMISSION_CAPACITY)
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._sessions: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def _session_bucket(self, key: str) -> TokenBucket:
+        bucket = self._sessions.get(key)
+        if bucket is None:
+            bucket = self._sessions[key] = TokenBucket(SESSION_RATE, SESSION_BURST)
+            if len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        return bucket
+
+    @asynccontextmanager
+    async def admit(self, request: Request, route: str):
+        """Check the caller, store and global buckets, wait for a lane, then charge
+        the route's cost and hold its cost units for the duration of the block.
+        """
+        cost = ROUTE_COSTS[route]
+        lane = ROUTE_LANES[route]
+        buckets: list[TokenBucket] = []
+        if lane != "staff":
+            # Staff toggles are never throttled by guest traffic
+            session = self._session_bucket(client_key(request))
+            wait = session.wait_time(cost)
+            if wait:
+                ADMISSION_DECISIONS.labels(route=route, outcome="session_limited").inc()
+                raise Overloaded("session rate limit", retry_after=wait)
+            # Set by main.get_tenant: one busy store can't use up the whole server
+            store = getattr(getattr(request.state, "tenant", None), "bucket", None)
+            if store is not None:
+                wait = store.wait_time(cost)
+                if wait:
+                    ADMISSION_DECISIONS.labels(route=route, outcome="tenant_limited").inc()
+                    raise Overloaded("restaurant busy", retry_after=wait)
+            wait = self.global_bucket.wait_time(cost)
+            if wait:
+                ADMISSION_DECISIONS.labels(route=route, outcome="global_limited").inc()
+                raise Overloaded("server busy", retry_after=wait)
+            buckets = [session, self.global_bucket] + ([store] if store is not None else [])
+        start = time.perf_counter()
+        try:
+            await self.lanes.acquire(lane, cost)
+        except Overloaded:
+            ADMISSION_DECISIONS.labels(route=route, outcome="queue_timeout").inc()
+            raise
+        # Charged only once admitted, so a queue timeout costs no tokens. Requests that
+        # passed the check together may overdraw a bucket; it refills from below zero.
+        for bucket in buckets:
+            bucket.take(cost)
+        ADMISSION_WAIT.labels(lane=lane).observe(time.perf_counter() - start)
+        ADMISSION_DECISIONS.labels(route=route, outcome="admitted").inc()
+        try:
+            yield
+        finally:
+            self.lanes.release(cost)
+
+
+def client_key(request: Request) -> str:
+    """Guest session header when present (phones sharing restaurant Wi-Fi),
+    else the client IP, scoped to the store. Only for the admission buckets:
+    the header is client-controlled, so the slowapi hourly caps key on the IP.
+    """
+    tenant_id = getattr(request.state, "tenant_id", None)
+    prefix = f"{tenant_id}/" if tenant_id else ""
+    session = request.headers.get(SESSION_HEADER, "").strip()
+    if session:
+        return f"{prefix}s:{session[:64]}"
+    return f"{prefix}ip:{request.client.host if request.client else '127.0.0.1'}"
+
+
+controller = AdmissionController()
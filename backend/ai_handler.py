@@ -11,10 +11,24 @@ import logging
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-import google.generativeai as genai
+import usage
+from coalesce import SingleFlight
+from history import HistoryManager
+from menu_index import menu_window
+from gemini_client import get_genai
+from metrics import CACHE_EVENTS, track_upstream
+from model_router import MODEL_ROUTES, ROUTES, Route, choose_route, format_violations
+from resilience import GEMINI, CircuitOpenError
+from tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# Served whenever Gemini fails, times out or its circuit breaker is open
+FALLBACK_REPLY = (
+    "Oops, I'm having a little trouble right now! "
+    "Please ask our amazing staff directly - they'll take great care of you!"
+)
+
 SYSTEM_TEMPLATE = """\
 == 絶対ルール（これを最優先で守れ） ==
 1. 返答は400文字以内、3-5文。これを超えたら失格。
@@ -107,48 +121,85 @@ AIであることを前提に、「メニューの説明や事務作業は僕に
 
 
 class AIHandler:
-    """Wraps Google Gemini 2.5 Flash with Guu-taro character and dynamic menu/staff context."""
+    """Wraps Google Gemini with Guu-taro character, dynamic menu/staff context and per-turn model routing."""
 
     def __init__(self, menu_context: str = "", staff_context: str = "",
-                 restaurant_info: str = ""):
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY is not set")
-        genai.configure(api_key=api_key)
+                 restaurant_info: str = "", window_contexts: dict[str, str] | None = None,
+                 restaurant_name: str | None = None):
+        get_genai()  # fail fast if GEMINI_API_KEY is missing
         self._menu_context = menu_context
+        # Lunch/dinner menu variants; chat turns use the one for the current time
+        self._window_contexts = window_contexts or {}
+        self._window_models: dict[tuple[str, str], object] = {}
+        self._system_tokens: dict[int, int] = {}  # id(model) -> estimated system prompt tokens
         self._staff_context = staff_context
         self._restaurant_info = restaurant_info
+        self._restaurant_name = restaurant_name or os.getenv("RESTAURANT_NAME", "Guu Original")
+        # Identical concurrent/recent requests share one Gemini call
+        self._chat_flight = SingleFlight("chat")
+        self._translate_flight = SingleFlight("translate")
+        self._prompt_version = 0
+        self._history = HistoryManager("chat")
         self._build_model()
 
     def _build_model(self):
-        restaurant_name = os.getenv("RESTAURANT_NAME", "Guu Original")
+        """Build the full-menu model; window models are rebuilt lazily on next use."""
+        self._system_tokens = {}
+        self.model = self._make_model(self._menu_context)
+        self._window_models = {}
+        self._prompt_version += 1  # replayed replies never outlive the prompt they came from
+        logger.info("Gemini model built: %d chars menu, %d chars staff.",
+                     len(self._menu_context), len(self._staff_context))
+
+    def _make_model(self, menu_context: str, route: Route = ROUTES["primary"]):
         restaurant_info = self._restaurant_info or os.getenv(
             "RESTAURANT_INFO",
             "Hours and location not yet configured.",
         )
 
         system_instruction = SYSTEM_TEMPLATE.format(
-            restaurant_name=restaurant_name,
+            restaurant_name=self._restaurant_name,
             restaurant_info=restaurant_info,
-            menu_context=self._menu_context or "メニュー情報はまだ登録されていません。",
+            menu_context=menu_context or "メニュー情報はまだ登録されていません。",
             staff_context=self._staff_context or "スタッフ情報はまだ登録されていません。",
         )
 
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
+        genai = get_genai()
+        model = genai.GenerativeModel(
+            model_name=route.model,
             system_instruction=system_instruction,
             generation_config=genai.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=1500,
+                temperature=route.temperature,
+                max_output_tokens=route.max_output_tokens,
             ),
         )
-        logger.info("Gemini model built: %d chars menu, %d chars staff.",
-                     len(self._menu_context), len(self._staff_context))
+        self._system_tokens[id(model)] = estimate_tokens(system_instruction)
+        return model
 
-    def update_menu_context(self, menu_context: str):
+    def _model_for_window(self, window: str, route: Route = ROUTES["primary"]):
+        """Return the route's model whose menu context only lists items served in this window."""
+        if window not in self._window_contexts:
+            if route.name == "primary":
+                return self.model
+            window = "all"
+        key = (window, route.name)
+        model = self._window_models.get(key)
+        if model is not None:
+            CACHE_EVENTS.labels(cache="gemini_model", result="hit").inc()
+        else:
+            CACHE_EVENTS.labels(cache="gemini_model", result="miss").inc()
+            context = self._window_contexts.get(window, self._menu_context)
+            model = self._make_model(context, route)
+            self._window_models[key] = model
+            logger.info("Gemini %s/%s model built: %d chars menu.", window, route.name, len(context))
+        return model
+
+    def update_menu_context(self, menu_context: str, window_contexts: dict[str, str] | None = None):
         """Rebuild the model only if menu data has changed."""
-        if menu_context != self._menu_context:
+        window_contexts = window_contexts or {}
+        if menu_context != self._menu_context or window_contexts != self._window_contexts:
             self._menu_context = menu_context
+            self._window_contexts = window_contexts
             self._build_model()
 
     def update_staff_context(self, staff_context: str):
@@ -163,33 +214,71 @@ class AIHandler:
             self._restaurant_info = restaurant_info
             self._build_model()
 
-    def generate_response(self, user_message: str, history: list[dict] | None = None) -> str:
+    def generate_response(self, user_message: str, history: list[dict] | None = None,
+                          idempotency_key: str | None = None) -> str:
         """Generate a response with conversation history support."""
         try:
-            gemini_history = []
-            if history:
-                for msg in history[-20:]:
-                    role = "model" if msg["role"] == "assistant" else "user"
-                    gemini_history.append({"role": role, "parts": [msg["content"]]})
+            gemini_history = self._history.build(history)
 
             now = datetime.now(ZoneInfo("America/Vancouver"))
             time_prefix = f"[Current time: {now.strftime('%A %I:%M %p')}] "
+            window = menu_window(now)
+            route, reason = choose_route(user_message, economy=usage.mode("gemini") == "short")
+
+            def run(route: Route) -> str:
+                model = self._model_for_window(window, route)
 
-            chat = self.model.start_chat(history=gemini_history)
-            response = chat.send_message(time_prefix + user_message)
-            text = response.text.strip()
-            # Strip any leaked internal tags from response
-            text = re.sub(r'\[ENERGY:.*?\]\s*', '', text)
-            text = re.sub(r'\[RESPOND IN:.*?\]\s*', '', text)
-            return text
+                def attempt():
+                    # Fresh session per attempt so hedged attempts don't share history state
+                    chat = model.start_chat(history=gemini_history)
+                    with track_upstream("gemini", "chat" if route.name == "primary" else "chat_lite"):
+                        return chat.send_message(time_prefix + user_message,
+                                                 request_options={"timeout": GEMINI.timeout})
+
+                response = GEMINI.call(attempt)
+                usage.record_gemini(response, route.model, self._system_tokens.get(id(model), 0))
+                text = response.text.strip()
+                # Strip any leaked internal tags from response
+                text = re.sub(r'\[ENERGY:.*?\]\s*', '', text)
+                text = re.sub(r'\[RESPOND IN:.*?\]\s*', '', text)
+                return text
+
+            def generate() -> str:
+                usage.check("gemini")  # past the daily budget only replays are served
+                if route.name == "primary":
+                    MODEL_ROUTES.labels(route="primary", outcome=reason).inc()
+                    return run(route)
+                # Light model first; re-run on the primary model if it breaks the format rules
+                try:
+                    text = run(route)
+                    problems = format_violations(text)
+                except CircuitOpenError:
+                    raise
+                except Exception:
+                    logger.warning("Lite model call failed, escalating", exc_info=True)
+                    problems = ["error"]
+                if not problems:
+                    MODEL_ROUTES.labels(route="lite", outcome="served").inc()
+                    return text
+                MODEL_ROUTES.labels(route="lite", outcome="escalated").inc()
+                logger.info("Lite reply escalated to primary model: %s", ", ".join(problems))
+                return run(ROUTES["primary"])
+
+            payload = {"v": self._prompt_version, "window": window,
+                       "message": user_message, "history": gemini_history}
+            return self._chat_flight.do(payload, generate, idempotency_key)
+        except usage.BudgetExhausted:
+            logger.warning("Gemini daily budget reached, serving fallback reply")
+            return FALLBACK_REPLY
+        except CircuitOpenError:
+            logger.warning("Gemini circuit open, serving fallback reply")
+            return FALLBACK_REPLY
         except Exception:
             logger.exception("Gemini API error")
-            return (
-                "Oops, I'm having a little trouble right now! "
-                "Please ask our amazing staff directly - they'll take great care of you!"
-            )
+            return FALLBACK_REPLY
 
-    def translate_messages(self, texts: list[str], target_lang: str) -> list[str]:
+    def translate_messages(self, texts: list[str], target_lang: str,
+                           idempotency_key: str | None = None) -> list[str]:
         """Translate a batch of assistant messages to the target language."""
         if not texts:
             return []
@@ -202,23 +291,39 @@ class AIHandler:
                 f"Return ONLY the translated messages in the same numbered format [0], [1], etc. "
                 f"Do not add any explanation.\n\n{numbered}"
             )
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            # Parse numbered results
-            translated: list[str] = []
-            for i in range(len(texts)):
-                marker = f"[{i}]"
-                next_marker = f"[{i + 1}]"
-                start = result_text.find(marker)
-                if start == -1:
-                    translated.append(texts[i])
-                    continue
-                start += len(marker)
-                end = result_text.find(next_marker, start) if i < len(texts) - 1 else len(result_text)
-                if end == -1:
-                    end = len(result_text)
-                translated.append(result_text[start:end].strip())
-            return translated
+            def attempt():
+                with track_upstream("gemini", "translate"):
+                    return self.model.generate_content(prompt, request_options={"timeout": GEMINI.timeout})
+
+            def translate() -> list[str]:
+                usage.check("gemini")
+                response = GEMINI.call(attempt, hedge=False)
+                usage.record_gemini(response, ROUTES["primary"].model, self._system_tokens.get(id(self.model), 0))
+                result_text = response.text.strip()
+                # Parse numbered results
+                translated: list[str] = []
+                for i in range(len(texts)):
+                    marker = f"[{i}]"
+                    next_marker = f"[{i + 1}]"
+                    start = result_text.find(marker)
+                    if start == -1:
+                        translated.append(texts[i])
+                        continue
+                    start += len(marker)
+                    end = result_text.find(next_marker, start) if i < len(texts) - 1 else len(result_text)
+                    if end == -1:
+                        end = len(result_text)
+                    translated.append(result_text[start:end].strip())
+                return translated
+
+            return self._translate_flight.do({"texts": texts, "lang": target_lang}, translate,
+                                             idempotency_key)
+        except usage.BudgetExhausted:
+            logger.warning("Gemini daily budget reached, returning untranslated texts")
+            return texts
+        except CircuitOpenError:
+            logger.warning("Gemini circuit open, returning untranslated texts")
+            return texts
         except Exception:
             logger.exception("Translation error")
             return texts
@@ -0,0 +1,377 @@
+"""
+SUMI X Orator - Allergen index & fast path
+Built once per menu snapshot from the アレルギー情報 and 成分情報 columns.
+Item-specific allergy/ingredient questions are answered from templates in all
+six chat languages, without a Gemini call, always closing with the
+"tell the staff directly" instruction the AI rules require. Absence is never
+stated from the sheet: an allergen the data doesn't mention falls through to Gemini.
+"""
+
+from __future__ import annotations
+
+import re
+
+# Allergy-query keywords in every supported chat language
+ALLERGY_KEYWORDS = {
+    "allergy", "allergies", "allergic", "allergen", "vegan", "halal", "gluten", "ingredient",
+    "アレルギー", "アレルゲン", "ビーガン", "ハラル", "グルテン", "成分",
+    "알레르기", "알러지", "비건", "할랄", "글루텐", "성분",
+    "过敏", "過敏", "素食", "清真", "麸质", "成分",
+    "alergia", "alérgeno", "alergeno", "vegano", "gluten", "ingrediente",
+}
+
+# Dietary questions the allergen data cannot answer; these go to Gemini/staff
+_DIETARY_ONLY = {"vegan", "halal", "ビーガン", "ハラル", "비건", "할랄", "素食", "清真", "vegano"}
+
+# Canonical allergen -> words that mean it (any language, lowercase)
+ALLERGEN_SYNONYMS: dict[str, tuple[str, ...]] = {
+    "gluten": ("gluten", "グルテン", "글루텐", "麸质", "麩質"),
+    "wheat": ("wheat", "小麦", "밀", "trigo"),
+    "egg": ("egg", "eggs", "卵", "たまご", "玉子", "계란", "달걀", "鸡蛋", "蛋", "huevo", "ovo"),
+    "dairy": ("dairy", "milk", "lactose", "cheese", "butter", "乳", "乳製品", "牛乳", "유제품", "우유",
+              "乳制品", "牛奶", "lácteo", "lácteos", "leche", "leite", "laticínio", "laticínios"),
+    "soy": ("soy", "soya", "soybean", "大豆", "콩", "대두", "soja"),
+    "fish": ("fish", "魚", "さかな", "생선", "鱼", "pescado", "peixe"),
+    "shellfish": ("shellfish", "甲殻類", "貝", "조개", "갑각류", "贝类", "marisco", "mariscos", "frutos do mar"),
+    "shrimp": ("shrimp", "prawn", "えび", "エビ", "海老", "새우", "虾", "camarón", "gamba", "camarão"),
+    "squid": ("squid", "calamari", "いか", "イカ", "오징어", "鱿鱼", "calamar", "lula"),
+    "octopus": ("octopus", "たこ", "タコ", "문어", "章鱼", "pulpo", "polvo"),
+    "jellyfish": ("jellyfish", "くらげ", "クラゲ", "해파리", "海蜇", "medusa", "água-viva"),
+    "sesame": ("sesame", "ごま", "ゴマ", "胡麻", "참깨", "깨", "芝麻", "sésamo", "gergelim"),
+    "eel": ("eel", "うなぎ", "鰻", "장어", "鳗鱼", "anguila", "enguia"),
+    "mayo": ("mayo", "mayonnaise", "マヨ", "マヨネーズ", "마요네즈", "蛋黄酱", "mayonesa", "maionese"),
+}
+
+# Canonical ingredient -> words that mean it (answered from 成分情報)
+INGREDIENT_SYNONYMS: dict[str, tuple[str, ...]] = {
+    "MSG": ("msg", "monosodium", "化学調味料", "味の素", "글루탐산", "미원", "味精", "glutamato"),
+    "dashi": ("dashi", "出汁", "だし", "다시", "육수", "高汤"),
+    "bonito": ("bonito", "かつお", "鰹", "가쓰오", "가다랑어", "鲣鱼"),
+    "starch": ("starch", "でんぷん", "澱粉", "전분", "淀粉", "almidón", "amido"),
+    "tempura flour": ("tempura flour", "天ぷら粉", "튀김가루", "天妇罗粉"),
+    "vinegar": ("vinegar", "酢", "식초", "醋", "vinagre"),
+}
+
+# Names of raw sheet values that differ from the canonical allergen
+_ALIASES = {"sesame oil": "sesame", "milk": "dairy", "cheese": "dairy", "butter": "dairy",
+            "prawn": "shrimp", "soy sauce": "soy", "soybean": "soy"}
+
+# Asking about the key allergen also matches items listing one of these
+_IMPLIED_BY = {"gluten": ("wheat",), "shellfish": ("shrimp",), "egg": ("mayo",)}
+
+# Words signalling "does X contain Y?" when no allergy keyword is present
+_CONTAINS_WORDS = ("contain", "have any", "has any", "is there", "any ", "free", "入って", "含", "使って",
+                   "들어", "포함", "含有", "有没有", "tiene", "lleva", "contém", "tem ")
+
+LOCALIZED_ALLERGENS: dict[str, dict[str, str]] = {
+    "ja-JP": {"gluten": "グルテン", "wheat": "小麦", "egg": "卵", "dairy": "乳製品", "soy": "大豆",
+              "fish": "魚", "shellfish": "甲殻類・貝類", "shrimp": "えび", "squid": "いか",
+              "octopus": "たこ", "jellyfish": "くらげ", "sesame": "ごま", "eel": "うなぎ",
+              "mayo": "マヨネーズ"},
+    "ko-KR": {"gluten": "글루텐", "wheat": "밀", "egg": "계란", "dairy": "유제품", "soy": "대두",
+              "fish": "생선", "shellfish": "갑각류·조개류", "shrimp": "새우", "squid": "오징어",
+              "octopus": "문어", "jellyfish": "해파리", "sesame": "참깨", "eel": "장어",
+              "mayo": "마요네즈"},
+    "zh-CN": {"gluten": "麸质", "wheat": "小麦", "egg": "鸡蛋", "dairy": "乳制品", "soy": "大豆",
+              "fish": "鱼", "shellfish": "贝类", "shrimp": "虾", "squid": "鱿鱼", "octopus": "章鱼",
+              "jellyfish": "海蜇", "sesame": "芝麻", "eel": "鳗鱼", "mayo": "蛋黄酱"},
+    "es-ES": {"gluten": "gluten", "wheat": "trigo", "egg": "huevo", "dairy": "lácteos", "soy": "soja",
+              "fish": "pescado", "shellfish": "marisco", "shrimp": "gamba", "squid": "calamar",
+              "octopus": "pulpo", "jellyfish": "medusa", "sesame": "sésamo", "eel": "anguila",
+              "mayo": "mayonesa"},
+    "pt-BR": {"gluten": "glúten", "wheat": "trigo", "egg": "ovo", "dairy": "laticínios", "soy": "soja",
+              "fish": "peixe", "shellfish": "frutos do mar", "shrimp": "camarão", "squid": "lula",
+              "octopus": "polvo", "jellyfish": "água-viva", "sesame": "gergelim", "eel": "enguia",
+              "mayo": "maionese"},
+}
+
+TEMPLATES: dict[str, dict[str, str]] = {
+    "en-US": {
+        "contains": "{item} contains {terms}.",
+        "all": "Allergens listed for {item}: {terms}.",
+        "none": "No allergens are listed for {item} in our menu data, so please double-check with our staff.",
+        "ingredients": "Ingredients listed for {item}: {terms}.",
+        "special": "Allergen information for {item} is not in our menu data, so it must be confirmed by our staff.",
+        "closing": "Please tell the staff directly about your allergy.",
+        "sep": ", ",
+    },
+    "ja-JP": {
+        "contains": "{item}には{terms}が含まれています。",
+        "all": "{item}のアレルゲン: {terms}。",
+        "none": "{item}のメニュー情報にアレルゲンの記載はありませんので、スタッフにご確認ください。",
+        "ingredients": "{item}の成分: {terms}。",
+        "special": "{item}のアレルギー情報はメニューデータにないため、スタッフにご確認ください。",
+        "closing": "アレルギーについてはスタッフに直接伝えてください。",
+        "sep": "、",
+    },
+    "ko-KR": {
+        "contains": "{item}에는 {terms}이(가) 포함되어 있습니다.",
+        "all": "{item}의 알레르기 유발 성분: {terms}.",
+        "none": "{item}의 메뉴 정보에는 알레르기 유발 성분 표기가 없으니 스태프에게 확인해 주세요.",
+        "ingredients": "{item}의 성분: {terms}.",
+        "special": "{item}의 알레르기 정보는 메뉴 데이터에 없으므로 스태프에게 확인해 주세요.",
+        "closing": "알레르기가 있으시면 스태프에게 직접 말씀해 주세요.",
+        "sep": ", ",
+    },
+    "zh-CN": {
+        "contains": "{item}含有{terms}。",
+        "all": "{item}标注的过敏原：{terms}。",
+        "none": "{item}的菜单信息中没有标注过敏原，请向工作人员确认。",
+        "ingredients": "{item}标注的成分：{terms}。",
+        "special": "{item}的过敏原信息不在菜单资料中，请向工作人员确认。",
+        "closing": "如有过敏，请直接告诉工作人员。",
+        "sep": "、",
+    },
+    "es-ES": {
+        "contains": "{item} contiene {terms}.",
+        "all": "Alérgenos indicados para {item}: {terms}.",
+        "none": "No hay alérgenos indicados para {item} en nuestra información del menú, así que confírmalo con el personal.",
+        "ingredients": "Ingredientes indicados para {item}: {terms}.",
+        "special": "La información de alérgenos de {item} no está en nuestro menú, así que debe confirmarla el personal.",
+        "closing": "Por favor, informa directamente al personal sobre tu alergia.",
+        "sep": ", ",
+    },
+    "pt-BR": {
+        "contains": "{item} contém {terms}.",
+        "all": "Alérgenos indicados para {item}: {terms}.",
+        "none": "Não há alérgenos indicados para {item} nas informações do cardápio, então confirme com a equipe.",
+        "ingredients": "Ingredientes indicados para {item}: {terms}.",
+        "special": "As informações de alérgenos de {item} não estão no cardápio, então confirme com a equipe.",
+        "closing": "Por favor, informe a equipe diretamente sobre a sua alergia.",
+        "sep": ", ",
+    },
+}
+
+
+def _split_top_level(raw: str) -> list[str]:
+    """Split on commas that are not inside parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in raw:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def normalize_allergens(raw: str) -> dict[str, str]:
+    """Parse an アレルギー情報 cell into {canonical allergen: detail}.
+    e.g. "gluten (soy sauce), fish (chikuwa), sesame oil"
+      -> {"gluten": "soy sauce", "fish": "chikuwa", "sesame": ""}
+    """
+    result: dict[str, str] = {}
+    for part in _split_top_level(str(raw or "")):
+        match = re.match(r"^([^(]+?)\s*(?:\((.*)\))?$", part)
+        name = (match.group(1) if match else part).strip().lower()
+        detail = (match.group(2) or "").strip() if match else ""
+        name = _ALIASES.get(name, name)
+        if name in result and detail:
+            result[name] = f"{result[name]}, {detail}" if result[name] else detail
+        else:
+            result.setdefault(name, detail)
+    return result
+
+
+def normalize_ingredients(raw: str) -> dict[str, str]:
+    """Parse a 成分情報 cell into {ingredient: detail}, keeping MSG upper-case."""
+    result: dict[str, str] = {}
+    for part in _split_top_level(str(raw or "")):
+        match = re.match(r"^([^(]+?)\s*(?:\((.*)\))?$", part)
+        name = (match.group(1) if match else part).strip()
+        key = "MSG" if name.lower() == "msg" else name.lower()
+        result.setdefault(key, (match.group(2) or "").strip() if match else "")
+    return result
+
+
+def _contains(text: str, word: str) -> bool:
+    # ASCII words need word boundaries ("egg" must not match "eggplant")
+    if word.isascii():
+        return re.search(rf"(?<![a-z]){re.escape(word)}(?![a-z])", text) is not None
+    return word in text
+
+
+def _remove(text: str, word: str) -> str:
+    """text with the first whole-word occurrence of word blanked out (see _contains)."""
+    if word.isascii():
+        return re.sub(rf"(?<![a-z]){re.escape(word)}(?![a-z])", " ", text, count=1)
+    return text.replace(word, " ", 1)
+
+
+def canonical_allergen(term: str) -> str:
+    """Map an allergen word in any chat language to its canonical sheet name."""
+    term = term.strip().lower()
+    term = _ALIASES.get(term, term)
+    for canonical, words in ALLERGEN_SYNONYMS.items():
+        if term == canonical or term in words:
+            return canonical
+    return term
+
+
+def implied_allergens(allergen: str) -> set[str]:
+    """The allergen plus the listed allergens that imply it (gluten <- wheat)."""
+    return {allergen, *_IMPLIED_BY.get(allergen, ())}
+
+
+def _find_terms(text: str, synonyms: dict[str, tuple[str, ...]]) -> list[str]:
+    return [canonical for canonical, words in synonyms.items() if any(_contains(text, w) for w in words)]
+
+
+class _Entry:
+    __slots__ = ("name", "special", "allergens", "ingredients")
+
+    def __init__(self, name: str, special: bool):
+        self.name = name
+        self.special = special
+        self.allergens: dict[str, str] = {}
+        self.ingredients: dict[str, str] = {}
+
+
+class AllergenIndex:
+    """item -> allergens/ingredients and allergen -> items for one menu snapshot."""
+
+    def __init__(self, regular_items: list[dict], special_items: list[dict]):
+        self._entries: dict[str, _Entry] = {}
+        self._names: list[tuple[str, str]] = []  # (lowercase alias, english name), longest first
+        self.items_by_allergen: dict[str, list[str]] = {}
+
+        for item, special in [(i, False) for i in regular_items] + [(i, True) for i in special_items]:
+            name = str(item.get("メニュー名(英)", "")).strip()
+            if not name:
+                continue
+            entry = self._entries.get(name.lower())
+            if entry is None:
+                entry = self._entries[name.lower()] = _Entry(name, special)
+                self._names.append((name.lower(), name))
+                ja = str(item.get("メニュー名(日)", "")).strip()
+                if ja:
+                    self._names.append((ja.lower(), name))
+            # Duplicate names (e.g. lunch variants) merge to the union, the safe side
+            for allergen, detail in normalize_allergens(item.get("アレルギー情報", "")).items():
+                entry.allergens.setdefault(allergen, detail)
+            for ingredient, detail in normalize_ingredients(item.get("成分情報", "")).items():
+                entry.ingredients.setdefault(ingredient, detail)
+
+        self._names.sort(key=lambda x: len(x[0]), reverse=True)
+        # Lunch variants ("Karaage 3pc") often leave the columns blank: inherit from the base dish
+        for entry in self._entries.values():
+            if entry.allergens or entry.special:
+                continue
+            base = next((e for e in self._entries.values()
+                         if e is not entry and e.allergens and entry.name.lower().startswith(e.name.lower() + " ")),
+                        None)
+            if base:
+                entry.allergens = dict(base.allergens)
+                entry.ingredients = entry.ingredients or dict(base.ingredients)
+        for entry in self._entries.values():
+            for allergen in entry.allergens:
+                self.items_by_allergen.setdefault(allergen, []).append(entry.name)
+
+    def allergens_for(self, name: str) -> dict[str, str]:
+        entry = self._entries.get(name.lower())
+        return dict(entry.allergens) if entry else {}
+
+    def items_with(self, allergen: str) -> list[str]:
+        return list(self.items_by_allergen.get(allergen, []))
+
+    def _mentioned(self, text: str) -> tuple[list[_Entry], str]:
+        """Items named in text (longest names first) and the text with those names removed."""
+        matches: list[tuple[str, _Entry]] = []
+        probe = text
+        for alias, name in self._names:
+            if _contains(probe, alias):
+                matches.append((alias, self._entries[name.lower()]))
+                probe = _remove(probe, alias)
+        found = list(dict.fromkeys(entry for _, entry in matches))
+        # "Egg" is both a dish and an allergen: only treat it as the dish if nothing else
+        # matched, otherwise its word stays in the text as the allergen asked about
+        if len(found) > 1:
+            dishes = {entry for alias, entry in matches if canonical_allergen(alias) not in ALLERGEN_SYNONYMS}
+            found = [e for e in found if e in dishes] or found
+        remaining = text
+        for alias, entry in matches:
+            if entry in found:
+                remaining = _remove(remaining, alias)
+        return found, remaining
+
+    def answer(self, message: str, lang: str = "en-US") -> str | None:
+        """Answer an item-specific allergy/ingredient question, or None to fall through."""
+        text = message.lower()
+        if any(kw in text for kw in _DIETARY_ONLY):
+            return None
+        items, rest = self._mentioned(text)
+        if not items or len(items) > 2:
+            return None
+        # Allergen words inside dish names ("たこ焼き", "Egg") aren't part of the question
+        allergens = _find_terms(rest, ALLERGEN_SYNONYMS)
+        ingredients = _find_terms(rest, INGREDIENT_SYNONYMS)
+        has_keyword = any(kw in rest for kw in ALLERGY_KEYWORDS)
+        if not has_keyword and not ((allergens or ingredients) and any(w in rest for w in _CONTAINS_WORDS)):
+            return None
+
+        t = TEMPLATES.get(lang, TEMPLATES["en-US"])
+        local = LOCALIZED_ALLERGENS.get(lang, {})
+        sentences: list[str] = []
+        for entry in items:
+            if entry.special:
+                sentences.append(t["special"].format(item=entry.name))
+            elif not entry.allergens and not (ingredients and entry.ingredients):
+                # A blank cell is unknown, never "free of": staff must confirm
+                sentences.append(t["none"].format(item=entry.name))
+            elif ingredients and not allergens:
+                hits = {i: _ingredient_detail(entry, i) for i in ingredients}
+                if any(d is None for d in hits.values()):
+                    return None  # absence from the sheet isn't absence from the dish
+                sentences.append(t["contains"].format(item=entry.name, terms=t["sep"].join(
+                    _with_detail(i, d) for i, d in hits.items())))
+            elif allergens:
+                hits = {a: _listed_detail(entry, a, local) for a in allergens}
+                if any(d is None for d in hits.values()):
+                    return None
+                sentences.append(t["contains"].format(item=entry.name, terms=t["sep"].join(
+                    _with_detail(local.get(a, a), d) for a, d in hits.items())))
+            else:
+                sentences.append(t["all"].format(item=entry.name, terms=t["sep"].join(
+                    _with_detail(local.get(a, a), d) for a, d in entry.allergens.items())))
+        sentences.append(t["closing"])
+        joiner = "" if lang in ("ja-JP", "zh-CN") else " "
+        return joiner.join(sentences)
+
+
+def _listed_detail(entry: _Entry, allergen: str, local: dict[str, str]) -> str | None:
+    """Detail text if the allergen (or one implying it) is listed or named in a detail, else None."""
+    listed = entry.allergens
+    if allergen in listed:
+        return listed[allergen]
+    implied = [a for a in _IMPLIED_BY.get(allergen, ()) if a in listed]
+    if implied:
+        return ", ".join(local.get(a, a) for a in implied)
+    # "gluten (soy sauce)" answers a soy question too
+    words = ALLERGEN_SYNONYMS.get(allergen, (allergen,)) + tuple(k for k, v in _ALIASES.items() if v == allergen)
+    return _detail_mention(entry, words)
+
+
+def _ingredient_detail(entry: _Entry, ingredient: str) -> str | None:
+    """Detail text if the ingredient is listed or named in a detail, else None."""
+    for name, detail in entry.ingredients.items():
+        if name.lower() == ingredient.lower():
+            return detail
+    return _detail_mention(entry, INGREDIENT_SYNONYMS.get(ingredient, (ingredient.lower(),)))
+
+
+def _detail_mention(entry: _Entry, words: tuple[str, ...]) -> str | None:
+    """The first allergen/ingredient detail naming one of words, else None."""
+    for name, detail in list(entry.allergens.items()) + list(entry.ingredients.items()):
+        text = f"{name} {detail}".lower()
+        if any(_contains(text, w) for w in words):
+            return detail or name
+    return None
+
+
+def _with_detail(term: str, detail: str) -> str:
+    return f"{term} ({detail})" if detail else term
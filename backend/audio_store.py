@@ -0,0 +1,113 @@
+"""
+SUMI X Orator - Short-lived audio store
+Holds reply audio synthesized for /api/chat?speak so the client can fetch it
+from /api/audio/{id} instead of making a second /api/tts round trip. Entries
+are created before synthesis starts, so the URL goes out with the chat reply
+and a fetch that arrives early waits for the audio. Entries expire after
+AUDIO_TTL seconds and the store is bounded by total bytes.
+
+Environment:
+  AUDIO_TTL=120                 seconds a clip can be fetched
+  AUDIO_STORE_MAX_BYTES=8000000 total audio kept in memory
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import secrets
+from collections import OrderedDict
+
+from metrics import Counter, Gauge
+
+AUDIO_TTL = float(os.getenv("AUDIO_TTL", "120"))
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", "8000000"))
+MAX_ENTRIES = 500
+
+AUDIO_STORE_EVENTS = Counter(
+    "sumi_audio_store_total", "Audio store events (stored, served, missing, failed, evicted).", ("event",))
+AUDIO_STORE_BYTES = Gauge("sumi_audio_store_bytes", "Bytes of audio held in the store.")
+
+
+class AudioNotFound(Exception):
+    """Unknown or expired audio id."""
+
+
+class AudioStore:
+    """Id -> pending or finished clip. All methods run on the event loop, so
+    no locking is needed.
+    """
+
+    def __init__(self, ttl: float = AUDIO_TTL, max_bytes: int = AUDIO_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # id -> (expires, future clip, size, media type)
+        self._entries: OrderedDict[str, tuple[float, asyncio.Future, int, str]] = OrderedDict()
+        AUDIO_STORE_BYTES.labels().set_function(lambda: self.bytes)
+
+    def reserve(self, media_type: str = "audio/mpeg") -> str:
+        """Create a pending entry and return its unguessable id."""
+        self._expire()
+        audio_id = secrets.token_urlsafe(16)
+        future = asyncio.get_running_loop().create_future()
+        self._entries[audio_id] = (time.monotonic() + self.ttl, future, 0, media_type)
+        return audio_id
+
+    def resolve(self, audio_id: str, audio: bytes):
+        entry = self._entries.get(audio_id)
+        if entry is None:
+            return
+        expires, future, _, media_type = entry
+        if not future.done():
+            future.set_result(audio)
+        self._entries[audio_id] = (expires, future, len(audio), media_type)
+        self.bytes += len(audio)
+        AUDIO_STORE_EVENTS.labels(event="stored").inc()
+        self._evict()
+
+    def fail(self, audio_id: str, exc: BaseException):
+        entry = self._entries.pop(audio_id, None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_exception(exc)
+            entry[1].exception()  # mark retrieved: nobody may ever fetch it
+        AUDIO_STORE_EVENTS.labels(event="failed").inc()
+
+    async def get(self, audio_id: str, timeout: float) -> tuple[bytes, str]:
+        """Return the clip and its media type, waiting up to `timeout` for it to finish synthesizing."""
+        self._expire()
+        entry = self._entries.get(audio_id)
+        if entry is None:
+            AUDIO_STORE_EVENTS.labels(event="missing").inc()
+            raise AudioNotFound(audio_id)
+        audio = await asyncio.wait_for(asyncio.shield(entry[1]), timeout=timeout)
+        AUDIO_STORE_EVENTS.labels(event="served").inc()
+        return audio, entry[3]
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            audio_id, (expires, *_) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) < MAX_ENTRIES:
+                break
+            self._drop(audio_id)
+
+    def _evict(self):
+        # Oldest finished clips first; pending entries hold no bytes yet
+        for audio_id in [k for k, (_, _, size, _) in self._entries.items() if size]:
+            if self.bytes <= self.max_bytes:
+                break
+            self._drop(audio_id)
+            AUDIO_STORE_EVENTS.labels(event="evicted").inc()
+
+    def _drop(self, audio_id: str):
+        _, future, size, _ = self._entries.pop(audio_id)
+        self.bytes -= size
+        if not future.done():
+            # Waiters see an expired clip (404), not a cancellation
+            future.set_exception(AudioNotFound(audio_id))
+            future.exception()
+
+
+store = AudioStore()
@@ -0,0 +1,69 @@
+"""
+SUMI X Orator - Menu wire format check
+Loads frontend/public/menu-cache.json into a MenuDatabase through the fake
+Sheet and checks that the rows the API serves have the file's shape: the same
+columns in the same order, with the same values and JSON types (checkbox
+columns stay "TRUE"/"FALSE" strings). API rows may add "id" and "images";
+menu_export.export() must reproduce the file exactly. Exits 1 on any difference.
+
+Usage (from backend/):
+  python bench/check_menu_format.py
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes  # noqa: E402
+
+API_ONLY = ("id", "images")
+
+
+def compare(kind: str, expected: list[dict], served: list[dict], ignore=API_ONLY) -> list[str]:
+    """Differences between the file's rows and the served rows (empty when identical)."""
+    if len(expected) != len(served):
+        return [f"{kind}: {len(served)} rows served, file has {len(expected)}"]
+    failures = []
+    for want, got in zip(expected, served):
+        got = {k: v for k, v in got.items() if k not in ignore}
+        name = want.get("メニュー名(英)", "?")
+        if list(got) != list(want):
+            failures.append(f"{kind} {name!r}: columns {list(got)} != {list(want)}")
+            continue
+        for column, value in want.items():
+            if got[column] != value or type(got[column]) is not type(value):
+                failures.append(f"{kind} {name!r}: {column} = {got[column]!r}, file has {value!r}")
+    return failures
+
+
+def main_cli():
+    fakes.install()
+    from database import MenuDatabase
+    import menu_export
+    from menu_index import to_rows
+
+    with open(fakes.MENU_CACHE, encoding="utf-8") as f:
+        shipped = json.load(f)
+    db = MenuDatabase()
+    try:
+        failures = (compare("regular", shipped["regular"], to_rows(db.get_active_regular_items()))
+                    + compare("special", shipped["special"], to_rows(db.get_special_items())))
+        exported = menu_export.export(db)
+        if list(exported) != list(shipped):
+            failures.append(f"export: top-level keys {list(exported)} != {list(shipped)}")
+        for kind in ("regular", "special"):
+            failures += compare(f"export {kind}", shipped[kind], exported.get(kind, []), ignore=())
+    finally:
+        db.close()
+
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    print(f"menu format: {'ok' if not failures else f'{len(failures)} differences'}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,71 @@
+"""
+SUMI X Orator - Allergen fast path evaluation
+Runs the questions in bench/allergen_cases.jsonl through AllergenIndex.answer()
+against the menu-cache.json snapshot. "expect" lists phrases the template
+answer must contain; null means the question must fall through to Gemini.
+Cases with "exclude_allergen" instead run MenuIndex.query() and check that the
+"kept" items are returned and the "dropped" ones are not. Exits 1 when any
+case fails.
+
+Usage (from backend/):
+  python bench/eval_allergens.py
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes  # noqa: E402
+from allergens import AllergenIndex  # noqa: E402
+from menu_index import MenuIndex  # noqa: E402
+
+CASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "allergen_cases.jsonl")
+
+
+def evaluate(cases: list[dict], menu: MenuIndex, index: AllergenIndex) -> list[str]:
+    """Failure descriptions (empty when every case passes)."""
+    failures = []
+    for case in cases:
+        if "exclude_allergen" in case:
+            names = {item.name for item in menu.query(exclude_allergen=case["exclude_allergen"])}
+            missing = [name for name in case["kept"] if name not in names]
+            leaked = [name for name in case["dropped"] if name in names]
+            if missing or leaked:
+                failures.append(f"exclude_allergen={case['exclude_allergen']}: "
+                                f"missing {missing}, should be dropped {leaked}")
+            continue
+        reply = index.answer(case["message"], case["lang"])
+        expect = case["expect"]
+        if expect is None:
+            if reply is not None:
+                failures.append(f"[{case['lang']}] {case['message']!r}: want fall-through, got {reply!r}")
+        elif reply is None or not all(phrase in reply for phrase in expect):
+            failures.append(f"[{case['lang']}] {case['message']!r}: want {expect}, got {reply!r}")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=CASES)
+    args = parser.parse_args()
+
+    with open(fakes.MENU_CACHE, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    index = AllergenIndex(snapshot["regular"], snapshot["special"])
+    menu = MenuIndex(snapshot["regular"], snapshot["special"], index)
+    with open(args.cases, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = evaluate(cases, menu, index)
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    print(f"allergen cases: {len(cases) - len(failures)}/{len(cases)} pass")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""
+SUMI X Orator - Intent router evaluation
+Runs the labeled turns in bench/intent_cases.jsonl through intents.route()
+against the menu-cache.json snapshot and the fake 店舗情報 tab, and reports
+precision of local answers and the share of Gemini calls avoided.
+
+Usage (from backend/):
+  python bench/eval_intents.py
+  python bench/eval_intents.py --threshold 0.6 --verbose
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes  # noqa: E402
+import intents  # noqa: E402
+from menu_index import MenuIndex  # noqa: E402
+
+CASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_cases.jsonl")
+
+
+def evaluate(cases: list[dict], menu: MenuIndex, store_info: dict[str, str], verbose: bool = False) -> dict:
+    answered = correct = 0
+    per_lang: dict[str, Counter] = defaultdict(Counter)
+    confusion: Counter = Counter()
+    for case in cases:
+        reply = intents.route(case["message"], case["lang"], menu, store_info)
+        predicted = intents.classify(case["message"]).intent if reply else "none"
+        label = case["intent"]
+        stats = per_lang[case["lang"]]
+        stats["total"] += 1
+        if reply:
+            answered += 1
+            stats["answered"] += 1
+            if predicted == label:
+                correct += 1
+                stats["correct"] += 1
+        if predicted != label:
+            confusion[(label, predicted)] += 1
+            if verbose:
+                print(f"  MISS [{case['lang']}] {case['message']!r}: want {label}, got {predicted}"
+                      + (f" -> {reply!r}" if reply else ""))
+    local = sum(1 for c in cases if c["intent"] != "none")
+    return {
+        "cases": len(cases),
+        "answered_locally": answered,
+        "precision": correct / answered if answered else 0.0,
+        "recall": correct / local if local else 0.0,
+        "llm_calls_avoided": answered / len(cases) if cases else 0.0,
+        "per_lang": {lang: dict(c) for lang, c in per_lang.items()},
+        "confusion": {f"{want}->{got}": n for (want, got), n in confusion.most_common()},
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=CASES)
+    parser.add_argument("--threshold", type=float, default=None, help="override INTENT_THRESHOLD")
+    parser.add_argument("--verbose", action="store_true", help="print every misclassified turn")
+    args = parser.parse_args()
+
+    if args.threshold is not None:
+        intents.INTENT_THRESHOLD = args.threshold
+    with open(fakes.MENU_CACHE, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    menu = MenuIndex(snapshot["regular"], snapshot["special"])
+    with open(args.cases, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    result = evaluate(cases, menu, dict(fakes.STORE_INFO), args.verbose)
+    print(f"\nthreshold={intents.INTENT_THRESHOLD}  cases={result['cases']}")
+    print(f"answered locally  {result['answered_locally']} "
+          f"({result['llm_calls_avoided']:.0%} of Gemini calls avoided)")
+    print(f"precision         {result['precision']:.1%}")
+    print(f"recall            {result['recall']:.1%}")
+    for lang, c in sorted(result["per_lang"].items()):
+        print(f"  {lang}: {c.get('answered', 0)}/{c['total']} answered, {c.get('correct', 0)} correct")
+    if result["confusion"]:
+        print("confusion (label->predicted):", result["confusion"])
+
+
+if __name__ == "__main__":
+    main_cli()
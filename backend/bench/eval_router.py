@@ -0,0 +1,122 @@
+"""
+SUMI X Orator - Model router evaluation
+Runs the labeled turns in bench/router_cases.jsonl through
+model_router.choose_route() and reports route accuracy and safety leaks
+(safety turns sent to the light model; must be 0). Then replays every turn
+through AIHandler.generate_response() against a fake Gemini whose light
+model breaks the format rules at a configurable rate, to check that every
+bad lite reply is escalated and that served replies always pass the rules.
+
+Usage (from backend/):
+  python bench/eval_router.py
+  python bench/eval_router.py --lite-violations 0.3 --verbose
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes  # noqa: E402
+import model_router as router  # noqa: E402
+
+CASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_cases.jsonl")
+
+LANG_NAMES = {"en-US": "English", "ja-JP": "Japanese", "ko-KR": "Korean",
+              "zh-CN": "Chinese", "es-ES": "Spanish", "pt-BR": "Portuguese"}
+
+BAD_REPLIES = [
+    "**Hello!** Welcome to Guu! Say 'Kanpai!' to our staff!",
+    "Welcome!\n- Try saying 'Oishii!'\n- Or 'Gochisosama!'",
+    "Kanpai means cheers! " * 30,
+    "",
+]
+
+
+class ScriptedModel(fakes.FakeGenerativeModel):
+    """Fake Gemini: the light model returns a rule-breaking reply at `violation_rate`."""
+
+    violation_rate = 0.2
+    calls: Counter = Counter()
+
+    def _reply(self, prompt: str) -> str:
+        ScriptedModel.calls[self.model_name] += 1
+        if self.model_name == router.ROUTES["lite"].model and random.random() < self.violation_rate:
+            return random.choice(BAD_REPLIES)
+        return super()._reply(prompt)
+
+
+def evaluate_routes(cases: list[dict], verbose: bool = False) -> dict:
+    correct = leaks = 0
+    routed: Counter = Counter()
+    for case in cases:
+        route, reason = router.choose_route(case["message"])
+        routed[route.name] += 1
+        if route.name == case["route"]:
+            correct += 1
+        elif verbose:
+            print(f"  MISS [{case['lang']}] {case['message']!r}: want {case['route']}, got {route.name} ({reason})")
+        if case.get("safety") and route.name != "primary":
+            leaks += 1
+    return {"cases": len(cases), "accuracy": correct / len(cases) if cases else 0.0,
+            "safety_leaks": leaks, "routed": dict(routed)}
+
+
+def evaluate_escalation(cases: list[dict], verbose: bool = False) -> dict:
+    from ai_handler import AIHandler
+
+    handler = AIHandler(menu_context="(bench menu)")
+    ScriptedModel.calls.clear()
+    served_bad = 0
+    for case in cases:
+        message = f"[RESPOND IN: {LANG_NAMES.get(case['lang'], 'English')}] {case['message']}"
+        reply = handler.generate_response(message, [])
+        problems = router.format_violations(reply)
+        if problems:
+            served_bad += 1
+            if verbose:
+                print(f"  BAD  {case['message']!r}: {problems}")
+    return {"calls": dict(ScriptedModel.calls), "served_bad": served_bad}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=CASES)
+    parser.add_argument("--lite-violations", type=float, default=0.2,
+                        help="share of light-model replies that break the format rules")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("HISTORY_SUMMARY", "extractive")
+    fakes.install(gemini=fakes.Upstream(0, 0))
+    import google.generativeai as genai
+    genai.GenerativeModel = ScriptedModel
+    ScriptedModel.violation_rate = args.lite_violations
+
+    with open(args.cases, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    routes = evaluate_routes(cases, args.verbose)
+    print(f"\ncases={routes['cases']}  routed={routes['routed']}")
+    print(f"route accuracy    {routes['accuracy']:.1%}")
+    print(f"safety leaks      {routes['safety_leaks']}")
+
+    result = evaluate_escalation(cases, args.verbose)
+    lite, primary = router.ROUTES["lite"].model, router.ROUTES["primary"].model
+    calls = result["calls"]
+    escalated = calls.get(primary, 0) - routes["routed"].get("primary", 0)
+    print(f"\nlite violation rate {args.lite_violations:.0%}")
+    print(f"model calls       {lite}={calls.get(lite, 0)}  {primary}={calls.get(primary, 0)}")
+    print(f"escalated to primary {escalated}/{calls.get(lite, 0)} lite replies")
+    print(f"primary calls avoided {1 - calls.get(primary, 0) / len(cases):.0%} of turns")
+    print(f"served rule-breaking replies {result['served_bad']}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,329 @@
+"""
+SUMI X Orator - Benchmark fakes
+In-process stand-ins for gspread worksheets, genai.GenerativeModel and
+TextToSpeechClient with configurable latency and error distributions.
+install() must run before `import main`.
+"""
+
+import os
+import re
+import json
+import math
+import random
+import time
+import tempfile
+import threading
+from dataclasses import dataclass
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_CACHE = os.path.join(BACKEND_DIR, "..", "frontend", "public", "menu-cache.json")
+
+
+@dataclass
+class Upstream:
+    """Latency/error profile of one fake upstream (log-normal latency)."""
+    p50_ms: float
+    p95_ms: float
+    error_rate: float = 0.0
+
+    def call(self):
+        """Sleep for a sampled latency, then maybe raise."""
+        if self.p50_ms > 0:
+            # p95 = p50 * exp(1.645 * sigma) for a log-normal distribution
+            sigma = math.log(max(self.p95_ms, self.p50_ms) / self.p50_ms) / 1.645
+            time.sleep(random.lognormvariate(math.log(self.p50_ms / 1000), sigma))
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeUpstreamError("injected upstream failure")
+
+    @classmethod
+    def parse(cls, spec: str) -> "Upstream":
+        """Parse "p50,p95[,error_rate]" (milliseconds)."""
+        parts = [float(p) for p in spec.split(",")]
+        return cls(parts[0], parts[1] if len(parts) > 1 else parts[0], parts[2] if len(parts) > 2 else 0.0)
+
+
+class FakeUpstreamError(Exception):
+    pass
+
+
+UPSTREAMS = {
+    "sheets": Upstream(150, 600),
+    "gemini": Upstream(900, 2500),
+    "tts": Upstream(300, 900),
+}
+
+
+# ---------------------------------------------------------------------------
+# gspread
+# ---------------------------------------------------------------------------
+# Same layout as populate_sheets.py's 店舗情報 tab
+STORE_INFO = [
+    ("店名", "Guu Original"),
+    ("住所", "838 Thurlow St, Vancouver, BC V6E 1W2, Canada"),
+    ("電話番号", "+1 604-685-8817"),
+    ("営業時間(ランチ)", "Mon-Fri 11:30am - 2:00pm"),
+    ("営業時間(ディナー)", "Mon-Sat 5:30pm - 11:00pm, Sun 5:30pm - 10:00pm"),
+    ("定休日", "ランチは土日休み"),
+]
+
+
+def _table(items: list[dict]) -> list[list]:
+    if not items:
+        return [[]]
+    header = list(items[0].keys())
+    return [header] + [[item.get(k, "") for k in header] for item in items]
+
+
+class FakeWorksheet:
+    def __init__(self, title: str, rows: list[list]):
+        self.title = title
+        self.id = abs(hash(title)) % 100000
+        self._rows = rows
+        self._lock = threading.Lock()
+
+    def _call(self):
+        UPSTREAMS["sheets"].call()
+
+    def get_all_records(self, **kwargs) -> list[dict]:
+        self._call()
+        with self._lock:
+            header, *rows = self._rows
+            return [dict(zip(header, row)) for row in rows]
+
+    def get_all_values(self, **kwargs) -> list[list]:
+        self._call()
+        with self._lock:
+            return [list(r) for r in self._rows]
+
+    def row_values(self, row: int, **kwargs) -> list:
+        self._call()
+        with self._lock:
+            return list(self._rows[row - 1]) if row <= len(self._rows) else []
+
+    def col_values(self, col: int, **kwargs) -> list:
+        self._call()
+        with self._lock:
+            return [r[col - 1] if len(r) >= col else "" for r in self._rows]
+
+    def update_cell(self, row: int, col: int, value):
+        self._call()
+        with self._lock:
+            cells = self._rows[row - 1]
+            cells.extend([""] * (col - len(cells)))
+            cells[col - 1] = {True: "TRUE", False: "FALSE"}.get(value, value)
+
+    def batch_update(self, data: list[dict], **kwargs):
+        self._call()
+        with self._lock:
+            for entry in data:
+                match = re.match(r"([A-Z]+)(\d+)", entry["range"].split("!")[-1])
+                col = sum((ord(c) - 64) * 26 ** i for i, c in enumerate(reversed(match.group(1))))
+                for dr, values in enumerate(entry["values"]):
+                    row = int(match.group(2)) + dr
+                    while len(self._rows) < row:
+                        self._rows.append([])
+                    cells = self._rows[row - 1]
+                    for dc, value in enumerate(values):
+                        cells.extend([""] * (col + dc - len(cells)))
+                        cells[col + dc - 1] = value
+
+    def append_row(self, values: list, **kwargs):
+        self._call()
+        with self._lock:
+            self._rows.append(list(values))
+
+    def append_rows(self, values: list[list], **kwargs):
+        self._call()
+        with self._lock:
+            self._rows.extend(list(v) for v in values)
+
+    def clear(self):
+        self._call()
+        with self._lock:
+            self._rows[:] = [[]]
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheets: dict[str, FakeWorksheet]):
+        self._sheets = sheets
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        import gspread
+        UPSTREAMS["sheets"].call()
+        if title not in self._sheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs) -> FakeWorksheet:
+        self._sheets[title] = FakeWorksheet(title, [[]])
+        return self._sheets[title]
+
+    def batch_update(self, body: dict):
+        UPSTREAMS["sheets"].call()
+        for request in body.get("requests", []):
+            dimension = request.get("deleteDimension", {}).get("range")
+            if dimension:
+                sheet = next(s for s in self._sheets.values() if s.id == dimension["sheetId"])
+                with sheet._lock:
+                    del sheet._rows[dimension["startIndex"]:dimension["endIndex"]]
+
+    def values_batch_update(self, body: dict):
+        UPSTREAMS["sheets"].call()
+        by_sheet: dict[str, list[dict]] = {}
+        for entry in body["data"]:
+            title, _, a1 = entry["range"].rpartition("!")
+            by_sheet.setdefault(title.strip("'").replace("''", "'"), []).append({**entry, "range": a1})
+        for title, data in by_sheet.items():
+            sheet = self._sheets[title]
+            data = [{**d, "values": [[{True: "TRUE", False: "FALSE"}.get(v, v) if isinstance(v, bool) else
+                                      ("" if v is None else str(v)) for v in row] for row in d["values"]]}
+                    for d in data]
+            sheet.batch_update(data)
+
+
+class FakeSheetsClient:
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self._spreadsheet = spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self._spreadsheet
+
+    def set_timeout(self, timeout=None):
+        pass
+
+
+def build_spreadsheet() -> FakeSpreadsheet:
+    """Seed the fake spreadsheet from the frontend's menu-cache.json."""
+    with open(MENU_CACHE, encoding="utf-8") as f:
+        menu = json.load(f)
+    return FakeSpreadsheet({
+        "レギュラーメニュー": FakeWorksheet("レギュラーメニュー", _table(menu["regular"])),
+        "スペシャルメニュー": FakeWorksheet("スペシャルメニュー", _table(menu["special"])),
+        "Staff": FakeWorksheet("Staff", [["出勤", "名前", "リスペクト要素", "トークタグ"],
+                                         ["TRUE", "Ken", "Fastest hands on the grill", "hockey"]]),
+        "店舗情報": FakeWorksheet("店舗情報", [["項目名", "内容"]] + [list(r) for r in STORE_INFO]),
+        "Ratings": FakeWorksheet("Ratings", [["timestamp", "rating", "message_count", "lang"]]),
+        "Analytics": FakeWorksheet("Analytics", [["timestamp", "session_id", "event", "data", "lang", "user_agent"]]),
+    })
+
+
+# ---------------------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------------------
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _Response:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens, max(1, len(text) // 4))
+
+
+class FakeGenerativeModel:
+    """Echoes plausible Guu-taro replies that mention real menu names."""
+
+    menu_names: list[str] = []
+
+    def __init__(self, model_name: str = "", system_instruction: str = "",
+                 generation_config=None, **kwargs):
+        self.model_name = model_name
+        self._system_instruction = system_instruction or ""
+        self._generation_config = generation_config
+
+    def _reply(self, prompt: str) -> str:
+        config = self._generation_config
+        if getattr(config, "response_mime_type", None) == "application/json" or (
+                isinstance(config, dict) and config.get("response_mime_type") == "application/json"):
+            return json.dumps({"customer_reply": "Sounds great, what do you recommend?",
+                               "feedback_to_staff": ""})
+        numbered = re.findall(r"^\[(\d+)\]", prompt, re.M)
+        if numbered:
+            return "\n".join(f"[{i}] (translated) message {i}" for i in numbered)
+        name = random.choice(self.menu_names) if self.menu_names else "Karaage"
+        return (f"You have to try the {name}! Say '{name}, Onegaishimasu!' to our staff "
+                "and they'll fire up the kitchen for you!")
+
+    def _prompt_tokens(self, parts: list[str]) -> int:
+        return (len(self._system_instruction) + sum(len(p) for p in parts)) // 3
+
+    def generate_content(self, prompt, **kwargs):
+        UPSTREAMS["gemini"].call()
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        return _Response(self._reply(text), self._prompt_tokens([text]))
+
+    def start_chat(self, history=None, **kwargs):
+        return FakeChatSession(self, history or [])
+
+
+class FakeChatSession:
+    def __init__(self, model: FakeGenerativeModel, history: list):
+        self._model = model
+        self.history = list(history)
+
+    def send_message(self, content, **kwargs):
+        UPSTREAMS["gemini"].call()
+        text = content if isinstance(content, str) else str(content)
+        parts = [p for msg in self.history for p in msg.get("parts", [])] + [text]
+        return _Response(self._model._reply(text), self._model._prompt_tokens(parts))
+
+
+# ---------------------------------------------------------------------------
+# Text-to-Speech
+# ---------------------------------------------------------------------------
+class _AudioResponse:
+    def __init__(self, size: int, magic: bytes = b"\xff\xfb"):
+        self.audio_content = magic + os.urandom(max(0, size - len(magic)))
+
+
+class FakeTextToSpeechClient:
+    def __init__(self, credentials=None, **kwargs):
+        pass
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, **kwargs):
+        UPSTREAMS["tts"].call()
+        # ~120 bytes of 32 kbps MP3 per character spoken is close enough for payload sizing;
+        # Ogg Opus runs at ~24 kbps (16 kbps at 16 kHz)
+        size = len(getattr(input, "text", "") or "") * 120
+        if getattr(getattr(audio_config, "audio_encoding", None), "name", "") == "OGG_OPUS":
+            return _AudioResponse(size * (2 if audio_config.sample_rate_hertz == 16000 else 3) // 4, b"OggS")
+        return _AudioResponse(size)
+
+
+# ---------------------------------------------------------------------------
+# Installation
+# ---------------------------------------------------------------------------
+def install(**profiles: Upstream):
+    """Patch the Google SDKs and env so `import main` runs fully offline."""
+    UPSTREAMS.update(profiles)
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("GOOGLE_SHEET_ID", "bench-sheet")
+    os.environ.setdefault("GOOGLE_SHEETS_CREDENTIALS", "{}")
+    # A fresh local menu store, so every run starts from the fake sheet
+    os.environ.setdefault("MENU_STORE_DIR", tempfile.mkdtemp(prefix="sumi-bench-store-"))
+
+    with open(MENU_CACHE, encoding="utf-8") as f:
+        menu = json.load(f)
+    FakeGenerativeModel.menu_names = [
+        item["メニュー名(英)"] for item in menu["regular"] + menu["special"] if item.get("メニュー名(英)")
+    ]
+
+    import gspread
+    from google.oauth2 import service_account
+    import google.generativeai as genai
+    from google.cloud import texttospeech
+
+    spreadsheet = build_spreadsheet()
+    gspread.authorize = lambda creds, **kwargs: FakeSheetsClient(spreadsheet)
+    service_account.Credentials.from_service_account_info = staticmethod(
+        lambda info, scopes=None, **kwargs: object())
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    texttospeech.TextToSpeechClient = FakeTextToSpeechClient
+    return spreadsheet
@@ -0,0 +1,254 @@
+"""
+SUMI X Orator - Offline load test
+Runs main.app in-process against the fakes in bench/fakes.py and drives a
+realistic mix of guest and staff traffic. Reports p50/p95/p99 latency and
+requests/sec per endpoint and saves the run as JSON for comparison.
+
+Usage (from backend/, needs httpx):
+  python bench/loadtest.py --users 20 --duration 30
+  python bench/loadtest.py --gemini 900,2500,0.02 --sheets 150,600 --tts 300,900
+  python bench/loadtest.py --compare bench/results/a.json bench/results/b.json
+
+Upstream profiles are "p50_ms,p95_ms[,error_rate]".
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes  # noqa: E402  (bench/ is on sys.path when run as a script)
+
+STAFF_PASSWORD = "bench"
+LANGS = ["en-US", "en-US", "en-US", "ja-JP", "ko-KR", "zh-CN", "es-ES", "pt-BR"]
+QUESTIONS = [
+    "What do you recommend for a first visit?",
+    "Is the karaage spicy?",
+    "What goes well with beer?",
+    "Do you have anything vegetarian?",
+    "Does the Takoyaki have gluten?",
+    "What time do you close?",
+    "How much is the Salmon Yukke?",
+    "Something sweet for dessert?",
+    "What sake should I try?",
+    "Thanks! What's a good Japanese phrase to say to the staff?",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, status: int):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            result[endpoint] = {
+                "requests": len(ordered),
+                "rps": round(len(ordered) / elapsed, 2),
+                "p50_ms": round(_percentile(ordered, 50) * 1000, 1),
+                "p95_ms": round(_percentile(ordered, 95) * 1000, 1),
+                "p99_ms": round(_percentile(ordered, 99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[endpoint].items())},
+            }
+        return result
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def _request(client, recorder: Recorder, method: str, path: str, label: str | None = None, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        status = response.status_code
+    except Exception:
+        response, status = None, 599
+    recorder.record(label or f"{method} {path}", time.perf_counter() - start, status)
+    return response
+
+
+async def guest(client, recorder: Recorder, deadline: float, think: float):
+    """One table guest: load menu, chat with growing history, poll, tap, listen."""
+    session_id = f"bench-{random.getrandbits(32):08x}"
+    headers = {"X-Session-ID": session_id}
+    lang = random.choice(LANGS)
+    await _request(client, recorder, "GET", "/api/menu", headers=headers)
+    await _request(client, recorder, "POST", "/api/analytics", headers=headers,
+                   json={"session_id": session_id, "event": "page_view", "lang": lang})
+    history: list[dict] = []
+    last_poll = time.monotonic()
+    while time.monotonic() < deadline:
+        roll = random.random()
+        if roll < 0.45:
+            message = random.choice(QUESTIONS)
+            response = await _request(client, recorder, "POST", "/api/chat", headers=headers, json={
+                "message": message, "history": history, "lang": lang,
+                "energy_context": {"message_count": len(history) // 2, "drink_mentions": 0},
+            })
+            if response is not None and response.status_code == 200:
+                reply = response.json().get("reply", "")
+                history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+                if random.random() < 0.3:
+                    await _request(client, recorder, "POST", "/api/tts", headers=headers, json={"text": reply, "lang": lang})
+        elif roll < 0.75:
+            # Analytics burst: a few menu taps in quick succession
+            for _ in range(random.randint(2, 5)):
+                await _request(client, recorder, "POST", "/api/analytics", headers=headers, json={
+                    "session_id": session_id, "event": "menu_tap", "data": "Karaage", "lang": lang})
+        elif roll < 0.8 and history:
+            texts = [m["content"] for m in history if m["role"] == "assistant"][-5:]
+            await _request(client, recorder, "POST", "/api/translate", headers=headers,
+                           json={"texts": texts, "lang": random.choice(LANGS)})
+        elif roll < 0.83:
+            await _request(client, recorder, "POST", "/api/rating", headers=headers,
+                           json={"rating": random.randint(3, 5), "message_count": len(history), "lang": lang})
+        if time.monotonic() - last_poll > 10:
+            await _request(client, recorder, "GET", "/api/menu/availability", headers=headers)
+            last_poll = time.monotonic()
+        await asyncio.sleep(random.expovariate(1 / think))
+
+
+async def poller(client, recorder: Recorder, deadline: float, interval: float):
+    """Availability polling from idle screens."""
+    while time.monotonic() < deadline:
+        await _request(client, recorder, "GET", "/api/menu/availability")
+        await asyncio.sleep(interval)
+
+
+async def staff(client, recorder: Recorder, deadline: float, names: list[str]):
+    """Staff tablet: reload the admin list and toggle sold-out / recommend flags."""
+    headers = {"Authorization": f"Bearer {STAFF_PASSWORD}"}
+    while time.monotonic() < deadline:
+        await _request(client, recorder, "GET", "/api/menu/staff", headers=headers)
+        name = random.choice(names)
+        if random.random() < 0.5:
+            await _request(client, recorder, "POST", "/api/menu/soldout", headers=headers,
+                           json={"menu_name": name, "available": random.random() < 0.7})
+        else:
+            await _request(client, recorder, "POST", "/api/menu/regular/toggle", headers=headers,
+                           json={"menu_name": name, "flag": "おすすめフラグ", "value": random.random() < 0.3})
+        await asyncio.sleep(random.uniform(5, 15))
+
+
+async def run(args) -> dict:
+    fakes.install(
+        sheets=fakes.Upstream.parse(args.sheets),
+        gemini=fakes.Upstream.parse(args.gemini),
+        tts=fakes.Upstream.parse(args.tts),
+    )
+    os.environ["STAFF_PASSWORD"] = STAFF_PASSWORD
+    os.environ["MENU_CACHE_TTL"] = str(args.menu_ttl)
+    # Virtual guests chat far faster than people do; keep per-session limits out of the way
+    os.environ["SESSION_RATE"] = str(args.session_rate)
+
+    import httpx
+    import main
+
+    main.limiter.enabled = False  # per-IP limits would throttle every virtual user
+    names = fakes.FakeGenerativeModel.menu_names
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        await main.wait_for_warmup()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            start = time.monotonic()
+            deadline = start + args.duration
+            tasks = [guest(client, recorder, deadline, args.think) for _ in range(args.users)]
+            tasks += [poller(client, recorder, deadline, args.poll) for _ in range(args.pollers)]
+            tasks += [staff(client, recorder, deadline, names) for _ in range(args.staff)]
+            await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - start
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_rev(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "elapsed_s": round(elapsed, 2),
+        "total_rps": round(sum(len(v) for v in recorder.latencies.values()) / elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+    }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ""
+
+
+def print_report(result: dict):
+    print(f"\n{result['timestamp']}  rev={result['git_rev']}  "
+          f"{result['elapsed_s']}s  {result['total_rps']} req/s")
+    print(f"{'endpoint':34} {'reqs':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+    for endpoint, s in result["endpoints"].items():
+        print(f"{endpoint:34} {s['requests']:>6} {s['rps']:>7} {s['p50_ms']:>8} "
+              f"{s['p95_ms']:>8} {s['p99_ms']:>8}  {s['statuses']}")
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'endpoint':34} {'p50 old→new':>20} {'p95 old→new':>20} {'rps old→new':>16}")
+    for endpoint in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a, b = old["endpoints"].get(endpoint, {}), new["endpoints"].get(endpoint, {})
+        print(f"{endpoint:34} {a.get('p50_ms', '-'):>9}→{b.get('p50_ms', '-'):<10} "
+              f"{a.get('p95_ms', '-'):>9}→{b.get('p95_ms', '-'):<10} "
+              f"{a.get('rps', '-'):>7}→{b.get('rps', '-'):<8}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent table guests")
+    parser.add_argument("--pollers", type=int, default=10, help="idle screens polling availability")
+    parser.add_argument("--staff", type=int, default=1, help="staff tablets toggling flags")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--think", type=float, default=3.0, help="mean guest think time (s)")
+    parser.add_argument("--poll", type=float, default=15.0, help="availability poll interval (s)")
+    parser.add_argument("--menu-ttl", type=int, default=60, help="MENU_CACHE_TTL for the run")
+    parser.add_argument("--session-rate", type=float, default=600, help="SESSION_RATE (cost units/min)")
+    parser.add_argument("--sheets", default="150,600", help="Sheets latency p50,p95[,error_rate]")
+    parser.add_argument("--gemini", default="900,2500", help="Gemini latency p50,p95[,error_rate]")
+    parser.add_argument("--tts", default="300,900", help="TTS latency p50,p95[,error_rate]")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two saved runs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['git_rev'] or 'local'}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main_cli()
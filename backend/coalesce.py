@@ -0,0 +1,90 @@
+"""
+SUMI X Orator - Request coalescing
+Single-flight for the expensive upstream calls: concurrent identical requests
+(double taps, client retries) share one in-flight call, and a completed result
+is replayed for a short window. Requests are keyed on a canonical hash of the
+payload, scoped by the client's Idempotency-Key header when one is sent;
+keyed results are kept for longer so a retried POST gets the same answer.
+Failures are shared with callers already waiting but never replayed.
+
+Environment:
+  REPLAY_WINDOW=15         seconds a finished result is replayed
+  IDEMPOTENCY_WINDOW=300   replay window for requests with an Idempotency-Key
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+
+from metrics import Counter
+
+T = TypeVar("T")
+
+REPLAY_WINDOW = float(os.getenv("REPLAY_WINDOW", "15"))
+IDEMPOTENCY_WINDOW = float(os.getenv("IDEMPOTENCY_WINDOW", "300"))
+
+COALESCED = Counter(
+    "sumi_coalesced_requests_total", "Single-flight outcomes (leader, joined, replayed).", ("name", "outcome"))
+
+
+def payload_hash(payload) -> str:
+    """Stable hash of a JSON-able payload (dict key order doesn't matter)."""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Thread-safe single-flight group with a bounded replay cache."""
+
+    def __init__(self, name: str, replay_window: float = REPLAY_WINDOW, max_entries: int = 256):
+        self.name = name
+        self.replay_window = replay_window
+        self.max_entries = max_entries
+        self._inflight: dict[str, Future] = {}
+        self._done: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, payload, fn: Callable[[], T], idempotency_key: str | None = None) -> T:
+        """Return fn()'s result, sharing it with identical concurrent or recent calls."""
+        key = payload_hash(payload)
+        if idempotency_key:
+            key = f"{idempotency_key[:128]}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            cached = self._done.get(key)
+            if cached is not None and cached[0] > now:
+                self._done.move_to_end(key)
+                COALESCED.labels(name=self.name, outcome="replayed").inc()
+                return cached[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            COALESCED.labels(name=self.name, outcome="joined").inc()
+            return future.result()
+
+        COALESCED.labels(name=self.name, outcome="leader").inc()
+        try:
+            result = fn()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+        window = IDEMPOTENCY_WINDOW if idempotency_key else self.replay_window
+        with self._lock:
+            self._inflight.pop(key, None)
+            if window > 0:
+                self._done[key] = (time.monotonic() + window, result)
+                self._done.move_to_end(key)
+                while len(self._done) > self.max_entries:
+                    self._done.popitem(last=False)
+        future.set_result(result)
+        return result
@@ -1,6 +1,9 @@
 """
 SUMI X Orator - Menu & Staff Database (v2)
-Google Sheets with time-based caching for real-time admin sync.
+In-memory snapshot of a local SQLite copy of the Google Sheet (menu_store.py):
+reads and staff toggles never wait on the Sheets API, and a background sync
+pushes toggles/ratings/analytics to the Sheet and pulls its edits every
+MENU_CACHE_TTL seconds.
 
 Sheets:
   レギュラーメニュー: カテゴリ | メニュー名(日) | メニュー名(英) | メニュー説明(英) | 値段
@@ -15,84 +18,62 @@ Sheets:
 from __future__ import annotations
 
 import os
-import json
-import base64
 import time
 import logging
-from typing import Optional
+import threading
 
-import gspread
-from google.oauth2.service_account import Credentials
+import intents
+from allergens import AllergenIndex
+from menu_index import MENU_WINDOWS, MenuIndex, MenuItem, served_in_window, to_rows
+from menu_store import (ANALYTICS, CACHE_TTL, RATINGS, REGULAR, SPECIAL, STAFF, STORE,
+                        LocalStore, SheetSync, SheetsStore, local_path)
+from metrics import CACHE_EVENTS
+from tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
-
-CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "600"))  # seconds
-
 
 class MenuDatabase:
-    """Google Sheets menu & staff database with automatic refresh."""
+    """Menu & staff database: local snapshot of the Google Sheet, kept in sync in the background."""
 
-    def __init__(self):
-        creds = self._load_credentials()
-        client = gspread.authorize(creds)
-        sheet_id = os.getenv("GOOGLE_SHEET_ID", "")
+    def __init__(self, sheet_id: str | None = None):
+        # Seconds per init phase, reported in the startup breakdown log
+        self.init_timings: dict[str, float] = {}
+        sheet_id = sheet_id or os.getenv("GOOGLE_SHEET_ID", "")
         if not sheet_id:
             raise RuntimeError("GOOGLE_SHEET_ID is not set")
-        self._spreadsheet = client.open_by_key(sheet_id)
-
-        self._regular_sheet = self._spreadsheet.worksheet("レギュラーメニュー")
-        self._special_sheet = self._get_or_create_sheet("スペシャルメニュー", cols=12)
-        self._staff_sheet = self._get_or_create_sheet("Staff", cols=4)
-        self._store_sheet = self._get_or_create_sheet("店舗情報", cols=2,
-                                                       header=["項目名", "内容"])
-        self._ratings_sheet = self._get_or_create_sheet("Ratings", cols=4,
-                                                         header=["timestamp", "rating", "message_count", "lang"])
-        self._analytics_sheet = self._get_or_create_sheet("Analytics", cols=6,
-                                                          header=["timestamp", "session_id", "event", "data", "lang", "user_agent"])
-
-        self._regular_items: list[dict] = []
-        self._special_items: list[dict] = []
+        start = time.perf_counter()
+        self._local = LocalStore(local_path(sheet_id))
+        self._sync = SheetSync(self._local, lambda: self._connect(sheet_id), self._load_snapshot,
+                               name=f"sheet-sync-{sheet_id[:8]}")
+
         self._staff: list[dict] = []
-        self._last_fetch: float = 0
-        self.refresh()
-        logger.info("Connected to Google Sheet: %s", sheet_id)
-
-    @staticmethod
-    def _load_credentials() -> Credentials:
-        raw_b64 = os.getenv("GOOGLE_SHEETS_CREDENTIALS_B64", "")
-        if raw_b64:
-            raw = base64.b64decode(raw_b64).decode("utf-8")
-            info = json.loads(raw)
-            return Credentials.from_service_account_info(info, scopes=SCOPES)
-
-        raw = os.getenv("GOOGLE_SHEETS_CREDENTIALS", "")
-        if raw:
-            info = json.loads(raw)
-            return Credentials.from_service_account_info(info, scopes=SCOPES)
-
-        path = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE", "")
-        if path:
-            return Credentials.from_service_account_file(path, scopes=SCOPES)
-
-        raise RuntimeError(
-            "Set GOOGLE_SHEETS_CREDENTIALS_B64, GOOGLE_SHEETS_CREDENTIALS, "
-            "or GOOGLE_SHEETS_CREDENTIALS_FILE"
-        )
-
-    def _get_or_create_sheet(self, title: str, cols: int = 4, header: list[str] | None = None):
-        try:
-            return self._spreadsheet.worksheet(title)
-        except gspread.WorksheetNotFound:
-            ws = self._spreadsheet.add_worksheet(title, rows=1000, cols=cols)
-            if header:
-                ws.append_row(header)
-            logger.info("Created %s sheet tab.", title)
-            return ws
+        self._menu_contexts: dict[str | None, str] = {}
+        self._store_info: dict[str, str] = {}
+        self._allergens = AllergenIndex([], [])
+        self._menu = MenuIndex([], [], self._allergens)
+        self._snapshot_lock = threading.Lock()
+        self._data_version = -1
+        if self._local.has_snapshot():
+            # Serve the local copy right away; the sync thread pulls the Sheet in the background
+            self._load_snapshot()
+            self._sync.next_pull = 0
+            self.init_timings["local"] = time.perf_counter() - start
+            logger.info("Menu loaded from %s (%.0fs old)", self._local.path, self.cache_age())
+        else:
+            if not self._sync.pull():
+                self._load_snapshot()
+            self.init_timings["sheets"] = time.perf_counter() - start - self.init_timings.get("credentials", 0)
+        self._sync.start()
+
+    def _connect(self, sheet_id: str) -> SheetsStore:
+        remote = SheetsStore(sheet_id)
+        self.init_timings.update(remote.init_timings)
+        return remote
+
+    def close(self, timeout: float = 0):
+        """Stop the sync thread after a last push of queued writes."""
+        self._sync.close(timeout)
 
     # ------------------------------------------------------------------
     # Ratings
@@ -101,7 +82,8 @@ class MenuDatabase:
         from datetime import datetime
         from zoneinfo import ZoneInfo
         now = datetime.now(ZoneInfo("America/Vancouver")).strftime("%Y-%m-%d %H:%M:%S")
-        self._ratings_sheet.append_row([now, rating, message_count, lang])
+        self._local.append_rows(RATINGS, [[now, rating, message_count, lang]])
+        self._sync.kick()
         logger.info("Rating saved: %d stars", rating)
 
     def save_analytics(self, session_id: str, event: str, data: str = "",
@@ -109,90 +91,96 @@ class MenuDatabase:
         from datetime import datetime
         from zoneinfo import ZoneInfo
         now = datetime.now(ZoneInfo("America/Vancouver")).strftime("%Y-%m-%d %H:%M:%S")
-        self._analytics_sheet.append_row([now, session_id, event, data, lang, user_agent])
+        self._local.append_rows(ANALYTICS, [[now, session_id, event, data, lang, user_agent]])
+        self._sync.kick()
         logger.info("Analytics: %s %s", event, data[:50] if data else "")
 
     # ------------------------------------------------------------------
     # Cache management
     # ------------------------------------------------------------------
     def refresh(self):
-        """Fetch all rows from menu and staff sheets."""
-        self._regular_items = self._regular_sheet.get_all_records()
-        try:
-            self._special_items = self._special_sheet.get_all_records()
-        except Exception:
-            logger.warning("Special menu sheet read failed, using empty list")
-            self._special_items = []
-        try:
-            self._staff = self._staff_sheet.get_all_records()
-        except Exception:
-            logger.warning("Staff sheet read failed, using empty list")
-            self._staff = []
-        self._last_fetch = time.time()
-        logger.info("Refreshed: %d regular, %d special, %d staff",
-                     len(self._regular_items), len(self._special_items), len(self._staff))
+        """Sync with the Sheet now: push queued writes, pull every tab."""
+        self._sync.run_once()
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        """Rebuild the in-memory indexes and AI contexts from the local store."""
+        with self._snapshot_lock:
+            self._data_version = self._local.data_version()
+            tabs = self._local.read_tabs()
+            regular_rows, special_rows = tabs[REGULAR], tabs[SPECIAL]
+            self._staff = tabs[STAFF]
+            self._store_info = {r.get("項目名", ""): str(r.get("内容", "")) for r in tabs[STORE] if r.get("項目名")}
+            self._allergens = AllergenIndex(regular_rows, special_rows)
+            self._menu = MenuIndex(regular_rows, special_rows, self._allergens)
+            self._rebuild_menu_contexts()
+        logger.info("Snapshot: %d regular, %d special, %d staff",
+                     len(self._menu.regular), len(self._menu.special), len(self._staff))
+
+    def cache_age(self) -> float:
+        """Seconds since the last successful pull from the Sheet."""
+        return time.time() - self._sync.last_pull
 
     def refresh_if_stale(self):
-        if time.time() - self._last_fetch > CACHE_TTL:
-            try:
-                self.refresh()
-            except Exception:
-                logger.warning("Refresh failed, serving stale cache")
-                self._last_fetch = time.time()  # retry after TTL
+        """Pick up commits by other workers sharing the store; nudge the sync if a pull is overdue."""
+        if self._local.data_version() != self._data_version:
+            self._load_snapshot()
+        if self.cache_age() <= CACHE_TTL:
+            CACHE_EVENTS.labels(cache="menu", result="hit").inc()
+            return
+        CACHE_EVENTS.labels(cache="menu", result="miss").inc()
+        self._sync.kick()
 
     # ------------------------------------------------------------------
     # Regular menu
     # ------------------------------------------------------------------
-    def get_regular_items(self) -> list[dict]:
-        return self._regular_items
+    def get_regular_items(self) -> list[MenuItem]:
+        return self._menu.regular
 
-    def get_active_regular_items(self) -> list[dict]:
+    def get_active_regular_items(self) -> list[MenuItem]:
         """Return only regular items with 提供中 = TRUE."""
-        return [
-            item for item in self._regular_items
-            if str(item.get("提供中", "")).upper() == "TRUE"
-        ]
+        return self._menu.active_regular
 
     # ------------------------------------------------------------------
     # Special menu
     # ------------------------------------------------------------------
-    def get_special_items(self) -> list[dict]:
-        return self._special_items
+    def get_special_items(self) -> list[MenuItem]:
+        return self._menu.special
 
-    def get_recommended_specials(self) -> list[dict]:
+    def get_recommended_specials(self) -> list[MenuItem]:
         """Return special items with おすすめフラグ = TRUE."""
-        return [
-            item for item in self._special_items
-            if str(item.get("おすすめフラグ", "")).upper() == "TRUE"
-        ]
+        return self._menu.recommended_specials
 
     # ------------------------------------------------------------------
     # Combined menu operations
     # ------------------------------------------------------------------
-    def get_all_items(self) -> list[dict]:
-        return self._regular_items + self._special_items
+    def get_all_items(self) -> list[MenuItem]:
+        return self._menu.entries
+
+    def query_menu(self, **filters) -> list[MenuItem]:
+        """Filter the menu snapshot through its indexes (see MenuIndex.query)."""
+        return self._menu.query(**filters)
+
+    def answer_allergy_question(self, message: str, lang: str = "en-US") -> str | None:
+        """Template answer for an item-specific allergy question, or None."""
+        return self._allergens.answer(message, lang)
+
+    def answer_intent(self, message: str, lang: str = "en-US") -> str | None:
+        """Local answer for store-info/price questions, or None for Gemini."""
+        return intents.route(message, lang, self._menu, self._store_info)
 
-    def find_mentioned_items(self, text: str) -> list[dict]:
+    def find_mentioned_items(self, text: str) -> list[MenuItem]:
         """Find menu items whose English names appear in the given text.
         Matches longer names first to avoid substring false positives
         (e.g. 'Daikon' matching inside 'Daikon Salad').
         """
-        text_lower = text.lower()
-        all_items = self._regular_items + self._special_items
-        # Sort by name length descending so longer names match first
-        candidates = sorted(
-            [(item, item.get("メニュー名(英)", "")) for item in all_items if item.get("メニュー名(英)")],
-            key=lambda x: len(x[1]),
-            reverse=True,
-        )
         results = []
-        remaining = text_lower
-        for item, name in candidates:
-            name_lower = name.lower()
-            if name_lower in remaining:
+        remaining = text.lower()
+        for item in self._menu.by_name_length:
+            if item.name_lower in remaining:
                 results.append(item)
                 # Remove matched name so shorter substrings don't false-match
-                remaining = remaining.replace(name_lower, "", 1)
+                remaining = remaining.replace(item.name_lower, "", 1)
         return results
 
     # ------------------------------------------------------------------
@@ -226,13 +214,8 @@ class MenuDatabase:
     # Store info
     # ------------------------------------------------------------------
     def get_store_info(self) -> dict[str, str]:
-        """Read all key-value pairs from 店舗情報 sheet."""
-        try:
-            records = self._store_sheet.get_all_records()
-            return {r.get("項目名", ""): str(r.get("内容", "")) for r in records if r.get("項目名")}
-        except Exception:
-            logger.warning("Store info read failed")
-            return {}
+        """All key-value pairs from the 店舗情報 sheet."""
+        return self._store_info
 
     def get_store_info_context(self) -> str:
         """Build text summary of store info for the AI prompt."""
@@ -252,17 +235,7 @@ class MenuDatabase:
     # ------------------------------------------------------------------
     def get_availability(self) -> list[dict]:
         """Return メニュー名(英) + 提供中 for active menu items only."""
-        result = []
-        for item in self._regular_items:
-            name = item.get("メニュー名(英)", "")
-            provided = str(item.get("提供中", "")).upper()
-            if name and provided != "FALSE":
-                result.append({"メニュー名(英)": name, "提供中": provided == "TRUE"})
-        for item in self._special_items:
-            name = item.get("メニュー名(英)", "")
-            if name:
-                result.append({"メニュー名(英)": name, "提供中": True})
-        return result
+        return self._menu.availability
 
     def toggle_availability(self, menu_name: str, available: bool) -> bool:
         """Toggle 提供中 for a regular menu item."""
@@ -274,31 +247,25 @@ class MenuDatabase:
 
     def _toggle_regular_field(self, menu_name: str, field: str, value: bool) -> bool:
         """Toggle a boolean field on the regular menu sheet."""
-        header = self._regular_sheet.row_values(1)
-        try:
-            name_col_idx = header.index("メニュー名(英)") + 1
-            field_col_idx = header.index(field) + 1
-        except ValueError:
-            logger.warning("Column not found: %s", field)
+        return self._toggle(REGULAR, menu_name, field, value)
+
+    def _toggle(self, tab: str, menu_name: str, field: str, value: bool) -> bool:
+        """Apply locally (served from the next request on) and let the sync push it to the Sheet."""
+        if not self._local.update_cell(tab, menu_name, field, value):
+            logger.warning("Menu item not found for toggle: %s", menu_name)
             return False
-        name_values = self._regular_sheet.col_values(name_col_idx)
-        for i, name in enumerate(name_values):
-            if name == menu_name:
-                row_num = i + 1
-                self._regular_sheet.update_cell(row_num, field_col_idx, value)
-                logger.info("Toggled %s %s -> %s", menu_name, field, value)
-                return True
-        logger.warning("Menu item not found for toggle: %s", menu_name)
-        return False
+        self._load_snapshot()
+        self._sync.kick()
+        logger.info("Toggled %s %s -> %s", menu_name, field, value)
+        return True
 
     # ------------------------------------------------------------------
     # Special menu admin (staff UI)
     # ------------------------------------------------------------------
     def get_specials_for_staff(self) -> list[dict]:
         """Get special menu items for staff admin UI."""
-        col_data = self._special_sheet.get_all_records()
         results = []
-        for item in col_data:
+        for item in to_rows(self._menu.special):
             results.append({
                 "担当シェフ名": item.get("担当シェフ名", ""),
                 "カテゴリ": item.get("カテゴリ", ""),
@@ -314,98 +281,107 @@ class MenuDatabase:
         """Get regular menu items for staff admin UI with sold-out and recommend toggles."""
         return [
             {
-                "カテゴリ": item.get("カテゴリ", ""),
-                "メニュー名(英)": item.get("メニュー名(英)", ""),
-                "メニュー名(日)": item.get("メニュー名(日)", ""),
-                "値段": item.get("値段", ""),
-                "提供中": str(item.get("提供中", "")).upper() == "TRUE",
-                "おすすめフラグ": str(item.get("おすすめフラグ", "")).upper() == "TRUE",
+                "カテゴリ": entry.category,
+                "メニュー名(英)": entry.name,
+                "メニュー名(日)": entry.name_ja,
+                "値段": entry.price_value(),
+                "提供中": entry.available,
+                "おすすめフラグ": entry.recommended,
             }
-            for item in self._regular_items
+            for entry in self._menu.entries if entry.kind == "regular"
         ]
 
     def toggle_special_flag(self, menu_name: str, flag: str, value: bool) -> bool:
         """Toggle おすすめフラグ or 常駐フラグ for a special menu item."""
-        header = self._special_sheet.row_values(1)
-        try:
-            name_col_idx = header.index("メニュー名(英)") + 1  # 1-indexed
-            flag_col_idx = header.index(flag) + 1
-        except ValueError:
-            logger.warning("Column not found: %s", flag)
-            return False
-
-        name_values = self._special_sheet.col_values(name_col_idx)
-        for i, name in enumerate(name_values):
-            if name == menu_name:
-                row_num = i + 1
-                self._special_sheet.update_cell(row_num, flag_col_idx, value)
-                logger.info("Toggled %s %s -> %s", menu_name, flag, value)
-                return True
-        logger.warning("Special menu item not found: %s", menu_name)
-        return False
+        return self._toggle(SPECIAL, menu_name, flag, value)
 
     # ------------------------------------------------------------------
     # AI context builder
     # ------------------------------------------------------------------
-    def get_menu_context(self) -> str:
+    def get_menu_context(self, window: str | None = None) -> str:
+        """Return the AI menu summary for a time window ("lunch"/"dinner") or the full menu.
+        Variants are precomputed once per snapshot in refresh().
+        """
+        context = self._menu_contexts.get(window)
+        if context is None:
+            context = self._build_menu_context(window)
+        return context
+
+    def get_window_menu_contexts(self) -> dict[str, str]:
+        """Return the lunch and dinner menu context variants."""
+        return {w: self.get_menu_context(w) for w in MENU_WINDOWS}
+
+    def _rebuild_menu_contexts(self):
+        contexts: dict[str | None, str] = {None: self._build_menu_context(None)}
+        for window in MENU_WINDOWS:
+            contexts[window] = self._build_menu_context(window)
+        self._menu_contexts = contexts
+
+        full_tokens = estimate_tokens(contexts[None])
+        savings = []
+        for window in MENU_WINDOWS:
+            tokens = estimate_tokens(contexts[window])
+            pct = 100 * (full_tokens - tokens) / full_tokens if full_tokens else 0
+            savings.append(f"{window} ~{tokens} tokens (-{pct:.0f}%)")
+        logger.info("Menu context: full ~%d tokens, %s", full_tokens, ", ".join(savings))
+
+    def _build_menu_context(self, window: str | None) -> str:
         """Build a text summary for the AI system prompt."""
         lines: list[str] = []
 
         # Regular menu (active items only)
-        regular = self.get_active_regular_items()
+        regular = [item for item in self.get_active_regular_items()
+                   if served_in_window(item, window)]
         if regular:
-            categories: dict[str, list[dict]] = {}
+            categories: dict[str, list[MenuItem]] = {}
             for item in regular:
-                cat = item.get("カテゴリ", "その他")
-                categories.setdefault(cat, []).append(item)
+                categories.setdefault(item.category or "その他", []).append(item)
 
             lines.append("【レギュラーメニュー】")
             for cat, cat_items in categories.items():
                 lines.append(f"\n[{cat}]")
                 for item in cat_items:
-                    parts = [f"- {item['メニュー名(英)']}"]
-                    if item.get("値段"):
-                        parts.append(f"${item['値段']}")
-                    if item.get("メニュー説明(英)"):
-                        parts.append(f"- {item['メニュー説明(英)']}")
-                    if item.get("味・特徴"):
-                        parts.append(f"({item['味・特徴']})")
-                    if item.get("量感"):
-                        parts.append(f"[{item['量感']}]")
-                    if item.get("アレルギー情報"):
-                        parts.append(f"(Allergens: {item['アレルギー情報']})")
-                    if item.get("成分情報"):
-                        parts.append(f"(Ingredients: {item['成分情報']})")
-                    if item.get("おすすめ組み合わせ"):
-                        parts.append(f"Pairs well: {item['おすすめ組み合わせ']}")
-                    if item.get("備考"):
-                        parts.append(f"※{item['備考']}")
-                    recommended = str(item.get("おすすめフラグ", "")).upper() == "TRUE"
-                    if recommended:
+                    parts = [f"- {item.name}"]
+                    if item.price_label:
+                        parts.append(f"${item.price_label}")
+                    if item.description:
+                        parts.append(f"- {item.description}")
+                    if item.taste:
+                        parts.append(f"({item.taste})")
+                    if item.portion:
+                        parts.append(f"[{item.portion}]")
+                    if item.allergen_info:
+                        parts.append(f"(Allergens: {item.allergen_info})")
+                    if item.ingredients:
+                        parts.append(f"(Ingredients: {item.ingredients})")
+                    if item.pairing:
+                        parts.append(f"Pairs well: {item.pairing}")
+                    if item.notes:
+                        parts.append(f"※{item.notes}")
+                    if item.recommended:
                         parts.append("[RECOMMENDED]")
                     lines.append(" ".join(parts))
 
         # Special menu
-        specials = self._special_items
+        specials = self._menu.special
         if specials:
             lines.append("\n\n【スペシャルメニュー】")
             for item in specials:
-                parts = [f"- {item.get('メニュー名(英)', '')}"]
-                if item.get("値段"):
-                    parts.append(f"${item['値段']}")
-                if item.get("メニュー説明(英)"):
-                    parts.append(f"- {item['メニュー説明(英)']}")
-                if item.get("担当シェフ名"):
-                    parts.append(f"[Chef: {item['担当シェフ名']}]")
-                if item.get("味・特徴"):
-                    parts.append(f"({item['味・特徴']})")
-                if item.get("量感"):
-                    parts.append(f"[{item['量感']}]")
-                recommended = str(item.get("おすすめフラグ", "")).upper() == "TRUE"
-                if recommended:
+                parts = [f"- {item.name}"]
+                if item.price_label:
+                    parts.append(f"${item.price_label}")
+                if item.description:
+                    parts.append(f"- {item.description}")
+                if item.chef:
+                    parts.append(f"[Chef: {item.chef}]")
+                if item.taste:
+                    parts.append(f"({item.taste})")
+                if item.portion:
+                    parts.append(f"[{item.portion}]")
+                if item.recommended:
                     parts.append("[RECOMMENDED]")
-                if item.get("備考"):
-                    parts.append(f"※{item['備考']}")
+                if item.notes:
+                    parts.append(f"※{item.notes}")
                 lines.append(" ".join(parts))
 
         if not lines:
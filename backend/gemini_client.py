@@ -0,0 +1,38 @@
+"""
+SUMI X Orator - Shared Gemini client
+Imports and configures google.generativeai once, on first use, so the SDK
+(grpc, protobuf) stays out of the import path until a model is actually built.
+AIHandler and TrainingHandler share the same configured module.
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_genai = None
+
+# Seconds spent importing the SDK (reported in the startup breakdown log)
+import_seconds: float = 0.0
+
+
+def get_genai():
+    """Return the configured google.generativeai module, importing it on first call."""
+    global _genai, import_seconds
+    if _genai is not None:
+        return _genai
+    with _lock:
+        if _genai is None:
+            api_key = os.getenv("GEMINI_API_KEY", "")
+            if not api_key:
+                raise RuntimeError("GEMINI_API_KEY is not set")
+            start = time.perf_counter()
+            import google.generativeai as genai
+            import_seconds = time.perf_counter() - start
+            genai.configure(api_key=api_key)
+            logger.info("Gemini SDK imported and configured in %.2fs.", import_seconds)
+            _genai = genai
+    return _genai
@@ -0,0 +1,189 @@
+"""
+SUMI X Orator - Conversation history compaction
+Replaces the fixed "last 20 messages" window with a token budget: recent
+turns are kept verbatim, older turns are folded into a rolling summary, and
+turns that mention allergies are always carried forward word for word.
+
+The fold boundary moves in chunks, so the summary is recomputed only every
+few turns; each summary is cached by a hash of the messages it covers and
+extends the longest summary already cached, so it is computed once and reused.
+
+Environment:
+  HISTORY_TOKEN_BUDGET=1200   verbatim history budget (estimated tokens)
+  HISTORY_SUMMARY=extractive  skip the Gemini summary call (default: gemini)
+  HISTORY_SUMMARY_MODEL       model used for summaries (default gemini-2.5-flash)
+"""
+
+from __future__ import annotations
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import usage
+from allergens import ALLERGY_KEYWORDS
+from gemini_client import get_genai
+from metrics import CACHE_EVENTS, Histogram, track_upstream
+from resilience import GEMINI
+from tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_SUMMARY = os.getenv("HISTORY_SUMMARY", "gemini")
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gemini-2.5-flash")
+MIN_RECENT = 4      # always keep at least the last two exchanges verbatim
+FOLD_CHUNK = 6      # fold older messages three exchanges at a time
+MAX_SUMMARIES = 1024
+
+HISTORY_TOKENS = Histogram(
+    "sumi_history_input_tokens", "Estimated history tokens sent per call after compaction.", ("handler",),
+    buckets=(50, 100, 250, 500, 1000, 1500, 2500, 5000, 10000))
+
+SUMMARY_PROMPT = """\
+Summarize this restaurant chat between a guest and the assistant in at most 4 short
+bullet points (English). Keep dishes discussed or ordered, party size, preferences,
+dislikes and anything about allergies or diet. No Markdown headings.
+
+{previous}{transcript}"""
+
+Summarizer = Callable[[str, list[dict]], str]
+
+
+def mentions_allergy(text: str) -> bool:
+    lowered = text.lower()
+    return any(kw in lowered for kw in ALLERGY_KEYWORDS)
+
+
+def _transcript(messages: list[dict]) -> str:
+    return "\n".join(f"{'Guest' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages)
+
+
+def extractive_summary(previous: str, messages: list[dict]) -> str:
+    """Zero-cost fallback: the first sentence-ish of each older guest turn."""
+    lines = [previous] if previous else []
+    for m in messages:
+        if m["role"] == "user":
+            lines.append(f"- Guest: {m['content'][:80]}")
+    return "\n".join(lines[-8:])
+
+
+_summary_model = None
+_summary_model_lock = threading.Lock()
+
+
+def gemini_summary(previous: str, messages: list[dict]) -> str:
+    """Summarize with a small Gemini call; falls back to the extractive summary."""
+    global _summary_model
+    if usage.mode("gemini") != "normal":
+        return extractive_summary(previous, messages)  # near the daily budget
+    try:
+        if _summary_model is None:
+            with _summary_model_lock:
+                if _summary_model is None:
+                    genai = get_genai()
+                    _summary_model = genai.GenerativeModel(
+                        model_name=HISTORY_SUMMARY_MODEL,
+                        generation_config=genai.GenerationConfig(temperature=0.2, max_output_tokens=200),
+                    )
+        prompt = SUMMARY_PROMPT.format(
+            previous=f"Summary so far:\n{previous}\n\nNew messages:\n" if previous else "",
+            transcript=_transcript(messages))
+
+        def attempt():
+            with track_upstream("gemini", "summary"):
+                return _summary_model.generate_content(prompt, request_options={"timeout": GEMINI.timeout})
+
+        response = GEMINI.call(attempt, hedge=False)
+        usage.record_gemini(response, HISTORY_SUMMARY_MODEL)
+        return response.text.strip()
+    except Exception:
+        logger.warning("History summary failed, using extractive summary")
+        return extractive_summary(previous, messages)
+
+
+class HistoryManager:
+    """Token-budgeted history for one handler, with a shared summary cache."""
+
+    def __init__(self, name: str, budget: int = HISTORY_TOKEN_BUDGET,
+                 summarizer: Summarizer | None = None):
+        self.name = name
+        self.budget = budget
+        if summarizer is None:
+            summarizer = extractive_summary if HISTORY_SUMMARY == "extractive" else gemini_summary
+        self._summarize = summarizer
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, history: list[dict] | None) -> list[dict]:
+        """Return Gemini chat history ({"role", "parts"}) within the token budget."""
+        messages = [m for m in (history or []) if m.get("content")]
+        split = self._fold_point(messages)
+        older, recent = messages[:split], messages[split:]
+
+        result: list[dict] = []
+        if older:
+            summary = self._summary_for(older)
+            pinned = [m for m in older if m["role"] == "user" and mentions_allergy(m["content"])]
+            preamble = f"[Earlier in this conversation]\n{summary}"
+            if pinned:
+                preamble += "\n[Guest said earlier, verbatim]\n" + "\n".join(f"- {m['content']}" for m in pinned)
+            result += [{"role": "user", "parts": [preamble]},
+                       {"role": "model", "parts": ["Got it, I'll keep that in mind."]}]
+        for m in recent:
+            role = "model" if m["role"] == "assistant" else "user"
+            result.append({"role": role, "parts": [m["content"]]})
+        HISTORY_TOKENS.labels(handler=self.name).observe(
+            sum(estimate_tokens(p) for msg in result for p in msg["parts"]))
+        return result
+
+    def _fold_point(self, messages: list[dict]) -> int:
+        """Index before which messages are folded into the summary.
+        Recent messages are kept while they fit the budget (at least MIN_RECENT);
+        the boundary rounds up to a FOLD_CHUNK multiple so it only moves every
+        few turns, and the verbatim part always starts on a guest turn.
+        """
+        used = 0
+        keep_from = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            used += estimate_tokens(messages[i]["content"])
+            if used > self.budget and len(messages) - i > MIN_RECENT:
+                break
+            keep_from = i
+        if keep_from == 0:
+            return 0
+        split = min(-(-keep_from // FOLD_CHUNK) * FOLD_CHUNK, len(messages) - MIN_RECENT)
+        split = max(split, 0)
+        while split < len(messages) - 1 and messages[split]["role"] != "user":
+            split += 1
+        return split
+
+    def _summary_for(self, older: list[dict]) -> str:
+        """Rolling summary of `older`, extending the longest cached prefix."""
+        digests = []
+        digest = hashlib.sha256()
+        for m in older:
+            digest.update(f"{m['role']}\x00{m['content']}\x01".encode("utf-8"))
+            digests.append(digest.copy().hexdigest())
+
+        with self._lock:
+            cached = self._summaries.get(digests[-1])
+            if cached is not None:
+                self._summaries.move_to_end(digests[-1])
+                CACHE_EVENTS.labels(cache="history_summary", result="hit").inc()
+                return cached
+            start, previous = 0, ""
+            for i in range(len(digests) - 2, -1, -1):
+                if digests[i] in self._summaries:
+                    start, previous = i + 1, self._summaries[digests[i]]
+                    break
+        CACHE_EVENTS.labels(cache="history_summary", result="miss").inc()
+        summary = self._summarize(previous, older[start:])
+        with self._lock:
+            self._summaries[digests[-1]] = summary
+            while len(self._summaries) > MAX_SUMMARIES:
+                self._summaries.popitem(last=False)
+        return summary
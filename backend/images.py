@@ -0,0 +1,222 @@
+"""
+SUMI X Orator - Menu image variants
+Width-bounded thumbnails (grid cards) and detail images of the menu photos in
+frontend/public/menu, in AVIF or WebP when the browser's Accept header allows
+it, else JPEG. Each variant is generated once into a size-bounded disk cache
+(least recently served files are evicted first; files served in the last
+EVICT_GRACE seconds are kept so a response being sent never loses its file).
+URLs carry a content hash of the source photo, so responses can be cached as
+immutable. The URLs are memoized per photo for menu responses and re-checked
+against the photo file every URL_TTL seconds.
+
+Pillow is optional: without it the original photo is served as-is.
+
+Environment:
+  MENU_IMAGE_DIR             source photos (default ../frontend/public/menu)
+  IMAGE_CACHE_DIR            generated variants (default /tmp/sumi-image-cache)
+  IMAGE_CACHE_MAX_BYTES=200000000
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+import hashlib
+import logging
+import mimetypes
+import threading
+from pathlib import Path
+
+from coalesce import SingleFlight
+from metrics import CACHE_EVENTS
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # optional: serve the original photos
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+MENU_IMAGE_DIR = Path(os.getenv("MENU_IMAGE_DIR", _BACKEND_DIR.parent / "frontend" / "public" / "menu"))
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", "/tmp/sumi-image-cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", "200000000"))
+
+# Variant name -> max width in px (2x the CSS width of the card on a phone)
+SIZES = {"thumb": 360, "detail": 900}
+
+# Preferred first; quality tuned per codec for similar perceived quality
+FORMATS = {
+    "avif": ("image/avif", {"quality": 50}),
+    "webp": ("image/webp", {"quality": 75, "method": 4}),
+    "jpeg": ("image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+URL_TTL = 60.0      # seconds a memoized photo URL is trusted before the file is re-checked
+EVICT_GRACE = 30.0  # variants served this recently are never evicted
+
+_NAME = re.compile(r"^[A-Za-z0-9][\w.-]*\.(jpe?g|png|webp)$", re.I)
+
+
+def supported_formats() -> list[str]:
+    if Image is None:
+        return []
+    return [fmt for fmt in FORMATS if fmt == "jpeg" or features.check(fmt)]
+
+
+def negotiate(accept: str) -> str:
+    """Best format the client accepts and this Pillow build can encode."""
+    accept = accept.lower()
+    for fmt in supported_formats():
+        if fmt == "jpeg" or FORMATS[fmt][0] in accept:
+            return fmt
+    return "jpeg"
+
+
+def source_path(name: str) -> Path | None:
+    """The source photo for a bare file name; rejects anything path-like."""
+    if not _NAME.match(name):
+        return None
+    path = MENU_IMAGE_DIR / name
+    return path if path.is_file() else None
+
+
+class VariantCache:
+    """Generates variants on first request and keeps them on disk."""
+
+    def __init__(self, directory: Path = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._versions: dict[str, tuple[tuple[float, int], str]] = {}
+        self._urls: dict[str, tuple[float, dict[str, str] | None]] = {}  # name -> (checked, urls)
+        self._flight = SingleFlight("image", replay_window=0)
+        self._lock = threading.Lock()
+        self._bytes: int | None = None  # measured lazily on first write
+        self._undecodable: set[str] = set()
+
+    def version(self, name: str) -> str | None:
+        """Short content hash of the source photo (re-hashed when it changes)."""
+        path = source_path(name)
+        if path is None:
+            return None
+        stat = path.stat()
+        stamp = (stat.st_mtime, stat.st_size)
+        cached = self._versions.get(name)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:10]
+        self._versions[name] = (stamp, digest)
+        self._urls.pop(name, None)
+        return digest
+
+    def urls(self, photo_url: str) -> dict[str, str] | None:
+        """Variant URLs for a 写真URL like /menu/daikon.jpg, or None if it isn't a local photo."""
+        if not photo_url or not photo_url.startswith("/menu/"):
+            return None
+        name = photo_url.rsplit("/", 1)[-1]
+        now = time.monotonic()
+        cached = self._urls.get(name)
+        if cached is None or now - cached[0] > URL_TTL:
+            version = self.version(name)
+            urls = None if version is None else {size: f"/api/images/{size}/{name}?v={version}" for size in SIZES}
+            cached = self._urls[name] = (now, urls)
+        return dict(cached[1]) if cached[1] else None
+
+    def variant(self, name: str, size: str, fmt: str) -> tuple[Path, str]:
+        """Path and media type of a variant, generating it if needed.
+        Raises FileNotFoundError for unknown photos.
+        """
+        source = source_path(name)
+        if source is None or size not in SIZES:
+            raise FileNotFoundError(name)
+        if Image is None:
+            return source, _media_type(source)
+        width = SIZES[size]
+        target = self.directory / f"{Path(name).stem}-{self.version(name)}-{width}.{fmt}"
+        if _touch(target):
+            CACHE_EVENTS.labels(cache="image_variant", result="hit").inc()
+        elif target.name in self._undecodable:
+            return source, _media_type(source)
+        else:
+            CACHE_EVENTS.labels(cache="image_variant", result="miss").inc()
+            try:
+                self._flight.do({"target": str(target)}, lambda: self._generate(source, target, width, fmt))
+                self._urls.pop(name, None)
+            except OSError:
+                # e.g. a HEIC photo saved as .jpg: serve it untouched rather than fail the card
+                logger.warning("Cannot decode menu photo %s; serving the original", name, exc_info=True)
+                self._undecodable.add(target.name)
+                return source, _media_type(source)
+        return target, FORMATS[fmt][0]
+
+    def _generate(self, source: Path, target: Path, width: int, fmt: str) -> Path:
+        if target.exists():
+            return target
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+            if img.mode not in ("RGB", "RGBA") or fmt == "jpeg":
+                img = img.convert("RGB")
+            tmp = target.with_suffix(target.suffix + ".tmp")
+            img.save(tmp, format=fmt.upper(), **FORMATS[fmt][1])
+        os.replace(tmp, target)
+        logger.info("Image variant %s: %d bytes (source %d)", target.name,
+                    target.stat().st_size, source.stat().st_size)
+        self._account(target.stat().st_size)
+        return target
+
+    def _account(self, added: int):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file())
+            else:
+                self._bytes += added
+            if self._bytes <= self.max_bytes:
+                return
+            files = sorted((p for p in self.directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime)
+            recent = time.time() - EVICT_GRACE
+            for path in files:
+                if self._bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    stat = path.stat()
+                    if stat.st_mtime > recent:
+                        break  # sorted by mtime: the rest were served (or written) just now
+                    size = stat.st_size
+                    path.unlink()
+                    self._bytes -= size
+                    CACHE_EVENTS.labels(cache="image_variant", result="evicted").inc()
+                except FileNotFoundError:
+                    pass
+
+
+def _media_type(path: Path) -> str:
+    """Media type of an original photo served as is."""
+    return mimetypes.guess_type(path.name)[0] or "image/jpeg"
+
+
+def _touch(target: Path) -> bool:
+    """Mark a variant as just served (eviction goes by last served time); False if it is missing."""
+    try:
+        os.utime(target)
+        return True
+    except FileNotFoundError:  # never generated, or evicted since
+        return False
+
+
+cache = VariantCache()
+
+
+def menu_rows(items) -> list[dict]:
+    """API rows for MenuItems (MenuItem.to_row()), with an "images" entry for items with a local photo."""
+    rows = []
+    for item in items:
+        row = item.to_row()
+        urls = cache.urls(item.photo_url)
+        if urls:
+            row["images"] = urls
+        rows.append(row)
+    return rows
@@ -0,0 +1,226 @@
+"""
+SUMI X Orator - Local intent router
+Keyword/pattern classifier that answers store-info (hours, location, phone)
+and price questions straight from the 店舗情報 sheet and the 値段 column, in
+all six chat languages. Anything below the confidence threshold, ambiguous,
+or mixed with other asks falls through to Gemini.
+
+Environment:
+  INTENT_ROUTER=0        disable the router (every turn goes to Gemini)
+  INTENT_THRESHOLD=0.75  minimum confidence to answer locally
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import NamedTuple
+
+from menu_index import MenuIndex
+from metrics import Counter
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER", "1") == "1"
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.75"))
+
+INTENT_TURNS = Counter(
+    "sumi_intent_router_total", "Chat turns seen by the local intent router.", ("intent", "outcome"))
+
+STRONG, WEAK = 0.9, 0.6
+
+# intent -> [(pattern, weight)]; patterns run against the lowercased message
+PATTERNS: dict[str, list[tuple[str, float]]] = {
+    "hours": [
+        (r"what time (do|does|are|is) .*(open|close)", STRONG),
+        (r"when (do|are|does) (you|it|the restaurant|the kitchen|guu) (open|close)", STRONG),
+        (r"(opening|business|closing|your) hours|\bhours\b", STRONG),
+        (r"are you (still )?open|last (order|call)", STRONG),
+        (r"\b(open|close|closing)\b", WEAK),
+        (r"営業時間|何時から|何時まで|何時に(開|閉)|閉店|開店|ラストオーダー|定休日|やってますか", STRONG),
+        (r"영업\s?시간|몇 시(에|까지|부터)|문 (열|닫)|마감|라스트 ?오더", STRONG),
+        (r"营业时间|几点(开|关|营业|打烊)|关门|开门|打烊", STRONG),
+        (r"horario|a qu[eé] hora (abren|cierran|abre|cierra)|est[aá]n abiertos", STRONG),
+        (r"hor[aá]rio|que horas (abre|fecha|abrem|fecham)|est[aã]o abertos", STRONG),
+    ],
+    "location": [
+        (r"where (are you|is (the|this) (restaurant|place|store)|is guu)|\baddress\b", STRONG),
+        (r"how (do i|to|can i) get (there|here)|directions to|located", STRONG),
+        (r"\blocation\b", WEAK),
+        (r"住所|場所はどこ|どこにあ|アクセス|行き方", STRONG),
+        (r"주소|위치|어디에 있|어떻게 가", STRONG),
+        (r"地址|在哪|位置|怎么去", STRONG),
+        (r"direcci[oó]n|d[oó]nde (est[aá]n|queda|est[aá] el restaurante)|ubicaci[oó]n", STRONG),
+        (r"endere[cç]o|onde (fica|voc[eê]s ficam|est[aá] o restaurante)|localiza[cç][aã]o", STRONG),
+    ],
+    "phone": [
+        (r"phone( number)?|telephone|call (you|the restaurant)", STRONG),
+        (r"電話", STRONG),
+        (r"전화", STRONG),
+        (r"电话", STRONG),
+        (r"tel[eé]fono|llamar", STRONG),
+        (r"telefone|ligar para", STRONG),
+    ],
+    "price": [
+        (r"how much|\bprice\b|\bcost\b|\bcosts\b", STRONG),
+        (r"いくら|値段|価格|料金", STRONG),
+        (r"얼마|가격", STRONG),
+        (r"多少钱|价格|价钱|多少錢", STRONG),
+        (r"cu[aá]nto (cuesta|vale|es)|precio", STRONG),
+        (r"quanto (custa|[eé])|pre[cç]o", STRONG),
+    ],
+}
+
+# Other asks in the same turn lower confidence: the LLM should handle the mix
+_OTHER_ASKS = re.compile(
+    r"recommend|suggest|best|popular|spicy|allerg|vegan|vegetarian|halal|gluten|pair|with beer|"
+    r"おすすめ|オススメ|人気|辛い|アレルギー|추천|인기|맵|알레르기|推荐|人气|辣|过敏|"
+    r"recomienda|recomendaci|picante|alergia|recomenda|apimentad")
+
+_COMPILED = {intent: [(re.compile(p), w) for p, w in rules] for intent, rules in PATTERNS.items()}
+
+STORE_KEYS = {
+    "hours": ("営業時間", "定休日"),
+    "location": ("住所",),
+    "phone": ("電話番号",),
+}
+
+# Labels inside 店舗情報 keys like 営業時間(ランチ)
+_KEY_LABELS = {
+    "ランチ": {"en-US": "Lunch", "ja-JP": "ランチ", "ko-KR": "런치", "zh-CN": "午餐", "es-ES": "Almuerzo", "pt-BR": "Almoço"},
+    "ディナー": {"en-US": "Dinner", "ja-JP": "ディナー", "ko-KR": "디너", "zh-CN": "晚餐", "es-ES": "Cena", "pt-BR": "Jantar"},
+    "定休日": {"en-US": "Closed", "ja-JP": "定休日", "ko-KR": "휴무", "zh-CN": "休息日", "es-ES": "Cerrado", "pt-BR": "Fechado"},
+}
+
+TEMPLATES: dict[str, dict[str, str]] = {
+    "en-US": {
+        "hours": "Our hours: {value}.",
+        "location": "We're at {value}.",
+        "phone": "You can call us at {value}.",
+        "price": "{item} is ${price}.",
+        "sold_out": "{item} is ${price}, but it's sold out right now.",
+    },
+    "ja-JP": {
+        "hours": "営業時間は{value}です。",
+        "location": "住所は{value}です。",
+        "phone": "電話番号は{value}です。",
+        "price": "{item}は${price}です。",
+        "sold_out": "{item}は${price}ですが、ただいま売り切れです。",
+    },
+    "ko-KR": {
+        "hours": "영업시간은 {value}입니다.",
+        "location": "주소는 {value}입니다.",
+        "phone": "전화번호는 {value}입니다.",
+        "price": "{item}은(는) ${price}입니다.",
+        "sold_out": "{item}은(는) ${price}이지만 지금은 품절입니다.",
+    },
+    "zh-CN": {
+        "hours": "我们的营业时间：{value}。",
+        "location": "我们的地址：{value}。",
+        "phone": "我们的电话：{value}。",
+        "price": "{item}是${price}。",
+        "sold_out": "{item}是${price}，但现在已售完。",
+    },
+    "es-ES": {
+        "hours": "Nuestro horario: {value}.",
+        "location": "Estamos en {value}.",
+        "phone": "Puedes llamarnos al {value}.",
+        "price": "{item} cuesta ${price}.",
+        "sold_out": "{item} cuesta ${price}, pero ahora mismo está agotado.",
+    },
+    "pt-BR": {
+        "hours": "Nosso horário: {value}.",
+        "location": "Estamos em {value}.",
+        "phone": "Você pode nos ligar no {value}.",
+        "price": "{item} custa ${price}.",
+        "sold_out": "{item} custa ${price}, mas está esgotado agora.",
+    },
+}
+
+
+class Classification(NamedTuple):
+    intent: str | None      # best intent, or None
+    confidence: float
+    scores: dict[str, float]
+
+
+def classify(message: str) -> Classification:
+    """Score every intent: best matching weight, +0.1 per extra match, penalised
+    for long or mixed messages. Ties between intents lower the winner's confidence.
+    """
+    text = message.lower().strip()
+    scores: dict[str, float] = {}
+    for intent, rules in _COMPILED.items():
+        weights = sorted((w for pattern, w in rules if pattern.search(text)), reverse=True)
+        if weights:
+            scores[intent] = min(1.0, weights[0] + 0.1 * (len(weights) - 1))
+    if not scores:
+        return Classification(None, 0.0, scores)
+    penalty = 1.0
+    if _OTHER_ASKS.search(text):
+        penalty *= 0.5
+    if len(text) > 120:
+        penalty *= 0.6
+    scores = {k: round(v * penalty, 3) for k, v in scores.items()}
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    intent, confidence = ranked[0]
+    if len(ranked) > 1 and ranked[1][1] >= INTENT_THRESHOLD and not (
+            intent in STORE_KEYS and ranked[1][0] in STORE_KEYS):
+        # Price + store info in one turn: let the model answer both
+        confidence = round(confidence * 0.5, 3)
+    return Classification(intent, confidence, scores)
+
+
+def route(message: str, lang: str, menu: MenuIndex, store_info: dict[str, str]) -> str | None:
+    """Local answer for a confidently classified turn, or None to fall through."""
+    if not INTENT_ROUTER_ENABLED:
+        return None
+    result = classify(message)
+    if result.intent is None:
+        INTENT_TURNS.labels(intent="none", outcome="fallthrough").inc()
+        return None
+    if result.confidence < INTENT_THRESHOLD:
+        INTENT_TURNS.labels(intent=result.intent, outcome="low_confidence").inc()
+        return None
+    t = TEMPLATES.get(lang, TEMPLATES["en-US"])
+    if result.intent == "price":
+        reply = _price_answer(message, menu, lang, t)
+    else:
+        # Store intents can combine ("where are you and when do you close?")
+        asked = [i for i, s in result.scores.items() if i in STORE_KEYS and s >= INTENT_THRESHOLD]
+        parts = [_store_answer(i, store_info, lang, t) for i in asked]
+        reply = None if None in parts else _join(parts, lang)
+    INTENT_TURNS.labels(intent=result.intent, outcome="answered" if reply else "no_data").inc()
+    return reply
+
+
+def _store_answer(intent: str, store_info: dict[str, str], lang: str, t: dict[str, str]) -> str | None:
+    values = []
+    for key, value in store_info.items():
+        if not value or not key.startswith(STORE_KEYS[intent]):
+            continue
+        label = re.search(r"[(（](.+?)[)）]", key)
+        label = label.group(1) if label else (key if key in _KEY_LABELS else "")
+        if label:
+            values.append(f"{_KEY_LABELS.get(label, {}).get(lang, label)}: {value}")
+        else:
+            values.append(value)
+    return t[intent].format(value=" / ".join(values)) if values else None
+
+
+def _price_answer(message: str, menu: MenuIndex, lang: str, t: dict[str, str]) -> str | None:
+    groups = menu.mentioned(message)
+    if not groups or len(groups) > 3:
+        return None
+    sentences = []
+    for rows in groups:
+        prices = {e.price for e in rows}
+        if len(prices) != 1 or None in prices:
+            return None  # unpriced, or the same name at different prices
+        price = prices.pop()
+        price_text = f"{price:g}" if price == int(price) else f"{price:.2f}"
+        template = "price" if any(e.available for e in rows) else "sold_out"
+        sentences.append(t[template].format(item=rows[0].name, price=price_text))
+    return _join(sentences, lang)
+
+
+def _join(sentences: list[str], lang: str) -> str:
+    return ("" if lang in ("ja-JP", "zh-CN") else " ").join(sentences)
@@ -5,68 +5,133 @@ FastAPI + Gemini 1.5 Flash + Google Sheets
 Start command: uvicorn main:app --host 0.0.0.0 --port $PORT
 """
 
+import time
+
+_import_start = time.perf_counter()
+
 import os
 import hmac
 import hashlib
+import asyncio
 import logging
 from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import FileResponse, Response, JSONResponse
 from pydantic import BaseModel, field_validator
 from slowapi import Limiter
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
 
-from database import MenuDatabase
-from ai_handler import AIHandler
-from tts_handler import TTSHandler
-from training_handler import TrainingHandler
+import gemini_client
+import images
+import menu_export
+import metrics
+import profiling
+import tenants
+import tts_prewarm
+import usage
+from profiling import span
+from allergens import ALLERGY_KEYWORDS
+from admission import Overloaded, SESSION_HEADER
+from admission import controller as admission
+from audio_store import AudioNotFound
+from audio_store import store as audio_store
+from resilience import TTS, CircuitOpenError, UpstreamTimeout
+from ai_handler import FALLBACK_REPLY
+from tenants import Tenant, TenantMiddleware
+from tts_handler import AUDIO_FORMATS, TTSHandler, negotiate
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db: MenuDatabase | None = None
-ai: AIHandler | None = None
+_IMPORT_SECONDS = time.perf_counter() - _import_start
+
+# Menu snapshots and chat/training models are per store (tenants.registry);
+# the TTS client is shared
 tts: TTSHandler | None = None
-trainer: TrainingHandler | None = None
 
+# Background task that imports the Google SDKs and builds the AI/TTS clients
+_warmup: asyncio.Task | None = None
+# Background job keeping menu names and stock phrases pre-synthesized
+_tts_prewarm: asyncio.Task | None = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global db, ai, tts, trainer
-    logger.info("Starting SUMI X Orator API ...")
+
+def _import_sdks(timings: dict[str, float]):
+    """Import the heavy Google SDKs (runs in a thread, overlapping Sheets I/O)."""
+    start = time.perf_counter()
     try:
-        db = MenuDatabase()
-        logger.info("Google Sheets connected.")
+        gemini_client.get_genai()
     except Exception:
-        logger.exception("Google Sheets init failed")
-        db = None
+        logger.exception("Gemini SDK import failed")
     try:
-        ai = AIHandler(
-            menu_context=db.get_menu_context() if db else "",
-            staff_context=db.get_staff_context() if db else "",
-            restaurant_info=db.get_store_info_context() if db else "",
-        )
-        logger.info("Gemini AI ready.")
+        from google.cloud import texttospeech  # noqa: F401
     except Exception:
-        logger.exception("Gemini init failed")
-        ai = None
+        logger.exception("TTS SDK import failed")
+    timings["sdk_import"] = time.perf_counter() - start
+
+
+def _build_handlers(timings: dict[str, float]):
+    """Build the preloaded stores' Gemini models and the TTS client (runs in a thread)."""
+    global tts
+    start = time.perf_counter()
+    tenants.registry.build_handlers()
+    timings["model_build"] = time.perf_counter() - start
+    start = time.perf_counter()
     try:
         tts = TTSHandler()
         logger.info("Google Cloud TTS ready.")
     except Exception:
         logger.exception("TTS init failed")
         tts = None
-    try:
-        trainer = TrainingHandler(menu_context=db.get_menu_context() if db else "")
-        logger.info("Training AI ready.")
-    except Exception:
-        logger.exception("Training init failed")
-        trainer = None
-    logger.info("Startup complete.")
+    timings["tts_client"] = time.perf_counter() - start
+
+
+async def _warm_up(sdk_import: asyncio.Task, timings: dict[str, float], boot_start: float):
+    await sdk_import
+    await asyncio.to_thread(_build_handlers, timings)
+    timings["total"] = time.perf_counter() - boot_start
+    logger.info("Startup breakdown: %s",
+                " ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+
+async def _prewarm_tts():
+    await wait_for_warmup()
+    await tts_prewarm.prewarmer.run_forever(lambda: tts, tenants.registry.databases)
+
+
+async def wait_for_warmup():
+    """Block AI/TTS endpoints until the background warm-up has finished."""
+    if _warmup is not None and not _warmup.done():
+        await asyncio.shield(_warmup)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _warmup, _tts_prewarm
+    logger.info("Starting SUMI X Orator API ...")
+    boot_start = time.perf_counter()
+    timings: dict[str, float] = {"import": _IMPORT_SECONDS}
+    # SDK imports are CPU-bound and Sheets init is network-bound, so overlap them
+    sdk_import = asyncio.create_task(asyncio.to_thread(_import_sdks, timings))
+    await tenants.registry.preload()
+    for db in tenants.registry.databases():
+        timings.update(db.init_timings)
+    metrics.MENU_CACHE_AGE.labels().set_function(tenants.registry.cache_age)
+    _warmup = asyncio.create_task(_warm_up(sdk_import, timings, boot_start))
+    if tts_prewarm.TTS_PREWARM:
+        _tts_prewarm = asyncio.create_task(_prewarm_tts())
+    logger.info("Startup complete (AI warm-up continues in background).")
     yield
+    if not _warmup.done():
+        _warmup.cancel()
+    if _tts_prewarm is not None:
+        _tts_prewarm.cancel()
+    # Queued toggles, ratings and analytics go out to the Sheet before exit
+    await asyncio.to_thread(tenants.registry.close, 10)
     logger.info("Shutting down.")
 
 
@@ -83,32 +148,105 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     )
 
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "混み合っています。しばらくしてからお試しください。"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+# Innermost: resolves the store and strips /t/{tenant} before routing
+app.add_middleware(TenantMiddleware, registry=tenants.registry)
+
 # CORS: restrict to known frontend origins
 _cors_raw = os.getenv("ALLOWED_ORIGINS", "")
 _cors_origins = [o.strip() for o in _cors_raw.split(",") if o.strip()] if _cors_raw else ["*"]
+# Let the frontend origins read Server-Timing in devtools / Resource Timing
+_timing_allow_origin = ", ".join(_cors_origins)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_cors_origins,
     allow_credentials=False,
     allow_methods=["GET", "POST"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", SESSION_HEADER, "Idempotency-Key"],
 )
 
-# Staff admin password (set STAFF_PASSWORD env var on Render)
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """Per-route metrics, Server-Timing spans and the opt-in slow-request profiler."""
+    in_flight = metrics.HTTP_IN_FLIGHT.labels()
+    in_flight.inc()
+    spans = profiling.begin_request()
+    sampler = profiling.maybe_start_sampler()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if profiling.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = profiling.server_timing(
+                spans, time.perf_counter() - start)
+            response.headers["Timing-Allow-Origin"] = _timing_allow_origin
+        return response
+    except Exception:
+        metrics.HTTP_ERRORS.labels(endpoint=_route_label(request)).inc()
+        raise
+    finally:
+        in_flight.dec()
+        duration = time.perf_counter() - start
+        endpoint = _route_label(request)
+        metrics.HTTP_LATENCY.labels(endpoint=endpoint).observe(duration)
+        metrics.HTTP_REQUESTS.labels(endpoint=endpoint, method=request.method, status=status).inc()
+        if sampler is not None:
+            profiling.finish_sampler(sampler, endpoint, duration)
+
+
+def _route_label(request: Request) -> str:
+    """Route template (not raw path) so label cardinality stays bounded."""
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+# Staff admin password (set STAFF_PASSWORD env var on Render); stores in
+# TENANTS can have their own staff_password
 STAFF_PASSWORD = os.getenv("STAFF_PASSWORD", "")
 
 
-def verify_staff(authorization: str | None = Header(None)):
-    """Check Bearer token matches STAFF_PASSWORD."""
-    if not STAFF_PASSWORD:
+def _check_password(password: str, authorization: str | None):
+    if not password:
         return  # No password set = skip auth (dev mode)
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Authorization required")
     token = authorization[7:]
-    if not hmac.compare_digest(token, STAFF_PASSWORD):
+    if not hmac.compare_digest(token, password):
         raise HTTPException(status_code=401, detail="Invalid password")
 
 
+def verify_staff(request: Request, authorization: str | None = Header(None)):
+    """Check Bearer token matches the store's staff password (else STAFF_PASSWORD)."""
+    config = tenants.registry.configs.get(getattr(request.state, "tenant_id", None) or "")
+    _check_password((config.staff_password if config else "") or STAFF_PASSWORD, authorization)
+
+
+def verify_operator(authorization: str | None = Header(None)):
+    """Check Bearer token matches STAFF_PASSWORD (process-wide reports across all stores)."""
+    _check_password(STAFF_PASSWORD, authorization)
+
+
+async def get_tenant(request: Request) -> AsyncIterator[Tenant]:
+    """The request's store, loaded on first use and held until the request ends (an
+    eviction meanwhile doesn't close its sheet sync); also read by admission for its bucket.
+    """
+    tenant_id = getattr(request.state, "tenant_id", None)
+    if tenant_id is None:
+        raise HTTPException(status_code=404, detail="Unknown restaurant")
+    async with tenants.registry.hold(tenant_id) as tenant:
+        request.state.tenant = tenant
+        yield tenant
+
+
 # ---------------------------------------------------------------------------
 # Request / Response models
 # ---------------------------------------------------------------------------
@@ -130,6 +268,9 @@ class ChatRequest(BaseModel):
     history: list[ChatMessage] = []
     lang: str = "en-US"
     energy_context: EnergyContext | None = None
+    speak: bool = False  # also synthesize the reply; fetch it from audio_url
+    audio_format: str | None = None  # AUDIO_FORMATS profile for the spoken reply
+    menu_version: str | None = None  # hash of the client's /api/menu copy; opts in to menu_item_ids
 
     @field_validator("message")
     @classmethod
@@ -149,12 +290,16 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     menu_items: list[dict] = []
+    menu_item_ids: list[str] = []  # items in the client's menu copy, when its menu_version is current
+    menu_version: str | None = None  # current menu hash, sent when the request had one
     allergy_query: bool = False
+    audio_url: str | None = None
 
 
 class TTSRequest(BaseModel):
     text: str
     lang: str = "ja-JP"
+    format: str | None = None  # AUDIO_FORMATS profile; else negotiated from Accept
 
 
 class RatingRequest(BaseModel):
@@ -209,18 +354,43 @@ class AnalyticsRequest(BaseModel):
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
+# Google API calls block, so they run in the threadpool to keep the event loop
+# free for cheap endpoints (availability polls, menu loads) while Gemini works.
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 @limiter.limit("50/hour")
-async def chat(request: Request, req: ChatRequest):
+async def chat(request: Request, req: ChatRequest, response: Response, tenant: Tenant = Depends(get_tenant)):
+    await wait_for_warmup()
+    db, ai = tenant.db, tenant.ai
     if not ai:
         raise HTTPException(status_code=503, detail="AI not initialized")
 
     # Refresh menu & staff if stale (real-time admin sync)
     if db:
-        db.refresh_if_stale()
-        ai.update_menu_context(db.get_menu_context())
-        ai.update_staff_context(db.get_staff_context())
-        ai.update_restaurant_info(db.get_store_info_context())
+        with span("sheets_refresh"):
+            await run_in_threadpool(db.refresh_if_stale)
+        with span("context_build"):
+            await run_in_threadpool(tenant.sync_ai_context)
+
+    # Detect allergy-related query
+    is_allergy = any(kw in req.message.lower() for kw in ALLERGY_KEYWORDS)
+
+    # Item-specific allergy questions are answered from the sheet, no LLM call
+    if db:
+        with span("allergen_fastpath"):
+            reply = db.answer_allergy_question(req.message, req.lang)
+        if reply:
+            with span("name_match"):
+                mentioned = _mentioned_items(db, reply, req.menu_version)
+            return _with_speech(request, req, ChatResponse(reply=reply, allergy_query=True, **mentioned))
+        # Hours / address / phone / price come straight from the sheet
+        with span("intent_router"):
+            reply = db.answer_intent(req.message, req.lang)
+        if reply:
+            with span("name_match"):
+                mentioned = _mentioned_items(db, reply, req.menu_version)
+            return _with_speech(request, req, ChatResponse(reply=reply, allergy_query=is_allergy, **mentioned))
 
     # Build conversation history
     history = [{"role": msg.role, "content": msg.content} for msg in req.history]
@@ -245,98 +415,263 @@ async def chat(request: Request, req: ChatRequest):
     lang_name = lang_map.get(req.lang, "English")
     lang_hint = f"[RESPOND IN: {lang_name}] "
 
-    # Generate response
-    reply = ai.generate_response(lang_hint + energy_hint + req.message, history)
-
-    # Detect allergy-related query
-    allergy_keywords = {"allergy", "allergen", "vegan", "halal", "gluten", "ingredient",
-                        "アレルギー", "アレルゲン", "ビーガン", "ハラル", "グルテン", "成分"}
-    is_allergy = any(kw in req.message.lower() for kw in allergy_keywords)
+    # Generate response (under overload, a canned reply instead of a queue timeout)
+    try:
+        async with admission.admit(request, "chat"):
+            with span("llm"), usage.scope("chat", req.lang):
+                reply = await run_in_threadpool(ai.generate_response, lang_hint + energy_hint + req.message,
+                                                 history, request.headers.get("Idempotency-Key"))
+    except Overloaded as exc:
+        logger.warning("Chat degraded: %s", exc.reason)
+        reply = FALLBACK_REPLY
+        response.headers["Retry-After"] = str(exc.retry_after)
 
     # Find menu items mentioned in the response
-    menu_items = db.find_mentioned_items(reply) if db else []
+    with span("name_match"):
+        mentioned = _mentioned_items(db, reply, req.menu_version) if db else {}
+
+    return _with_speech(request, req, ChatResponse(reply=reply, allergy_query=is_allergy, **mentioned))
+
+
+def _mentioned_items(db, reply: str, menu_version: str | None) -> dict:
+    """ChatResponse fields for the dishes named in a reply. Full rows by default; when the
+    client's menu copy is current, only ids for the dishes it holds (sold-out regular
+    items are not in /api/menu, so they still come as rows).
+    """
+    items = db.find_mentioned_items(reply)
+    if menu_version is None:
+        return {"menu_items": images.menu_rows(items)}
+    current = menu_export.snapshot_hash(db)
+    if menu_version != current:
+        return {"menu_items": images.menu_rows(items), "menu_version": current}
+    ids, unlisted = [], []
+    for item in items:
+        if item.kind == "special" or item.available:
+            ids.append(item.id)
+        else:
+            unlisted.append(item)
+    return {"menu_item_ids": ids, "menu_items": images.menu_rows(unlisted), "menu_version": current}
+
+
+# Background syntheses started by chat?speak; held so they aren't garbage collected
+_speech_tasks: set[asyncio.Task] = set()
+
 
-    return ChatResponse(reply=reply, menu_items=menu_items, allergy_query=is_allergy)
+def _with_speech(request: Request, req: ChatRequest, result: ChatResponse) -> ChatResponse:
+    """With speak=true, start synthesizing the final reply now and hand back the
+    URL it will be served from, saving the client a /api/tts round trip.
+    """
+    if req.speak and tts and result.reply:
+        fmt = negotiate(req.audio_format)
+        audio_id = audio_store.reserve(AUDIO_FORMATS[fmt].media_type)
+        task = asyncio.create_task(_synthesize_reply(request, audio_id, result.reply, req.lang, fmt))
+        _speech_tasks.add(task)
+        task.add_done_callback(_speech_tasks.discard)
+        result.audio_url = f"/api/audio/{audio_id}"
+    return result
+
+
+async def _synthesize_reply(request: Request, audio_id: str, text: str, lang: str, fmt: str):
+    try:
+        async with admission.admit(request, "tts"):
+            with span("tts"), usage.scope("tts", lang):
+                audio = await run_in_threadpool(tts.synthesize, text, lang, fmt=fmt)
+        audio_store.resolve(audio_id, audio)
+    except Exception as exc:
+        logger.warning("Reply speech failed: %s", exc)
+        audio_store.fail(audio_id, exc)
+
+
+@app.get("/api/audio/{audio_id}")
+async def get_audio(audio_id: str):
+    """Audio for a chat reply sent with speak=true; waits while it is still synthesizing."""
+    try:
+        audio, media_type = await audio_store.get(audio_id, timeout=TTS.timeout + 5)
+    except AudioNotFound:
+        raise HTTPException(status_code=404, detail="Audio expired")
+    except Exception:
+        raise HTTPException(status_code=503, detail="TTS temporarily unavailable")
+    return Response(content=audio, media_type=media_type,
+                    headers={"Cache-Control": f"private, max-age={int(audio_store.ttl)}"})
 
 
 @app.post("/api/tts")
 @limiter.limit("50/hour")
 async def text_to_speech(request: Request, req: TTSRequest):
+    await wait_for_warmup()
     if not tts:
         raise HTTPException(status_code=503, detail="TTS not initialized")
-    try:
-        audio = tts.synthesize(req.text, req.lang)
-        return Response(content=audio, media_type="audio/mpeg")
-    except Exception:
-        logger.exception("TTS synthesis failed")
-        raise HTTPException(status_code=500, detail="TTS synthesis failed")
+    fmt = negotiate(req.format, request.headers.get("accept", ""))
+    async with admission.admit(request, "tts"):
+        try:
+            with span("tts"), usage.scope("tts", req.lang):
+                audio = await run_in_threadpool(tts.synthesize, req.text, req.lang,
+                                                    request.headers.get("Idempotency-Key"), fmt)
+            return Response(content=audio, media_type=AUDIO_FORMATS[fmt].media_type, headers={"Vary": "Accept"})
+        except usage.BudgetExhausted:
+            logger.warning("TTS daily budget reached")
+            raise HTTPException(status_code=503, detail="TTS daily budget reached")
+        except (CircuitOpenError, UpstreamTimeout):
+            logger.warning("TTS unavailable, failing fast")
+            raise HTTPException(status_code=503, detail="TTS temporarily unavailable")
+        except Exception:
+            logger.exception("TTS synthesis failed")
+            raise HTTPException(status_code=500, detail="TTS synthesis failed")
 
 
 @app.post("/api/chat/train")
 @limiter.limit("50/hour")
-async def chat_train(request: Request, req: ChatRequest):
+async def chat_train(request: Request, req: ChatRequest, tenant: Tenant = Depends(get_tenant)):
+    await wait_for_warmup()
+    db, trainer = tenant.db, tenant.trainer
     if not trainer:
         raise HTTPException(status_code=503, detail="Training AI not initialized")
 
     if db:
-        db.refresh_if_stale()
-        trainer.update_menu_context(db.get_menu_context())
+        with span("sheets_refresh"):
+            await run_in_threadpool(db.refresh_if_stale)
+        with span("context_build"):
+            trainer.update_menu_context(db.get_menu_context())
 
     history = [{"role": msg.role, "content": msg.content} for msg in req.history]
-    result = trainer.generate_response(req.message, history)
+    async with admission.admit(request, "train"):
+        with span("llm"), usage.scope("train", req.lang):
+            result = await run_in_threadpool(trainer.generate_response, req.message, history)
     return result
 
 
 @app.post("/api/rating")
 @limiter.limit("5/hour")
-async def submit_rating(request: Request, req: RatingRequest):
+async def submit_rating(request: Request, req: RatingRequest, tenant: Tenant = Depends(get_tenant)):
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
     if not 1 <= req.rating <= 5:
         raise HTTPException(status_code=400, detail="Rating must be 1-5")
-    db.save_rating(req.rating, req.message_count, req.lang)
+    async with admission.admit(request, "rating"):
+        await run_in_threadpool(db.save_rating, req.rating, req.message_count, req.lang)
     return {"status": "ok"}
 
 
 @app.get("/api/menu")
-async def get_menu():
+async def get_menu(request: Request, tenant: Tenant = Depends(get_tenant)):
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
-    db.refresh_if_stale()
+    async with admission.admit(request, "menu"):
+        await run_in_threadpool(db.refresh_if_stale)
     return {
-        "regular": db.get_active_regular_items(),
-        "special": db.get_special_items(),
+        "regular": images.menu_rows(db.get_active_regular_items()),
+        "special": images.menu_rows(db.get_special_items()),
+        "hash": menu_export.snapshot_hash(db),
     }
 
 
+@app.get("/api/menu/version")
+async def menu_version(request: Request, tenant: Tenant = Depends(get_tenant)):
+    """Hash of the current menu; clients holding a copy with this hash can skip /api/menu."""
+    db = tenant.db
+    if not db:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    async with admission.admit(request, "availability"):
+        await run_in_threadpool(db.refresh_if_stale)
+    return {"hash": menu_export.snapshot_hash(db)}
+
+
+@app.get("/api/menu/export")
+async def menu_export_file(request: Request, _=Depends(verify_staff), tenant: Tenant = Depends(get_tenant)):
+    """Current snapshot in the format of frontend/public/menu-cache.json (for the build).
+    Its hash is in the X-Menu-Hash header, for menu-cache.version.json.
+    """
+    db = tenant.db
+    if not db:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    async with admission.admit(request, "staff"):
+        await run_in_threadpool(db.refresh_if_stale)
+    return Response(content=menu_export.dumps(menu_export.export(db)),
+                    media_type="application/json; charset=utf-8",
+                    headers={"X-Menu-Hash": menu_export.snapshot_hash(db)})
+
+
+@app.get("/api/images/{size}/{name}")
+async def menu_image(request: Request, size: str, name: str, v: str = ""):
+    """Menu photo resized for `size` (thumb/detail) in the best format the browser accepts."""
+    fmt = images.negotiate(request.headers.get("accept", ""))
+    try:
+        path, media_type = await run_in_threadpool(images.cache.variant, name, size, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Immutable only when the URL names the current version of the photo
+    cache_control = images.IMMUTABLE if v and v == images.cache.version(name) else "public, max-age=300"
+    return FileResponse(path, media_type=media_type,
+                        headers={"Cache-Control": cache_control, "Vary": "Accept"})
+
+
+@app.get("/api/menu/query")
+async def query_menu(
+    request: Request,
+    kind: str | None = Query(None, pattern="^(regular|special)$"),
+    category: list[str] = Query([]),
+    available: bool | None = None,
+    recommended: bool | None = None,
+    allergen: list[str] = Query([]),
+    exclude_allergen: list[str] = Query([]),
+    min_price: float | None = None,
+    max_price: float | None = None,
+    window: str | None = Query(None, pattern="^(lunch|dinner)$"),
+    tenant: Tenant = Depends(get_tenant),
+):
+    """Filtered menu, e.g. ?category=前菜&exclude_allergen=gluten&available=true.
+    Repeat category/allergen params to OR categories and AND allergens.
+    """
+    db = tenant.db
+    if not db:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    async with admission.admit(request, "menu"):
+        await run_in_threadpool(db.refresh_if_stale)
+    items = db.query_menu(
+        kind=kind, category=category, available=available, recommended=recommended,
+        allergen=allergen, exclude_allergen=exclude_allergen,
+        min_price=min_price, max_price=max_price, window=window,
+    )
+    return {"items": images.menu_rows(items), "count": len(items)}
+
+
 @app.get("/api/menu/availability")
-async def menu_availability():
+async def menu_availability(request: Request, tenant: Tenant = Depends(get_tenant)):
     """Lightweight polling endpoint for sold-out display."""
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
-    return {"items": db.get_availability()}
+    async with admission.admit(request, "availability"):
+        return {"items": db.get_availability()}
 
 
 @app.get("/api/menu/staff")
-async def menu_for_staff(_=Depends(verify_staff)):
+async def menu_for_staff(request: Request, _=Depends(verify_staff), tenant: Tenant = Depends(get_tenant)):
     """Staff admin: returns regular (read-only) + special (with flags) for admin UI."""
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
-    return {
-        "regular": db.get_regular_for_staff(),
-        "special": db.get_specials_for_staff(),
-    }
+    async with admission.admit(request, "staff"):
+        return {
+            "regular": db.get_regular_for_staff(),
+            "special": await run_in_threadpool(db.get_specials_for_staff),
+        }
 
 
 @app.post("/api/menu/toggle")
 @limiter.limit("100/hour")
-async def toggle_menu_item(request: Request, req: ToggleRequest, _=Depends(verify_staff)):
+async def toggle_menu_item(request: Request, req: ToggleRequest, _=Depends(verify_staff),
+                           tenant: Tenant = Depends(get_tenant)):
     """Staff admin: toggle おすすめフラグ or 常駐フラグ for a special menu item."""
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
     if req.flag not in ("おすすめフラグ", "常駐フラグ"):
         raise HTTPException(status_code=400, detail="Invalid flag name")
-    ok = db.toggle_special_flag(req.menu_name, req.flag, req.value)
+    async with admission.admit(request, "staff"):
+        ok = await run_in_threadpool(db.toggle_special_flag, req.menu_name, req.flag, req.value)
     if not ok:
         raise HTTPException(status_code=404, detail="Menu item not found")
     return {"status": "ok", "menu_name": req.menu_name, "flag": req.flag, "value": req.value}
@@ -344,13 +679,16 @@ async def toggle_menu_item(request: Request, req: ToggleRequest, _=Depends(verif
 
 @app.post("/api/menu/regular/toggle")
 @limiter.limit("100/hour")
-async def toggle_regular_flag(request: Request, req: RegularToggleRequest, _=Depends(verify_staff)):
+async def toggle_regular_flag(request: Request, req: RegularToggleRequest, _=Depends(verify_staff),
+                              tenant: Tenant = Depends(get_tenant)):
     """Staff admin: toggle おすすめフラグ for a regular menu item."""
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
     if req.flag not in ("おすすめフラグ",):
         raise HTTPException(status_code=400, detail="Invalid flag name")
-    ok = db.toggle_regular_flag(req.menu_name, req.flag, req.value)
+    async with admission.admit(request, "staff"):
+        ok = await run_in_threadpool(db.toggle_regular_flag, req.menu_name, req.flag, req.value)
     if not ok:
         raise HTTPException(status_code=404, detail="Menu item not found")
     return {"status": "ok", "menu_name": req.menu_name, "flag": req.flag, "value": req.value}
@@ -358,11 +696,14 @@ async def toggle_regular_flag(request: Request, req: RegularToggleRequest, _=Dep
 
 @app.post("/api/menu/soldout")
 @limiter.limit("100/hour")
-async def toggle_sold_out(request: Request, req: SoldOutRequest, _=Depends(verify_staff)):
+async def toggle_sold_out(request: Request, req: SoldOutRequest, _=Depends(verify_staff),
+                          tenant: Tenant = Depends(get_tenant)):
     """Staff admin: toggle 提供中 (sold out) for a regular menu item."""
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
-    ok = db.toggle_availability(req.menu_name, req.available)
+    async with admission.admit(request, "staff"):
+        ok = await run_in_threadpool(db.toggle_availability, req.menu_name, req.available)
     if not ok:
         raise HTTPException(status_code=404, detail="Menu item not found")
     return {"status": "ok", "menu_name": req.menu_name, "available": req.available}
@@ -370,7 +711,9 @@ async def toggle_sold_out(request: Request, req: SoldOutRequest, _=Depends(verif
 
 @app.post("/api/translate")
 @limiter.limit("10/hour")
-async def translate_messages(request: Request, req: TranslateRequest):
+async def translate_messages(request: Request, req: TranslateRequest, tenant: Tenant = Depends(get_tenant)):
+    await wait_for_warmup()
+    ai = tenant.ai
     if not ai:
         raise HTTPException(status_code=503, detail="AI not initialized")
     lang_map = {
@@ -378,22 +721,45 @@ async def translate_messages(request: Request, req: TranslateRequest):
         "zh-CN": "Chinese", "es-ES": "Spanish", "pt-BR": "Portuguese",
     }
     lang_name = lang_map.get(req.lang, "English")
-    translated = ai.translate_messages(req.texts, lang_name)
+    try:
+        async with admission.admit(request, "translate"):
+            with span("llm"), usage.scope("translate", req.lang):
+                translated = await run_in_threadpool(ai.translate_messages, req.texts, lang_name,
+                                                      request.headers.get("Idempotency-Key"))
+    except Overloaded as exc:
+        # The client keeps showing the originals, same as a Gemini outage
+        logger.warning("Translate degraded: %s", exc.reason)
+        translated = req.texts
     return {"texts": translated}
 
 
 @app.post("/api/analytics")
 @limiter.limit("200/hour")
-async def track_analytics(request: Request, req: AnalyticsRequest):
+async def track_analytics(request: Request, req: AnalyticsRequest, tenant: Tenant = Depends(get_tenant)):
+    db = tenant.db
     if not db:
         raise HTTPException(status_code=503, detail="Database not connected")
     if req.event not in ("page_view", "chat_message", "menu_tap"):
         raise HTTPException(status_code=400, detail="Invalid event type")
     ua = request.headers.get("user-agent", "")[:200]
-    db.save_analytics(req.session_id, req.event, req.data, req.lang, ua)
+    async with admission.admit(request, "analytics"):
+        await run_in_threadpool(db.save_analytics, req.session_id, req.event, req.data, req.lang, ua)
     return {"status": "ok"}
 
 
+@app.get("/api/usage")
+async def usage_report(request: Request, hours: int = Query(24, ge=1, le=72), _=Depends(verify_operator)):
+    """Staff: tokens, TTS characters and estimated spend by endpoint, language and hour."""
+    async with admission.admit(request, "staff"):
+        return usage.ledger.snapshot(hours)
+
+
+@app.get("/metrics")
+async def metrics_endpoint(_=Depends(verify_operator)):
+    """Staff: Prometheus text exposition of latency histograms, counters and gauges."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
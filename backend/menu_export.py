@@ -0,0 +1,135 @@
+"""
+SUMI X Orator - Static menu export
+Serializes the current MenuDatabase snapshot into exactly the format of
+frontend/public/menu-cache.json ({"regular": [...], "special": [...]} with the
+sheet-keyed rows /api/menu serves, minus the API-only "id" and "images"), so
+the build can regenerate the file instead of it being edited by hand.
+
+The content hash of those rows and the generation time go next to it in
+menu-cache.version.json ({"hash": ..., "generated_at": ...}), leaving the menu
+document itself unchanged. The hash is stable across exports of an unchanged
+sheet, and the frontend skips fetching /api/menu when its copy's hash matches
+/api/menu/version.
+
+Usage (from backend/, with the backend's Sheets environment):
+  python menu_export.py                       # write ../frontend/public/menu-cache.json (+ version file)
+  python menu_export.py --out menu.json       # also writes menu.version.json
+  python menu_export.py --check               # exit 1 if the file is out of date
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import hashlib
+import weakref
+import argparse
+from datetime import datetime, timezone
+
+from menu_index import to_rows
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.normpath(os.path.join(_BACKEND_DIR, "..", "frontend", "public", "menu-cache.json"))
+
+# MenuDatabase -> (regular items, special items, hash) of its last hashed snapshot;
+# refresh() replaces the item lists, so identity tells whether the snapshot changed
+_memo: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _file_rows(items) -> list[dict]:
+    rows = to_rows(items)
+    for row in rows:
+        row.pop("id", None)
+    return rows
+
+
+def menu_rows(db) -> dict[str, list[dict]]:
+    """The rows /api/menu serves (active regular items and all specials) in the file's shape."""
+    return {"regular": _file_rows(db.get_active_regular_items()), "special": _file_rows(db.get_special_items())}
+
+
+def content_hash(rows: dict[str, list[dict]]) -> str:
+    """Short sha256 of the canonical JSON of the menu rows."""
+    canonical = json.dumps(rows, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def snapshot_hash(db) -> str:
+    """content_hash() of the current snapshot, computed once per refresh."""
+    regular, special = db.get_active_regular_items(), db.get_special_items()
+    memo = _memo.get(db)
+    if memo is None or memo[0] is not regular or memo[1] is not special:
+        memo = _memo[db] = (regular, special, content_hash(menu_rows(db)))
+    return memo[2]
+
+
+def export(db) -> dict:
+    """menu-cache.json contents for the current snapshot."""
+    return menu_rows(db)
+
+
+def version(db) -> dict:
+    """menu-cache.version.json contents for the current snapshot."""
+    return {"hash": snapshot_hash(db), "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+def version_path(path: str) -> str:
+    """menu-cache.json -> menu-cache.version.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.version{ext or '.json'}"
+
+
+def dumps(data: dict) -> str:
+    # Same layout as the hand-maintained file, so diffs stay readable
+    return json.dumps(data, ensure_ascii=False)
+
+
+def write(data: dict, path: str = DEFAULT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(dumps(data))
+    os.replace(tmp, path)
+
+
+def read_hash(path: str) -> str | None:
+    """Recomputed hash of an existing export, so hand edits count as out of date.
+    None for a missing or unreadable file.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return content_hash({"regular": data.get("regular", []), "special": data.get("special", [])})
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=DEFAULT_PATH, help="file to write (default: the frontend's menu-cache.json)")
+    parser.add_argument("--check", action="store_true", help="only compare; exit 1 if the file is out of date")
+    args = parser.parse_args()
+
+    from database import MenuDatabase
+
+    db = MenuDatabase()
+    db.refresh()  # the local copy may be older than the Sheet
+    data, meta = export(db), version(db)
+    current = read_hash(args.out)
+    counts = f"{len(data['regular'])} regular, {len(data['special'])} special"
+    if args.check:
+        if current != meta["hash"]:
+            print(f"{args.out} is out of date ({current} != {meta['hash']}, {counts})")
+            sys.exit(1)
+        print(f"{args.out} is up to date ({meta['hash']})")
+        return
+    if current == meta["hash"] and os.path.exists(version_path(args.out)):
+        print(f"{args.out} unchanged ({meta['hash']}, {counts})")
+        return
+    write(data, args.out)
+    write(meta, version_path(args.out))
+    print(f"Wrote {args.out}: {counts}, hash {meta['hash']}")
+
+
+if __name__ == "__main__":
+    main_cli()
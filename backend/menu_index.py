@@ -0,0 +1,312 @@
+"""
+SUMI X Orator - Indexed menu model
+Parsed once per sheet snapshot into MenuItem records (typed fields instead of
+the raw Japanese-keyed sheet dicts, which are not kept): booleans and prices
+are converted up front and items are indexed by category, availability,
+recommended flag, allergen, price and lunch/dinner window, so menu reads and
+/api/menu/query filters are set lookups instead of re-scanning rows. API
+responses project items back to sheet-keyed dicts with MenuItem.to_row().
+
+Every item has a stable id (stable_id) derived from its kind, English name and
+category, so it survives refreshes, reordering and edits to other columns, and
+is the same in every worker. Clients holding the menu can resolve chat replies
+by id instead of receiving full rows.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import hashlib
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time as dtime
+from typing import NamedTuple, Optional
+
+from allergens import AllergenIndex, canonical_allergen, implied_allergens
+
+# Lunch service window (Vancouver local time). Outside it, dinner rules apply.
+LUNCH_START = dtime(11, 30)
+LUNCH_END = dtime(14, 0)
+MENU_WINDOWS = ("lunch", "dinner")
+
+# Categories served all day (drinks & desserts); specials are always all day
+ALL_DAY_CATEGORIES = {"ビール", "ハードリカー", "焼酎", "サングリア", "カクテル", "ソフトドリンク", "デザート"}
+
+
+def menu_window(now: datetime) -> str:
+    """Return "lunch" during 11:30-14:00, otherwise "dinner"."""
+    return "lunch" if LUNCH_START <= now.time() < LUNCH_END else "dinner"
+
+
+def _is_lunch_only(row: dict) -> bool:
+    return ("lunch only" in str(row.get("備考", "")).lower()
+            or str(row.get("カテゴリ", "")).startswith("ランチ"))
+
+
+def served_in_window(item: MenuItem, window: str | None) -> bool:
+    """Category rules for menu context variants (None = full menu)."""
+    if window is None or item.kind == "special" or item.category in ALL_DAY_CATEGORIES:
+        return True
+    return item.lunch_only if window == "lunch" else not item.lunch_only
+
+
+def _flag(value) -> bool:
+    return str(value).upper() == "TRUE"
+
+
+def _price(value) -> Optional[float]:
+    try:
+        return float(str(value).replace("$", "").strip())
+    except ValueError:
+        return None
+
+
+def _text(row: dict, column: str) -> str:
+    value = row.get(column, "")
+    return "" if value is None else str(value)
+
+
+def stable_id(kind: str, name: str, category: str) -> str:
+    """Id for a menu row: "r" or "s" and 10 hex digits of its kind, name and category."""
+    key = f"{kind}\x1f{name}\x1f{category}".encode("utf-8")
+    return kind[0] + hashlib.blake2s(key, digest_size=5).hexdigest()
+
+
+# Sheet column -> MenuItem field, for the columns the backend understands
+COLUMNS = {
+    "メニュー名(英)": "name",
+    "メニュー名(日)": "name_ja",
+    "カテゴリ": "category",
+    "値段": "price",
+    "メニュー説明(英)": "description",
+    "味・特徴": "taste",
+    "量感": "portion",
+    "アレルギー情報": "allergen_info",
+    "成分情報": "ingredients",
+    "おすすめ組み合わせ": "pairing",
+    "備考": "notes",
+    "写真URL": "photo_url",
+    "担当シェフ名": "chef",
+    "提供中": "available",
+    "おすすめフラグ": "recommended",
+    "常駐フラグ": "resident",
+}
+
+# Checkbox columns: parsed into bool fields but served as the cell text
+# ("TRUE"/"FALSE"/""), the wire format of /api/menu and menu-cache.json
+FLAG_COLUMNS = frozenset({"提供中", "おすすめフラグ", "常駐フラグ"})
+
+
+class MenuItem(NamedTuple):
+    """One menu row, parsed once per snapshot. to_row() projects it back to
+    the sheet-keyed dict the API serves.
+    """
+    id: str              # stable_id(), "-2", "-3"... for repeated rows
+    kind: str            # "regular" | "special"
+    name: str
+    name_lower: str
+    name_ja: str
+    category: str        # interned: a few dozen distinct values
+    price: Optional[float]
+    price_label: str     # 値段 as entered ("" when blank), for the menu context
+    description: str
+    taste: str
+    portion: str
+    allergen_info: str
+    ingredients: str
+    pairing: str
+    notes: str
+    photo_url: str
+    chef: str
+    available: bool      # 提供中 = TRUE (specials are always available)
+    listed: bool         # shown on availability polls (提供中 != FALSE)
+    recommended: bool
+    resident: bool       # 常駐フラグ (specials only)
+    lunch_only: bool
+    allergens: frozenset
+    columns: tuple       # the tab's header, shared by its items; to_row() key order
+    extra: tuple         # (column, value) pairs for columns without a field, and FLAG_COLUMNS
+
+    @classmethod
+    def from_row(cls, row: dict, kind: str, columns: tuple, allergens: AllergenIndex,
+                 item_id: str) -> MenuItem:
+        name = _text(row, "メニュー名(英)")
+        provided = _text(row, "提供中").upper()
+        raw_price = row.get("値段", "")
+        return cls(
+            id=item_id,
+            kind=kind,
+            name=name,
+            name_lower=name.lower(),
+            name_ja=_text(row, "メニュー名(日)"),
+            category=sys.intern(_text(row, "カテゴリ")),
+            price=_price(raw_price),
+            price_label=str(raw_price) if raw_price else "",
+            description=_text(row, "メニュー説明(英)"),
+            taste=_text(row, "味・特徴"),
+            portion=_text(row, "量感"),
+            allergen_info=_text(row, "アレルギー情報"),
+            ingredients=_text(row, "成分情報"),
+            pairing=_text(row, "おすすめ組み合わせ"),
+            notes=_text(row, "備考"),
+            photo_url=_text(row, "写真URL"),
+            chef=_text(row, "担当シェフ名"),
+            available=kind == "special" or provided == "TRUE",
+            listed=kind == "special" or provided != "FALSE",
+            recommended=_flag(row.get("おすすめフラグ", "")),
+            resident=_flag(row.get("常駐フラグ", "")),
+            lunch_only=_is_lunch_only(row),
+            allergens=frozenset(allergens.allergens_for(name)) if name else frozenset(),
+            columns=columns,
+            extra=tuple((k, v) for k, v in row.items() if k not in COLUMNS or k in FLAG_COLUMNS),
+        )
+
+    def price_value(self):
+        """値段 for JSON: a number when it parses (16, 4.5), else the text as entered."""
+        if self.price is None:
+            return self.price_label
+        return int(self.price) if self.price == int(self.price) else self.price
+
+    def to_row(self) -> dict:
+        """The sheet-keyed dict for API responses (plus "id"), in the tab's column order."""
+        extra = dict(self.extra)
+        row = {"id": self.id}
+        for column in self.columns:
+            field = COLUMNS.get(column)
+            if field is None or column in FLAG_COLUMNS:
+                row[column] = extra.get(column, "")
+            elif field == "price":
+                row[column] = self.price_value()
+            else:
+                row[column] = getattr(self, field)
+        return row
+
+
+def to_rows(items: list[MenuItem]) -> list[dict]:
+    return [item.to_row() for item in items]
+
+
+class MenuIndex:
+    """Menu snapshot with per-field indexes of entry positions."""
+
+    def __init__(self, regular_items: list[dict], special_items: list[dict],
+                 allergens: AllergenIndex | None = None):
+        """Build from the raw sheet records; the records are not kept."""
+        allergens = allergens or AllergenIndex(regular_items, special_items)
+        self.entries: list[MenuItem] = []
+        seen_ids: dict[str, int] = {}
+        for kind, rows in (("regular", regular_items), ("special", special_items)):
+            columns = tuple(dict.fromkeys(k for row in rows for k in row))
+            for row in rows:
+                item_id = stable_id(kind, _text(row, "メニュー名(英)"), _text(row, "カテゴリ"))
+                seen_ids[item_id] = count = seen_ids.get(item_id, 0) + 1
+                if count > 1:
+                    item_id = f"{item_id}-{count}"
+                self.entries.append(MenuItem.from_row(row, kind, columns, allergens, item_id))
+
+        self.by_kind: dict[str, set[int]] = {"regular": set(), "special": set()}
+        self.by_category: dict[str, set[int]] = {}
+        self.by_allergen: dict[str, set[int]] = {}
+        self.by_window: dict[str, set[int]] = {w: set() for w in MENU_WINDOWS}
+        self.available: set[int] = set()
+        self.recommended: set[int] = set()
+        self.no_allergen_data: set[int] = set()
+        for i, entry in enumerate(self.entries):
+            self.by_kind[entry.kind].add(i)
+            self.by_category.setdefault(entry.category, set()).add(i)
+            for allergen in entry.allergens:
+                self.by_allergen.setdefault(allergen, set()).add(i)
+            for window in MENU_WINDOWS:
+                if served_in_window(entry, window):
+                    self.by_window[window].add(i)
+            if entry.available:
+                self.available.add(i)
+            if entry.recommended:
+                self.recommended.add(i)
+            if entry.kind == "special" or not entry.allergen_info.strip():
+                # Specials carry no allergen columns, and a blank アレルギー情報 means unknown,
+                # not allergen-free: neither passes an exclude_allergen filter
+                self.no_allergen_data.add(i)
+        # Lowercase English and Japanese names -> positions, longest first for matching
+        aliases: dict[str, list[int]] = {}
+        for i, entry in enumerate(self.entries):
+            for alias in {entry.name_lower, entry.name_ja.strip().lower()}:
+                if alias:
+                    aliases.setdefault(alias, []).append(i)
+        self._aliases = sorted(aliases.items(), key=lambda x: len(x[0]), reverse=True)
+
+        priced = sorted((e.price, i) for i, e in enumerate(self.entries) if e.price is not None)
+        self._prices = [p for p, _ in priced]
+        self._price_ids = [i for _, i in priced]
+
+        # Named items, longest English name first (find_mentioned_items)
+        self.by_name_length = sorted((e for e in self.entries if e.name),
+                                     key=lambda e: len(e.name), reverse=True)
+
+        # Precomputed item lists for the hot read paths
+        regular = self.by_kind["regular"]
+        self.regular = self.items(regular)
+        self.special = self.items(self.by_kind["special"])
+        self.active_regular = self.items(regular & self.available)
+        self.recommended_specials = self.items(self.by_kind["special"] & self.recommended)
+        self.availability = [
+            {"メニュー名(英)": e.name, "提供中": e.available}
+            for e in self.entries if e.name and e.listed
+        ]
+
+    def items(self, ids) -> list[MenuItem]:
+        """Items at entry positions, in sheet order."""
+        return [self.entries[i] for i in sorted(ids)]
+
+    def mentioned(self, text: str) -> list[list[MenuItem]]:
+        """Dishes named in text (English or Japanese), one group per dish.
+        A group holds every row sharing the name (e.g. dinner + lunch Edamame).
+        """
+        remaining = text.lower()
+        found: list[list[MenuItem]] = []
+        seen: set[str] = set()
+        for alias, ids in self._aliases:
+            # ASCII names need word boundaries ("Egg" must not match "eggplant")
+            pattern = rf"(?<![a-z]){re.escape(alias)}(?![a-z])" if alias.isascii() else re.escape(alias)
+            if not re.search(pattern, remaining):
+                continue
+            remaining = re.sub(pattern, " ", remaining, count=1)
+            name = self.entries[ids[0]].name
+            if name not in seen:
+                seen.add(name)
+                found.append([self.entries[i] for i in ids])
+        return found
+
+    def price_between(self, low: float | None, high: float | None) -> set[int]:
+        start = 0 if low is None else bisect_left(self._prices, low)
+        end = len(self._prices) if high is None else bisect_right(self._prices, high)
+        return set(self._price_ids[start:end])
+
+    def query(self, kind: str | None = None, category: list[str] | None = None,
+              available: bool | None = None, recommended: bool | None = None,
+              exclude_allergen: list[str] | None = None, allergen: list[str] | None = None,
+              min_price: float | None = None, max_price: float | None = None,
+              window: str | None = None) -> list[MenuItem]:
+        """Intersect the indexes for the given filters; None means "don't filter"."""
+        ids = set(range(len(self.entries)))
+        if kind:
+            ids &= self.by_kind.get(kind, set())
+        if category:
+            ids &= set().union(*(self.by_category.get(c, set()) for c in category))
+        if available is not None:
+            ids = ids & self.available if available else ids - self.available
+        if recommended is not None:
+            ids = ids & self.recommended if recommended else ids - self.recommended
+        if window:
+            ids &= self.by_window.get(window, set())
+        for term in allergen or []:
+            ids &= self._with_allergen(term)
+        for term in exclude_allergen or []:
+            ids -= self._with_allergen(term) | self.no_allergen_data
+        if min_price is not None or max_price is not None:
+            ids &= self.price_between(min_price, max_price)
+        return self.items(ids)
+
+    def _with_allergen(self, term: str) -> set[int]:
+        allergens = implied_allergens(canonical_allergen(term))
+        return set().union(*(self.by_allergen.get(a, set()) for a in allergens))
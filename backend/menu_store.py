@@ -0,0 +1,475 @@
+"""
+SUMI X Orator - Menu storage backends
+MenuDatabase reads and writes through two MenuStore implementations:
+
+  LocalStore   SQLite file (WAL) on local disk, the hot path. Serves every
+               snapshot load, applies staff toggles immediately and queues
+               Ratings/Analytics rows.
+  SheetsStore  the Google Sheet via gspread; only SheetSync talks to it.
+
+SheetSync keeps them in step from a background thread:
+  push  staff toggles made since the last push, then the queued Ratings and
+        Analytics rows (one append per tab). Runs right after a toggle, rating
+        or analytics event (a burst shares one round), or with the retry
+        while a failed round backs off.
+  pull  every menu/staff/store tab into the local copy, every MENU_CACHE_TTL
+        seconds (the old cache TTL).
+A failed round is retried after a jittered 5s, 10s, 20s ... (capped at the
+interval); the snapshot keeps its real age meanwhile. Shutdown makes one last
+push; anything it cannot send stays queued in the SQLite file for the next
+start, so MENU_STORE_DIR should be on a disk that outlives the process. Every Sheets call goes
+through the quota scheduler (sheets_quota.py): toggles in the staff lane,
+pulls in the refresh lane, Ratings/Analytics appends in the analytics lane.
+
+Conflict rules: the Sheet owns content (names, prices, descriptions, staff,
+store info) and which rows exist; a toggle made in the staff UI wins over
+the Sheet's value until it has been pushed, so a pull racing the push never
+reverts it. A toggle on a row deleted or renamed in the Sheet meanwhile is
+dropped. A tab that fails to read keeps its last local copy.
+
+Several workers may share one file: WAL lets them read while one writes, and
+each notices the others' commits through PRAGMA data_version.
+
+Environment:
+  MENU_STORE_DIR=/tmp/sumi-menu-store   SQLite files, one per sheet
+  MENU_CACHE_TTL=600                    seconds between pulls
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import base64
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable
+
+import gspread
+from google.oauth2.service_account import Credentials
+
+import sheets_quota
+from metrics import Counter, track_upstream
+from resilience import SHEETS
+from sheets_quota import scheduler
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "600"))  # seconds
+MENU_STORE_DIR = os.getenv("MENU_STORE_DIR", "/tmp/sumi-menu-store")
+
+REGULAR, SPECIAL, STAFF, STORE = "レギュラーメニュー", "スペシャルメニュー", "Staff", "店舗情報"
+RATINGS, ANALYTICS = "Ratings", "Analytics"
+
+# gspread worksheet methods that count against the read quota; the rest are writes
+READ_METHODS = {"get_all_records", "get_all_values", "row_values", "col_values", "get", "get_values"}
+# A failed sync round is retried after backoff(failures) seconds, up to the pull interval
+SYNC_RETRY_BASE = 5.0
+
+# Snapshot tabs -> column whose value identifies a row
+KEY_COLUMNS = {REGULAR: "メニュー名(英)", SPECIAL: "メニュー名(英)", STAFF: "名前", STORE: "項目名"}
+
+SYNC_EVENTS = Counter(
+    "sumi_menu_sync_total",
+    "Sheet sync work by kind (pulled, unchanged, edit_pushed, edit_dropped, rows_appended, failed).", ("kind",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    tab TEXT NOT NULL, position INTEGER NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (tab, position));
+CREATE INDEX IF NOT EXISTS records_key ON records (tab, key);
+CREATE TABLE IF NOT EXISTS edits (
+    id INTEGER PRIMARY KEY, tab TEXT NOT NULL, key TEXT NOT NULL, column TEXT NOT NULL,
+    value TEXT NOT NULL, at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS appends (id INTEGER PRIMARY KEY, tab TEXT NOT NULL, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def load_credentials() -> Credentials:
+    raw_b64 = os.getenv("GOOGLE_SHEETS_CREDENTIALS_B64", "")
+    if raw_b64:
+        raw = base64.b64decode(raw_b64).decode("utf-8")
+        info = json.loads(raw)
+        return Credentials.from_service_account_info(info, scopes=SCOPES)
+
+    raw = os.getenv("GOOGLE_SHEETS_CREDENTIALS", "")
+    if raw:
+        info = json.loads(raw)
+        return Credentials.from_service_account_info(info, scopes=SCOPES)
+
+    path = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE", "")
+    if path:
+        return Credentials.from_service_account_file(path, scopes=SCOPES)
+
+    raise RuntimeError(
+        "Set GOOGLE_SHEETS_CREDENTIALS_B64, GOOGLE_SHEETS_CREDENTIALS, "
+        "or GOOGLE_SHEETS_CREDENTIALS_FILE"
+    )
+
+
+def local_path(sheet_id: str) -> str:
+    return os.path.join(MENU_STORE_DIR, re.sub(r"[^\w-]", "_", sheet_id) + ".sqlite3")
+
+
+def _cell(value) -> str:
+    """Sheet display form of a toggle value (checkboxes read back as TRUE/FALSE)."""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return value
+
+
+class MenuStore(ABC):
+    """Tab-oriented storage: rows are dicts keyed by the tab's header."""
+
+    @abstractmethod
+    def read_tabs(self) -> dict[str, list[dict]]:
+        """Rows of every snapshot tab that could be read."""
+
+    @abstractmethod
+    def update_cell(self, tab: str, key: str, column: str, value) -> bool:
+        """Set one column of the first row whose key column equals key; False if there is none."""
+
+    @abstractmethod
+    def append_rows(self, tab: str, rows: list[list]):
+        """Append rows (lists in the tab's column order) at the end of the tab."""
+
+
+class _TimedWorksheet:
+    """Worksheet proxy that routes every gspread call through the quota
+    scheduler and the Sheets circuit breaker, recording latency and errors.
+    """
+
+    def __init__(self, worksheet):
+        self._ws = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            def attempt():
+                with track_upstream("sheets", name):
+                    return attr(*args, **kwargs)
+            return scheduler.call("read" if name in READ_METHODS else "write", lambda: SHEETS.guard(attempt))
+        return call
+
+
+class SheetsStore(MenuStore):
+    """The Google Sheet. Opening it costs several API calls, so SheetSync opens it once."""
+
+    def __init__(self, sheet_id: str):
+        # Seconds per init phase, reported in the startup breakdown log
+        self.init_timings: dict[str, float] = {}
+        start = time.perf_counter()
+        client = gspread.authorize(load_credentials())
+        client.set_timeout(SHEETS.timeout)
+        self.init_timings["credentials"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self._spreadsheet = scheduler.call("read", lambda: client.open_by_key(sheet_id))
+        self._sheets = {
+            REGULAR: _TimedWorksheet(scheduler.call("read", lambda: self._spreadsheet.worksheet(REGULAR))),
+            SPECIAL: self._get_or_create_sheet(SPECIAL, cols=12),
+            STAFF: self._get_or_create_sheet(STAFF, cols=4),
+            STORE: self._get_or_create_sheet(STORE, cols=2, header=["項目名", "内容"]),
+            RATINGS: self._get_or_create_sheet(RATINGS, cols=4,
+                                               header=["timestamp", "rating", "message_count", "lang"]),
+            ANALYTICS: self._get_or_create_sheet(ANALYTICS, cols=6,
+                                                 header=["timestamp", "session_id", "event", "data", "lang",
+                                                         "user_agent"]),
+        }
+        self.init_timings["sheets_open"] = time.perf_counter() - start
+        logger.info("Connected to Google Sheet: %s", sheet_id)
+
+    def _get_or_create_sheet(self, title: str, cols: int = 4, header: list[str] | None = None):
+        try:
+            return _TimedWorksheet(scheduler.call("read", lambda: self._spreadsheet.worksheet(title)))
+        except gspread.WorksheetNotFound:
+            ws = _TimedWorksheet(scheduler.call(
+                "write", lambda: self._spreadsheet.add_worksheet(title, rows=1000, cols=cols)))
+            if header:
+                ws.append_row(header)
+            logger.info("Created %s sheet tab.", title)
+            return ws
+
+    def read_tabs(self) -> dict[str, list[dict]]:
+        """The regular menu must read; other tabs that fail keep their local copy."""
+        tabs = {REGULAR: self._sheets[REGULAR].get_all_records()}
+        for tab in (SPECIAL, STAFF, STORE):
+            try:
+                tabs[tab] = self._sheets[tab].get_all_records()
+            except Exception:
+                logger.warning("%s sheet read failed, keeping the local copy", tab)
+        return tabs
+
+    def update_cell(self, tab: str, key: str, column: str, value) -> bool:
+        with sheets_quota.lane("staff"):
+            return self._update_cell(tab, key, column, value)
+
+    def _update_cell(self, tab: str, key: str, column: str, value) -> bool:
+        sheet = self._sheets[tab]
+        header = sheet.row_values(1)
+        try:
+            key_col = header.index(KEY_COLUMNS[tab]) + 1  # 1-indexed
+            col = header.index(column) + 1
+        except ValueError:
+            logger.warning("Column not found: %s", column)
+            return False
+        for i, name in enumerate(sheet.col_values(key_col)):
+            if name == key:
+                sheet.update_cell(i + 1, col, value)
+                return True
+        return False
+
+    def append_rows(self, tab: str, rows: list[list]):
+        with sheets_quota.lane("analytics"):
+            self._sheets[tab].append_rows(rows)
+
+
+class LocalStore(MenuStore):
+    """SQLite copy of the snapshot tabs plus the outbox of writes not yet in the Sheet.
+    One connection shared by request threads and the sync thread, behind a lock.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; a toggle commit skips fsync
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def data_version(self) -> int:
+        """Changes when another connection (another worker) commits."""
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def has_snapshot(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM records WHERE tab = ? LIMIT 1", (REGULAR,)).fetchone() is not None
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def read_tabs(self) -> dict[str, list[dict]]:
+        tabs: dict[str, list[dict]] = {tab: [] for tab in KEY_COLUMNS}
+        with self._lock:
+            rows = self._db.execute("SELECT tab, data FROM records ORDER BY tab, position").fetchall()
+        for tab, data in rows:
+            tabs.setdefault(tab, []).append(json.loads(data))
+        return tabs
+
+    def update_cell(self, tab: str, key: str, column: str, value) -> bool:
+        """Apply a staff toggle locally and queue it for the Sheet."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute(
+                "SELECT position, data FROM records WHERE tab = ? AND key = ? ORDER BY position LIMIT 1",
+                (tab, key)).fetchone()
+            if row is None:
+                return False
+            data = json.loads(row[1])
+            if column not in data:
+                logger.warning("Column not found: %s", column)
+                return False
+            data[column] = _cell(value)
+            self._db.execute("UPDATE records SET data = ? WHERE tab = ? AND position = ?",
+                             (json.dumps(data, ensure_ascii=False), tab, row[0]))
+            self._db.execute("INSERT INTO edits (tab, key, column, value, at) VALUES (?, ?, ?, ?, ?)",
+                             (tab, key, column, json.dumps(value), time.time()))
+        return True
+
+    def append_rows(self, tab: str, rows: list[list]):
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("INSERT INTO appends (tab, data) VALUES (?, ?)",
+                                 [(tab, json.dumps(row, ensure_ascii=False)) for row in rows])
+
+    def pending_edits(self) -> list[tuple[int, str, str, str, object]]:
+        """(id, tab, key, column, value) of toggles not yet pushed, oldest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, tab, key, column, value FROM edits ORDER BY id").fetchall()
+        return [(id_, tab, key, column, json.loads(value)) for id_, tab, key, column, value in rows]
+
+    def clear_edit(self, edit_id: int):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM edits WHERE id = ?", (edit_id,))
+
+    def take_appends(self) -> dict[str, list[list]]:
+        """Claim the queued rows (so two workers never push the same row); restore_appends on failure."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            rows = self._db.execute("SELECT tab, data FROM appends ORDER BY id").fetchall()
+            self._db.execute("DELETE FROM appends")
+        taken: dict[str, list[list]] = {}
+        for tab, data in rows:
+            taken.setdefault(tab, []).append(json.loads(data))
+        return taken
+
+    def restore_appends(self, tab: str, rows: list[list]):
+        self.append_rows(tab, rows)
+
+    def replace_tabs(self, tabs: dict[str, list[dict]]) -> bool:
+        """Replace the given tabs with pulled rows, re-applying unpushed toggles; True if anything changed."""
+        changed = False
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            edits = self._db.execute("SELECT tab, key, column, value FROM edits ORDER BY id").fetchall()
+            for tab, rows in tabs.items():
+                key_column = KEY_COLUMNS[tab]
+                rows = [dict(row) for row in rows]
+                first = {}
+                for row in rows:
+                    first.setdefault(str(row.get(key_column, "")), row)
+                for edit_tab, key, column, value in edits:
+                    row = first.get(key) if edit_tab == tab else None
+                    if row is not None and column in row:
+                        row[column] = _cell(json.loads(value))
+                records = [(tab, position, str(row.get(key_column, "")), json.dumps(row, ensure_ascii=False))
+                           for position, row in enumerate(rows)]
+                current = self._db.execute(
+                    "SELECT data FROM records WHERE tab = ? ORDER BY position", (tab,)).fetchall()
+                if [data for (data,) in current] == [record[3] for record in records]:
+                    continue
+                changed = True
+                self._db.execute("DELETE FROM records WHERE tab = ?", (tab,))
+                self._db.executemany("INSERT INTO records (tab, position, key, data) VALUES (?, ?, ?, ?)", records)
+        return changed
+
+
+class SheetSync:
+    """Background push/pull between a LocalStore and the Sheet (one thread per store)."""
+
+    def __init__(self, local: LocalStore, connect: Callable[[], SheetsStore], on_change: Callable[[], None],
+                 interval: float = CACHE_TTL, name: str = "sheet-sync"):
+        self.local = local
+        self.remote: SheetsStore | None = None
+        self._connect = connect
+        self._on_change = on_change
+        self.interval = interval
+        self.name = name
+        self.last_pull = float(local.get_meta("last_pull", "0"))
+        self.next_pull = self.last_pull + interval
+        self.retry_at: float | None = None  # set after a failed round
+        self.failures = 0
+        self._round = threading.Lock()  # one push/pull at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _remote(self) -> SheetsStore:
+        if self.remote is None:
+            self.remote = self._connect()
+        return self.remote
+
+    def push(self):
+        """Send queued toggles, then queued rows. A failure leaves the rest queued."""
+        with self._round:
+            for edit_id, tab, key, column, value in self.local.pending_edits():
+                if self._remote().update_cell(tab, key, column, value):
+                    SYNC_EVENTS.labels(kind="edit_pushed").inc()
+                    logger.info("Synced %s %s -> %s to the sheet", key, column, value)
+                else:
+                    # Renamed or deleted in the Sheet since: the Sheet wins
+                    SYNC_EVENTS.labels(kind="edit_dropped").inc()
+                    logger.warning("Dropped toggle %s %s -> %s: row not in the sheet", key, column, value)
+                self.local.clear_edit(edit_id)
+            appends = list(self.local.take_appends().items())
+            for i, (tab, rows) in enumerate(appends):
+                try:
+                    self._remote().append_rows(tab, rows)
+                except Exception:
+                    for rest, rest_rows in appends[i:]:
+                        self.local.restore_appends(rest, rest_rows)
+                    raise
+                SYNC_EVENTS.labels(kind="rows_appended").inc(len(rows))
+
+    def pull(self) -> bool:
+        """Replace the local tabs with the Sheet's; True (and on_change) if anything changed."""
+        with self._round:
+            tabs = self._remote().read_tabs()
+            changed = self.local.replace_tabs(tabs)
+            self.last_pull = time.time()
+            self.local.set_meta("last_pull", str(self.last_pull))
+        SYNC_EVENTS.labels(kind="pulled" if changed else "unchanged").inc()
+        if changed:
+            self._on_change()
+        return changed
+
+    def run_once(self) -> bool:
+        self.push()
+        return self.pull()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def kick(self):
+        """Wake the thread: push now, and pull too if one is due. While a failed
+        round is backing off, the push waits for the retry instead.
+        """
+        self._wake.set()
+
+    def close(self, timeout: float = 0):
+        """Stop the thread after a last push; wait up to timeout seconds for it."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and timeout:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            due = self.next_pull if self.retry_at is None else min(self.next_pull, self.retry_at)
+            self._wake.wait(timeout=max(0.0, due - time.time()))
+            self._wake.clear()
+            if self._stop.is_set():
+                try:
+                    self.push()
+                except Exception as exc:
+                    logger.warning("Final sheet push failed, writes stay queued locally (%s)", exc)
+                break
+            if self.retry_at is not None and time.time() < self.retry_at:
+                continue  # kicked during backoff: queued writes go out with the retry
+            pull = time.time() >= self.next_pull
+            try:
+                self.push()
+                if pull:
+                    self.pull()
+            except Exception as exc:
+                # The snapshot stays marked as old (cache_age keeps growing) and the
+                # round is retried with backoff rather than after a whole interval
+                self.failures += 1
+                delay = min(self.interval, sheets_quota.backoff(self.failures, base=SYNC_RETRY_BASE))
+                self.retry_at = time.time() + delay
+                if pull:
+                    self.next_pull = self.retry_at
+                SYNC_EVENTS.labels(kind="failed").inc()
+                logger.warning("Sheet sync failed, serving the local copy; retry in %.0fs (%s: %s)",
+                               delay, type(exc).__name__, exc)
+            else:
+                self.retry_at = None
+                if pull:  # a push-only round (a toggle's kick) doesn't end the backoff
+                    self.failures = 0
+                    self.next_pull = self.last_pull + self.interval
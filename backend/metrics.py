@@ -0,0 +1,253 @@
+"""
+SUMI X Orator - Metrics
+Minimal Prometheus-style counters, gauges and histograms with text exposition.
+
+Every thread writes to its own shard, so recording a sample never takes a lock;
+shards are only summed when /metrics is scraped. No prometheus_client needed.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+# Latency buckets (seconds) spanning cache hits up to slow Gemini/Sheets calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Shards:
+    """Per-thread float arrays; each thread only ever writes to its own array."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._all: list[list[float]] = []
+        self._lock = threading.Lock()  # taken once per thread, on first write
+
+    def local(self) -> list[float]:
+        arr = getattr(self._local, "arr", None)
+        if arr is None:
+            arr = [0.0] * self._size
+            with self._lock:
+                self._all.append(arr)
+            self._local.arr = arr
+        return arr
+
+    def totals(self) -> list[float]:
+        with self._lock:
+            shards = list(self._all)
+        totals = [0.0] * self._size
+        for arr in shards:
+            for i, v in enumerate(arr):
+                totals[i] += v
+        return totals
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.local()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+        self._func: Callable[[], float] | None = None
+
+    def inc(self, amount: float = 1.0):
+        self._shards.local()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shards.local()[0] -= amount
+
+    def set_function(self, func: Callable[[], float]):
+        """Evaluate func at scrape time instead of tracking inc/dec."""
+        self._func = func
+
+    def value(self) -> float:
+        if self._func is not None:
+            return float(self._func())
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]):
+        self._buckets = buckets
+        # [bucket counts..., +Inf count, sum, count]
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        arr = self._shards.local()
+        arr[bisect.bisect_left(self._buckets, value)] += 1
+        arr[-2] += value
+        arr[-1] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> tuple[list[float], float, float]:
+        totals = self._shards.totals()
+        return totals[:-2], totals[-2], totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _label_str(self, key: tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._items():
+            lines.append(f"{self.name}{self._label_str(key)} {_fmt(child.value())}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._items():
+            counts, total, count = child.snapshot()
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _fmt(bound)
+                labels = self._label_str(key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {_fmt(count)}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Render every registered metric in Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+HTTP_REQUESTS = Counter(
+    "sumi_http_requests_total", "HTTP requests by route and status.",
+    ("endpoint", "method", "status"))
+HTTP_LATENCY = Histogram(
+    "sumi_http_request_duration_seconds", "HTTP request latency by route.",
+    ("endpoint",))
+HTTP_IN_FLIGHT = Gauge(
+    "sumi_http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_ERRORS = Counter(
+    "sumi_http_errors_total", "Unhandled exceptions raised by endpoints.",
+    ("endpoint",))
+
+STAGE_LATENCY = Histogram(
+    "sumi_stage_duration_seconds", "Latency of request stages (refresh, context, llm, ...).",
+    ("stage",))
+
+UPSTREAM_LATENCY = Histogram(
+    "sumi_upstream_duration_seconds", "Latency of upstream Google API calls.",
+    ("upstream", "method"))
+UPSTREAM_IN_FLIGHT = Gauge(
+    "sumi_upstream_in_flight", "Upstream Google API calls currently running.",
+    ("upstream",))
+UPSTREAM_ERRORS = Counter(
+    "sumi_upstream_errors_total", "Failed upstream Google API calls.",
+    ("upstream", "method"))
+
+CACHE_EVENTS = Counter(
+    "sumi_cache_events_total", "Cache lookups by cache and result (hit/miss).",
+    ("cache", "result"))
+MENU_CACHE_AGE = Gauge(
+    "sumi_menu_cache_age_seconds", "Seconds since the menu snapshot was fetched.")
+
+
+@contextmanager
+def track_upstream(upstream: str, method: str):
+    """Time an upstream call, counting in-flight calls and failures."""
+    in_flight = UPSTREAM_IN_FLIGHT.labels(upstream=upstream)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(upstream=upstream, method=method).inc()
+        raise
+    finally:
+        in_flight.dec()
+        UPSTREAM_LATENCY.labels(upstream=upstream, method=method).observe(time.perf_counter() - start)
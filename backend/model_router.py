@@ -0,0 +1,108 @@
+"""
+SUMI X Orator - Model router
+Picks the Gemini model and output budget per chat turn. Greetings, thanks
+and phrase lessons go to a lighter model; allergy/diet/safety turns and
+everything else stay on the primary model. A lite reply that breaks the
+SYSTEM_TEMPLATE format rules (over 400 characters, Markdown, empty) is
+discarded and the turn is re-run on the primary model.
+
+Environment:
+  MODEL_ROUTER=0             always use the primary model
+  GEMINI_MODEL               primary model (default gemini-2.5-flash)
+  GEMINI_LITE_MODEL          light model (default gemini-2.5-flash-lite)
+  PRIMARY_MAX_TOKENS=1500    output budget (2.5-flash spends part of it thinking)
+  LITE_MAX_TOKENS=400
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import NamedTuple
+
+from allergens import ALLERGEN_SYNONYMS, ALLERGY_KEYWORDS
+from metrics import Counter
+
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER", "1") == "1"
+MAX_REPLY_CHARS = 400
+
+
+class Route(NamedTuple):
+    name: str
+    model: str
+    max_output_tokens: int
+    temperature: float = 0.7
+
+
+ROUTES = {
+    "primary": Route("primary", os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+                     int(os.getenv("PRIMARY_MAX_TOKENS", "1500"))),
+    "lite": Route("lite", os.getenv("GEMINI_LITE_MODEL", "gemini-2.5-flash-lite"),
+                  int(os.getenv("LITE_MAX_TOKENS", "400"))),
+}
+
+MODEL_ROUTES = Counter(
+    "sumi_model_route_total", "Chat turns by model route and outcome.", ("route", "outcome"))
+
+# Safety topics beyond allergies that must never be answered by the light model
+_SAFETY = re.compile(
+    r"pregnan|medication|medicine|diabet|celiac|coeliac|choking|baby|infant|kid|child|raw|undercooked|"
+    r"alcohol[- ]free|non[- ]alcoholic|sick|emergency|peanut|\bnuts?\b|vegetarian|al[eé]rgic|"
+    r"ピーナッツ|ナッツ|ベジタリアン|땅콩|견과|채식|花生|坚果|man[ií]\b|cacahuete|amendoim|"
+    r"妊娠|妊婦|薬|糖尿|子供|子ども|赤ちゃん|生もの|ノンアル|임신|복용|약을|어린이|아기|날것|"
+    r"怀孕|药|孩子|婴儿|生的|embaraz|medicament|niño|bebé|crudo|grávida|gravidez|criança|cru\b")
+
+# Low-complexity turns: greetings, thanks, goodbyes and phrase lessons
+_LITE = re.compile(
+    r"^(hi|hello|hey|yo|good (morning|evening|night)|thanks?|thank you|thx|bye|goodbye|see you|cheers|kanpai)\b|"
+    r"how (do|would|can) (i|you) say|what does .{1,40} mean|teach me|japanese (phrase|word)|"
+    r"こんにちは|こんばんは|ありがとう|ごちそうさま|さようなら|乾杯|どういう意味|って何て言う|"
+    r"안녕|감사|고마워|건배|무슨 뜻|你好|谢谢|再见|干杯|什么意思|"
+    r"^(hola|gracias|adiós|salud)\b|c[oó]mo se dice|qu[eé] significa|"
+    r"^(ol[aá]|oi|obrigad[oa]|tchau|sa[uú]de)\b|como (se )?diz|o que significa")
+
+# Menu asks need the full menu reasoning even inside a greeting ("Hi! What's popular?")
+_MENU_ASKS = re.compile(
+    r"recommend|suggest|popular|best|order|menu|dish|special|spicy|drink|sake|beer|dessert|price|\?.*\?|"
+    r"おすすめ|オススメ|人気|メニュー|注文|辛い|추천|인기|메뉴|주문|推荐|人气|菜单|点菜|"
+    r"recomi|sugier|men[uú]|plato|bebida|recomend|sugest|card[aá]pio|prato")
+
+# Allergen names ("does it have shrimp?") count as safety even without "allergy"
+_ALLERGEN_WORDS = {w.lower() for words in ALLERGEN_SYNONYMS.values() for w in words}
+
+_TAGS = re.compile(r"\[(ENERGY|RESPOND IN):.*?\]\s*")
+_MARKDOWN = re.compile(r"\*\*|__|`|^\s{0,3}#{1,6}\s|^\s*[-*+]\s|^\s*\d+\.\s|\[[^\]]+\]\([^)]+\)", re.M)
+
+
+def guest_text(user_message: str) -> str:
+    """The guest's own words, without the internal [ENERGY]/[RESPOND IN] hints."""
+    return _TAGS.sub("", user_message).strip()
+
+
+def choose_route(user_message: str, economy: bool = False) -> tuple[Route, str]:
+    """Return the route for a turn and the reason it was picked. In economy
+    mode (daily budget nearly spent) every non-safety turn takes the lite route.
+    """
+    text = guest_text(user_message).lower()
+    if not MODEL_ROUTER_ENABLED:
+        return ROUTES["primary"], "disabled"
+    if (any(kw in text for kw in ALLERGY_KEYWORDS) or _SAFETY.search(text)
+            or any(w in text for w in _ALLERGEN_WORDS)):
+        return ROUTES["primary"], "safety"
+    if len(text) <= 80 and _LITE.search(text) and not _MENU_ASKS.search(text):
+        return ROUTES["lite"], "simple"
+    if economy:
+        return ROUTES["lite"], "budget"
+    return ROUTES["primary"], "default"
+
+
+def format_violations(reply: str) -> list[str]:
+    """SYSTEM_TEMPLATE rules a reply breaks: length, Markdown, or empty."""
+    problems = []
+    if not reply.strip():
+        problems.append("empty")
+    if len(reply) > MAX_REPLY_CHARS:
+        problems.append("too_long")
+    if _MARKDOWN.search(reply):
+        problems.append("markdown")
+    return problems
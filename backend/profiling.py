@@ -0,0 +1,129 @@
+"""
+SUMI X Orator - Per-request profiling
+Named spans (sheets_refresh, context_build, llm, name_match, tts) recorded per
+request and returned in a Server-Timing header, plus an opt-in sampling
+profiler that dumps folded stacks for requests slower than a threshold.
+
+Environment:
+  SERVER_TIMING=0          disable the Server-Timing header (default: on)
+  PROFILE_SLOW_MS          enable the profiler; dump requests slower than this
+  PROFILE_SAMPLE_RATE      fraction of requests to profile (default 1.0)
+  PROFILE_INTERVAL_MS      stack sampling interval (default 5)
+  PROFILE_DIR              write .folded files here (flamegraph.pl / speedscope)
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "1") != "0"
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0") or 0)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_spans", default=None)
+
+# Leaf functions of threads that are parked rather than doing work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "concurrent/futures/thread.py")
+
+
+@contextmanager
+def span(name: str):
+    """Time a named request stage for Server-Timing and the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=name).observe(duration)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((name, duration))
+
+
+def begin_request() -> list[tuple[str, float]]:
+    """Start collecting spans for the current request context."""
+    spans: list[tuple[str, float]] = []
+    _spans.set(spans)
+    return spans
+
+
+def server_timing(spans: list[tuple[str, float]], total: float) -> str:
+    """Format spans as a Server-Timing header value (durations in ms)."""
+    merged: dict[str, float] = {}
+    for name, duration in spans:
+        merged[name] = merged.get(name, 0.0) + duration
+    parts = [f"{name};dur={duration * 1000:.1f}" for name, duration in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class StackSampler:
+    """Samples busy threads' stacks on a background thread while a request runs.
+
+    Stacks are process-wide, so concurrent requests can show up in each
+    other's profiles; the folded output is meant for spotting hot paths.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._stacks: Counter[str] = Counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self._stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+def maybe_start_sampler() -> StackSampler | None:
+    """Start a sampler for this request if profiling is on and it is sampled."""
+    if PROFILE_SLOW_MS <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    sampler = StackSampler()
+    sampler.start()
+    return sampler
+
+
+def finish_sampler(sampler: StackSampler, route: str, duration: float):
+    """Stop the sampler and dump its stacks if the request was slow."""
+    stacks = sampler.stop()
+    if duration * 1000 < PROFILE_SLOW_MS or not stacks:
+        return
+    top = ", ".join(f"{stack.rsplit(';', 1)[-1]} x{n}" for stack, n in stacks.most_common(5))
+    logger.warning("Slow request %s took %.0fms; top frames: %s", route, duration * 1000, top)
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = route.strip("/").replace("/", "_") or "root"
+        name = f"{int(time.time() * 1000)}-{slug}.folded"
+        with open(os.path.join(PROFILE_DIR, name), "w") as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
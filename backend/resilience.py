@@ -0,0 +1,228 @@
+"""
+SUMI X Orator - Upstream resilience
+Deadlines, circuit breakers and optional hedged requests for the Google APIs
+(Gemini, Cloud TTS, Sheets). When an upstream's recent error rate spikes its
+breaker opens and calls fail fast, so callers serve their fallback or stale
+data instead of holding a worker thread until the SDK gives up.
+
+Environment:
+  GEMINI_TIMEOUT / TTS_TIMEOUT / SHEETS_TIMEOUT   per-call deadline (seconds)
+  GEMINI_HEDGE=1        fire a second Gemini attempt after the recent p95
+  BREAKER_COOLDOWN      seconds an open breaker waits before a trial call
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, TypeVar
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "20"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "10"))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "10"))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "15"))
+
+BREAKER_STATE = Gauge(
+    "sumi_circuit_breaker_open", "1 while an upstream's circuit breaker is open.", ("upstream",))
+BREAKER_REJECTIONS = Counter(
+    "sumi_circuit_breaker_rejections_total", "Calls failed fast by an open breaker.", ("upstream",))
+HEDGED_CALLS = Counter(
+    "sumi_hedged_requests_total", "Hedged second attempts by which attempt won.", ("upstream", "winner"))
+DEADLINE_EXCEEDED = Counter(
+    "sumi_upstream_deadline_exceeded_total", "Upstream calls abandoned at their deadline.", ("upstream",))
+
+# Threads for deadline-bounded and hedged calls; abandoned calls finish here
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("UPSTREAM_THREADS", "32")),
+                               thread_name_prefix="upstream")
+
+
+# CircuitBreaker.admit() results
+ADMITTED = "admitted"
+TRIAL = "trial"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class UpstreamTimeout(Exception):
+    """Raised when an upstream call exceeds its deadline."""
+
+
+class CircuitBreaker:
+    """Rolling-window error-rate breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 8,
+                 window: float = 60.0, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self._failure_rate = failure_rate
+        self._min_calls = min_calls
+        self._window = window
+        self._cooldown = cooldown
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._gauge = BREAKER_STATE.labels(upstream=name)
+        self._gauge.set_function(lambda: 1.0 if self.is_open else 0.0)
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def admit(self) -> str | None:
+        """ADMITTED or TRIAL if a call may proceed (one trial call once cooldown
+        passes), None if it must fail fast.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return ADMITTED
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self._cooldown:
+                return None
+            self._trial_in_flight = True
+            return TRIAL
+
+    def record(self, ok: bool, trial: bool = False):
+        """Record a call's outcome; trial=True for the call admit() returned TRIAL for."""
+        with self._lock:
+            now = time.monotonic()
+            if trial:
+                # Only the half-open trial decides whether to close or stay open
+                self._trial_in_flight = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                    logger.info("Circuit closed: %s", self.name)
+                else:
+                    self._opened_at = now
+                return
+            if self._opened_at is not None:
+                return  # a call that started before the breaker opened
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self._window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if len(self._outcomes) >= self._min_calls and failures / len(self._outcomes) >= self._failure_rate:
+                self._opened_at = now
+                logger.warning("Circuit opened: %s (%d/%d failed in %.0fs)",
+                               self.name, failures, len(self._outcomes), self._window)
+
+
+class LatencyTracker:
+    """Recent successful latencies, used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        samples = sorted(self._samples)
+        if len(samples) < 20:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Upstream:
+    """Deadline + circuit breaker (+ optional hedging) policy for one upstream."""
+
+    def __init__(self, name: str, timeout: float, hedge: bool = False,
+                 hedge_default_delay: float = 4.0, hedge_min_delay: float = 1.0):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self._hedge_default_delay = hedge_default_delay
+        self._hedge_min_delay = hedge_min_delay
+
+    def _check(self) -> bool:
+        """Raise CircuitOpenError unless the breaker admits the call; True for the half-open trial."""
+        admitted = self.breaker.admit()
+        if admitted is None:
+            BREAKER_REJECTIONS.labels(upstream=self.name).inc()
+            raise CircuitOpenError(f"{self.name} circuit open")
+        return admitted == TRIAL
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        result = fn()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    def guard(self, fn: Callable[[], T]) -> T:
+        """Run fn inline (it enforces its own timeout) behind the breaker."""
+        trial = self._check()
+        try:
+            result = self._timed(fn)
+        except Exception:
+            self.breaker.record(False, trial)
+            raise
+        self.breaker.record(True, trial)
+        return result
+
+    def call(self, fn: Callable[[], T], hedge: bool | None = None) -> T:
+        """Run fn on the upstream pool, abandoning it at the deadline.
+        With hedging on, a second attempt starts after the recent p95 latency
+        and whichever attempt succeeds first wins.
+        """
+        trial = self._check()
+        hedge = self.hedge if hedge is None else hedge
+        try:
+            result = self._hedged(fn) if hedge else self._deadline(fn)
+        except Exception:
+            self.breaker.record(False, trial)
+            raise
+        self.breaker.record(True, trial)
+        return result
+
+    def _deadline(self, fn: Callable[[], T]) -> T:
+        future = _executor.submit(self._timed, fn)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            DEADLINE_EXCEEDED.labels(upstream=self.name).inc()
+            raise UpstreamTimeout(f"{self.name} exceeded {self.timeout:g}s deadline") from None
+
+    def _hedged(self, fn: Callable[[], T]) -> T:
+        deadline = time.monotonic() + self.timeout
+        p95 = self.latency.percentile(95)
+        delay = max(self._hedge_min_delay, p95) if p95 is not None else self._hedge_default_delay
+        first = _executor.submit(self._timed, fn)
+        attempts = {first: "first"}
+        done, _ = wait([first], timeout=min(delay, self.timeout))
+        if not done:
+            attempts[_executor.submit(self._timed, fn)] = "hedge"
+        pending = set(attempts)
+        error: BaseException | None = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(attempts) > 1:
+                        HEDGED_CALLS.labels(upstream=self.name, winner=attempts[future]).inc()
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        DEADLINE_EXCEEDED.labels(upstream=self.name).inc()
+        raise UpstreamTimeout(f"{self.name} exceeded {self.timeout:g}s deadline")
+
+
+GEMINI = Upstream("gemini", GEMINI_TIMEOUT, hedge=GEMINI_HEDGE)
+TTS = Upstream("tts", TTS_TIMEOUT)
+SHEETS = Upstream("sheets", SHEETS_TIMEOUT)
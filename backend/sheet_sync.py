@@ -0,0 +1,245 @@
+"""
+SUMI X Orator - Sheet sync
+Diff-based, idempotent sync of seed data (populate_sheets.py) into the Google
+Sheet. Each tab is read once, rows are matched on a key column (メニュー名(英)
+or 項目名) and columns by header name, and only changed cells are written:
+all tabs' value changes go out in one values batch request, and row deletions
+(--prune) plus checkbox validation in one spreadsheet batch request. Calls go
+through the Sheets quota scheduler (sheets_quota.py), so 429s are retried. Live
+columns the staff toggle during service (提供中, おすすめフラグ, 常駐フラグ) are
+only written for new rows, and blank seed cells never clear a filled cell.
+Running it twice is a no-op.
+
+Usage:
+  python populate_sheets.py --dry-run     # print the plan, write nothing
+  python populate_sheets.py [--prune]     # apply; --prune deletes rows no longer seeded
+
+Environment (same as the backend):
+  GOOGLE_SHEET_ID
+  GOOGLE_SHEETS_CREDENTIALS / GOOGLE_SHEETS_CREDENTIALS_B64 / GOOGLE_SHEETS_CREDENTIALS_FILE
+"""
+
+from __future__ import annotations
+
+import os
+import argparse
+from typing import NamedTuple
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+import sheets_quota
+from sheets_quota import scheduler
+
+# Staff-owned during service; the sync only fills them in for new rows
+LIVE_COLUMNS = ("提供中", "おすすめフラグ", "常駐フラグ")
+
+
+class TabSpec(NamedTuple):
+    title: str
+    header: list[str]
+    rows: list[list]
+    key: str = "メニュー名(英)"
+    checkboxes: tuple[str, ...] = ()
+    cols: int = 12
+
+
+class TabPlan(NamedTuple):
+    spec: TabSpec
+    exists: bool
+    header: list[str]                        # sheet header after the sync
+    updates: list[tuple[str, list[list]]]    # (A1 range, values)
+    added: list[str]
+    changed: dict[str, list[str]]            # key -> changed columns
+    removed: list[tuple[int, str]]           # (row number, key)
+    unchanged: int
+    row_count: int                           # data rows after the sync (without pruning)
+
+
+def _cell(value) -> str:
+    """Sheet display form of a seed value, for comparison."""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value == int(value):
+        return str(int(value))
+    return "" if value is None else str(value)
+
+
+def _same(seed, current: str) -> bool:
+    if _cell(seed) == current.strip():
+        return True
+    if isinstance(seed, (int, float)) and not isinstance(seed, bool):
+        try:
+            return float(current.replace("$", "").replace(",", "")) == float(seed)
+        except ValueError:
+            return False
+    return False
+
+
+def _runs(cols: list[int]) -> list[tuple[int, int]]:
+    """Group sorted 0-based column indexes into contiguous (first, last) runs."""
+    runs: list[tuple[int, int]] = []
+    for c in cols:
+        if runs and c == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], c)
+        else:
+            runs.append((c, c))
+    return runs
+
+
+def plan_tab(spec: TabSpec, values: list[list[str]] | None) -> TabPlan:
+    """Diff the seed rows against the tab's current values (None = tab missing)."""
+    exists = values is not None
+    values = [list(r) for r in values or []]
+    while values and not any(str(c).strip() for c in values[-1]):
+        values.pop()  # trailing blank rows; blank rows in the middle keep their numbers
+    quoted = "'" + spec.title.replace("'", "''") + "'"
+    updates: list[tuple[str, list[list]]] = []
+
+    header = [str(h).strip() for h in values[0]] if values else []
+    missing = [h for h in spec.header if h not in header]
+    if missing:
+        start = len(header)
+        header = header + missing
+        updates.append((f"{quoted}!{rowcol_to_a1(1, start + 1)}:{rowcol_to_a1(1, len(header))}", [missing]))
+    col = {h: i for i, h in enumerate(header)}
+    key_col = col[spec.key]
+
+    current: dict[str, tuple[int, list[str]]] = {}
+    for row_num, row in enumerate(values[1:], start=2):
+        key = str(row[key_col]).strip() if key_col < len(row) else ""
+        if key and key not in current:
+            current[key] = (row_num, row + [""] * (len(header) - len(row)))
+
+    seeded = set()
+    added: list[str] = []
+    changed: dict[str, list[str]] = {}
+    unchanged = 0
+    next_row = max(len(values), 1) + 1
+    for seed in spec.rows:
+        item = dict(zip(spec.header, seed))
+        key = _cell(item[spec.key]).strip()
+        seeded.add(key)
+        if key not in current:
+            row = [""] * len(header)
+            for name, value in item.items():
+                row[col[name]] = value
+            updates.append((f"{quoted}!{rowcol_to_a1(next_row, 1)}:{rowcol_to_a1(next_row, len(header))}", [row]))
+            added.append(key)
+            next_row += 1
+            continue
+        row_num, row = current[key]
+        # Blank seed cells are unmanaged: photos and notes added in the sheet stay
+        diff = sorted(col[name] for name, value in item.items()
+                      if name not in LIVE_COLUMNS and _cell(value) != ""
+                      and not _same(value, str(row[col[name]])))
+        if not diff:
+            unchanged += 1
+            continue
+        changed[key] = [header[i] for i in diff]
+        for first, last in _runs(diff):
+            cells = [item.get(header[i], "") for i in range(first, last + 1)]
+            updates.append((f"{quoted}!{rowcol_to_a1(row_num, first + 1)}:{rowcol_to_a1(row_num, last + 1)}",
+                            [cells]))
+
+    removed = sorted((row_num, key) for key, (row_num, _) in current.items() if key not in seeded)
+    return TabPlan(spec, exists, header, updates, added, changed, removed, unchanged, next_row - 2)
+
+
+def _checkbox_request(sheet_id: int, col: int, rows: int) -> dict:
+    return {"setDataValidation": {
+        "range": {"sheetId": sheet_id, "startRowIndex": 1, "endRowIndex": rows + 1,
+                  "startColumnIndex": col, "endColumnIndex": col + 1},
+        "rule": {"condition": {"type": "BOOLEAN"}, "showCustomUi": True},
+    }}
+
+
+def apply(spreadsheet, plans: list[TabPlan], prune: bool = False):
+    """Write the plans: one values batch, then one structural batch."""
+    sheets = {}
+    for plan in plans:
+        if not plan.exists:
+            sheets[plan.spec.title] = scheduler.call("write", lambda plan=plan: spreadsheet.add_worksheet(
+                plan.spec.title, rows=max(100, plan.row_count + 50), cols=max(plan.spec.cols, len(plan.header))))
+        else:
+            sheets[plan.spec.title] = scheduler.call("read", lambda plan=plan: spreadsheet.worksheet(plan.spec.title))
+
+    data = [{"range": a1, "values": values} for plan in plans for a1, values in plan.updates]
+    if data:
+        scheduler.call("write", lambda: spreadsheet.values_batch_update(
+            {"valueInputOption": "USER_ENTERED", "data": data}))
+
+    requests = []
+    for plan in plans:
+        sheet_id = sheets[plan.spec.title].id
+        rows = plan.row_count
+        if prune and plan.removed:
+            # Bottom-up so earlier deletions don't shift the later row numbers
+            for row_num, _ in sorted(plan.removed, reverse=True):
+                requests.append({"deleteDimension": {"range": {
+                    "sheetId": sheet_id, "dimension": "ROWS", "startIndex": row_num - 1, "endIndex": row_num}}})
+            rows -= len(plan.removed)
+        if plan.added or not plan.exists:
+            requests += [_checkbox_request(sheet_id, plan.header.index(name), rows)
+                         for name in plan.spec.checkboxes if name in plan.header]
+    if requests:
+        scheduler.call("write", lambda: spreadsheet.batch_update({"requests": requests}))
+
+
+def sync(spreadsheet, specs: list[TabSpec], dry_run: bool = False, prune: bool = False) -> list[TabPlan]:
+    """Plan every tab from a single read each, then apply unless dry_run."""
+    plans = []
+    for spec in specs:
+        try:
+            worksheet = scheduler.call("read", lambda: spreadsheet.worksheet(spec.title))
+            values = scheduler.call("read", worksheet.get_all_values)
+        except gspread.WorksheetNotFound:
+            values = None
+        plans.append(plan_tab(spec, values))
+    if not dry_run:
+        apply(spreadsheet, plans, prune)
+    return plans
+
+
+def describe(plan: TabPlan, prune: bool = False) -> str:
+    lines = [f"{plan.spec.title}: " + ("new tab, " if not plan.exists else "")
+             + f"{len(plan.added)} added, {len(plan.changed)} changed, {plan.unchanged} unchanged, "
+             + f"{len(plan.removed)} not in seed" + (" (deleted)" if prune and plan.removed else "")]
+    lines += [f"  + {key}" for key in plan.added]
+    lines += [f"  ~ {key}: {', '.join(cols)}" for key, cols in plan.changed.items()]
+    lines += [f"  - {key} (row {row_num})" for row_num, key in plan.removed]
+    return "\n".join(lines)
+
+
+def open_spreadsheet():
+    """Open GOOGLE_SHEET_ID with the backend's credential environment variables."""
+    from menu_store import load_credentials
+
+    sheet_id = os.getenv("GOOGLE_SHEET_ID", "")
+    if not sheet_id:
+        raise SystemExit("GOOGLE_SHEET_ID is not set")
+    client = gspread.authorize(load_credentials())
+    return scheduler.call("read", lambda: client.open_by_key(sheet_id))
+
+
+def main_cli(specs: list[TabSpec], description: str | None = None):
+    parser = argparse.ArgumentParser(description=description or __doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="print the changes without writing")
+    parser.add_argument("--prune", action="store_true", help="delete rows that are no longer in the seed data")
+    parser.add_argument("--tab", action="append", help="only sync this tab (repeatable)")
+    args = parser.parse_args()
+
+    if args.tab:
+        specs = [s for s in specs if s.title in args.tab]
+    # Run by staff on demand: ahead of the backend's refreshes if they share the scheduler
+    with sheets_quota.lane("staff"):
+        spreadsheet = open_spreadsheet()
+        plans = sync(spreadsheet, specs, dry_run=args.dry_run, prune=args.prune)
+    for plan in plans:
+        print(describe(plan, args.prune))
+    writes = sum(len(p.updates) for p in plans)
+    if args.dry_run:
+        print(f"\nDry run: {writes} ranges would be written.")
+    else:
+        print(f"\nDone: {writes} ranges written.")
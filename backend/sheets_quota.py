@@ -0,0 +1,159 @@
+"""
+SUMI X Orator - Sheets quota scheduler
+Every Google Sheets API call in the process (sync pulls and pushes for every
+store, sheet setup, populate_sheets.py) goes through one scheduler, because
+the per-minute read and write quotas are shared by everything using the
+service account. Calls take a token from the read or write bucket first; when
+the bucket is empty they queue by lane, and a waiting staff toggle always goes
+before a menu refresh, which goes before a Ratings/Analytics append. A call
+that can't get quota within its lane's wait raises SheetsThrottled (the sync
+keeps the work queued and retries).
+
+Responses with 429 or 5xx are retried with jittered exponential backoff; a
+429 also empties the bucket so other callers back off with it.
+
+The lane comes from the calling context:
+  with sheets_quota.lane("staff"):
+      sheet.update_cell(...)
+
+Environment:
+  SHEETS_READ_RATE=60    read requests per minute (Sheets' per-user default quota)
+  SHEETS_WRITE_RATE=60   write requests per minute
+  SHEETS_BURST=20        requests allowed back to back
+  SHEETS_RETRIES=4       retries of a 429/5xx response
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+from admission import TokenBucket
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SHEETS_READ_RATE = float(os.getenv("SHEETS_READ_RATE", "60"))
+SHEETS_WRITE_RATE = float(os.getenv("SHEETS_WRITE_RATE", "60"))
+SHEETS_BURST = float(os.getenv("SHEETS_BURST", "20"))
+SHEETS_RETRIES = int(os.getenv("SHEETS_RETRIES", "4"))
+RETRY_BASE = 1.0   # seconds before the first retry
+RETRY_CAP = 32.0
+
+# Lane -> (priority, max seconds to wait for quota); lower priority value goes first
+LANES = {
+    "staff": (0, 30.0),
+    "refresh": (1, 60.0),
+    "analytics": (2, 120.0),
+}
+
+SHEETS_QUEUED = Gauge("sumi_sheets_queued", "Sheets calls waiting for quota, by lane.", ("lane",))
+SHEETS_THROTTLED = Counter(
+    "sumi_sheets_throttled_total",
+    "Sheets calls held back, by lane and reason (queued, rejected, rate_limited).", ("lane", "reason"))
+SHEETS_RETRIES_TOTAL = Counter(
+    "sumi_sheets_retries_total", "Sheets calls retried after an error response, by status.", ("status",))
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("sheets_lane", default="refresh")
+
+
+class SheetsThrottled(Exception):
+    """Raised when a call could not get quota within its lane's wait."""
+
+
+@contextmanager
+def lane(name: str):
+    """Run the Sheets calls in this block in the given lane."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def backoff(attempt: int, base: float = RETRY_BASE, cap: float = RETRY_CAP) -> float:
+    """Exponential backoff with jitter for retry `attempt` (1 = first retry)."""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+def status_of(exc: Exception) -> int | None:
+    """HTTP status of a gspread APIError (or anything carrying a response), else None."""
+    code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+class SheetsScheduler:
+    """Read/write token buckets with priority lanes. Thread-safe; callers block while queued."""
+
+    def __init__(self, read_rate: float = SHEETS_READ_RATE, write_rate: float = SHEETS_WRITE_RATE,
+                 burst: float = SHEETS_BURST, retries: int = SHEETS_RETRIES):
+        self.buckets = {"read": TokenBucket(read_rate, burst), "write": TokenBucket(write_rate, burst)}
+        self.retries = retries
+        self._cond = threading.Condition()
+        self._waiting = {(kind, name): 0 for kind in self.buckets for name in LANES}
+        for name in LANES:
+            SHEETS_QUEUED.labels(lane=name).set_function(
+                lambda name=name: sum(self._waiting[(kind, name)] for kind in self.buckets))
+
+    def _acquire(self, kind: str, name: str):
+        priority, max_wait = LANES[name]
+        bucket = self.buckets[kind]
+        deadline = time.monotonic() + max_wait
+        queued = False
+        with self._cond:
+            self._waiting[(kind, name)] += 1
+            try:
+                while True:
+                    ahead = any(self._waiting[(kind, other)] for other, (p, _) in LANES.items() if p < priority)
+                    wait = 0.5 if ahead else bucket.wait_time(1)
+                    if not wait:
+                        bucket.take(1)
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        SHEETS_THROTTLED.labels(lane=name, reason="rejected").inc()
+                        raise SheetsThrottled(f"no Sheets {kind} quota for {name} within {max_wait:g}s")
+                    if not queued:
+                        queued = True
+                        SHEETS_THROTTLED.labels(lane=name, reason="queued").inc()
+                    self._cond.wait(timeout=min(wait, remaining))
+            finally:
+                self._waiting[(kind, name)] -= 1
+                self._cond.notify_all()
+
+    def _drain(self, kind: str):
+        with self._cond:
+            self.buckets[kind].tokens = min(self.buckets[kind].tokens, 0.0)
+
+    def call(self, kind: str, fn: Callable[[], T]) -> T:
+        """Run fn ("read" or "write") in the current lane once quota allows, retrying 429/5xx."""
+        name = _lane.get()
+        attempt = 0
+        while True:
+            self._acquire(kind, name)
+            try:
+                return fn()
+            except Exception as exc:
+                status = status_of(exc)
+                if status is None or (status != 429 and status < 500) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                if status == 429:
+                    SHEETS_THROTTLED.labels(lane=name, reason="rate_limited").inc()
+                    self._drain(kind)
+                delay = backoff(attempt)
+                SHEETS_RETRIES_TOTAL.labels(status=status).inc()
+                logger.warning("Sheets %s returned %d (%s lane), retry %d/%d in %.1fs",
+                               kind, status, name, attempt, self.retries, delay)
+                time.sleep(delay)
+
+
+scheduler = SheetsScheduler()
@@ -0,0 +1,304 @@
+"""
+SUMI X Orator - Multi-restaurant tenants
+One process can serve many stores. Each tenant has its own Google Sheet
+snapshot (MenuDatabase), chat and training models built from that snapshot,
+staff password and admission bucket. Requests are routed by a /t/{tenant}
+path prefix or by Host; the prefix is stripped, so /t/shibuya/api/menu is
+served by the usual /api/menu handler.
+
+Tenants are loaded on first request (one load per tenant however many
+requests arrive at once) and kept in an LRU: past TENANT_MAX_LOADED, or after
+TENANT_IDLE_TTL seconds without a request, the least recently used store is
+dropped and reloaded when it is next needed. Preloaded tenants (and the
+default one) are opened at startup and never evicted. The TTS client, Gemini
+SDK, menu photo cache and usage budgets are shared by all tenants.
+
+Without TENANTS the process serves a single "default" store from
+GOOGLE_SHEET_ID / RESTAURANT_NAME, as before.
+
+Environment:
+  TENANTS            JSON: {"shibuya": {"sheet_id": "...", "restaurant_name": "Guu Shibuya",
+                       "hosts": ["shibuya.example.com"], "staff_password": "...",
+                       "rate": 600, "burst": 150, "preload": true}, ...}
+  TENANTS_FILE       the same JSON in a file
+  TENANT_DEFAULT     tenant for requests without a prefix or known host (else 404)
+  TENANT_MAX_LOADED=20
+  TENANT_IDLE_TTL=1800
+  TENANT_RATE / TENANT_BURST   per-store admission refill (units/min) and bucket size
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+from fastapi.responses import JSONResponse
+
+from admission import GLOBAL_BURST, GLOBAL_RATE, TokenBucket
+from ai_handler import AIHandler
+from database import MenuDatabase
+from metrics import Counter, Gauge
+from training_handler import TrainingHandler
+
+logger = logging.getLogger(__name__)
+
+TENANT_MAX_LOADED = int(os.getenv("TENANT_MAX_LOADED", "20"))
+TENANT_IDLE_TTL = float(os.getenv("TENANT_IDLE_TTL", "1800"))
+TENANT_RATE = float(os.getenv("TENANT_RATE", str(GLOBAL_RATE)))
+TENANT_BURST = float(os.getenv("TENANT_BURST", str(GLOBAL_BURST)))
+# A store whose sheet failed to open is retried on the next request after this
+TENANT_RETRY = 60.0
+SWEEP_INTERVAL = 60.0
+
+PATH_PREFIX = "/t/"
+_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+TENANTS_LOADED = Gauge("sumi_tenants_loaded", "Stores currently loaded in this process.")
+TENANT_EVENTS = Counter(
+    "sumi_tenant_events_total", "Tenant lookups by outcome (hit, load, evicted, unknown).", ("event",))
+
+
+class TenantConfig(NamedTuple):
+    id: str
+    sheet_id: str
+    restaurant_name: str
+    hosts: tuple[str, ...] = ()
+    staff_password: str = ""   # empty = STAFF_PASSWORD
+    rate: float = TENANT_RATE
+    burst: float = TENANT_BURST
+    pinned: bool = False       # opened at startup, never evicted
+
+
+def load_configs() -> tuple[dict[str, TenantConfig], str | None]:
+    """Tenant configs and the default tenant id from TENANTS / TENANTS_FILE."""
+    raw = os.getenv("TENANTS", "")
+    path = os.getenv("TENANTS_FILE", "")
+    if not raw and path:
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+    if not raw.strip():
+        config = TenantConfig("default", os.getenv("GOOGLE_SHEET_ID", ""),
+                              os.getenv("RESTAURANT_NAME", "Guu Original"), pinned=True)
+        return {"default": config}, "default"
+
+    default_id = os.getenv("TENANT_DEFAULT", "") or None
+    configs = {}
+    for tenant_id, spec in json.loads(raw).items():
+        if not _ID.match(tenant_id):
+            raise ValueError(f"Invalid tenant id {tenant_id!r} (lowercase letters, digits, - and _)")
+        if not spec.get("sheet_id"):
+            raise ValueError(f"Tenant {tenant_id!r} has no sheet_id")
+        configs[tenant_id] = TenantConfig(
+            id=tenant_id,
+            sheet_id=spec["sheet_id"],
+            restaurant_name=spec.get("restaurant_name", tenant_id),
+            hosts=tuple(host.lower() for host in spec.get("hosts", ())),
+            staff_password=spec.get("staff_password", ""),
+            rate=float(spec.get("rate", TENANT_RATE)),
+            burst=float(spec.get("burst", TENANT_BURST)),
+            pinned=bool(spec.get("preload")) or tenant_id == default_id,
+        )
+    if default_id is not None and default_id not in configs:
+        raise ValueError(f"TENANT_DEFAULT {default_id!r} is not in TENANTS")
+    return configs, default_id
+
+
+class Tenant:
+    """One store's menu snapshot, chat/training models and admission bucket."""
+
+    __slots__ = ("config", "db", "ai", "trainer", "bucket", "opened_at", "last_used", "in_use", "evicted")
+
+    def __init__(self, config: TenantConfig):
+        self.config = config
+        self.db: MenuDatabase | None = None
+        self.ai: AIHandler | None = None
+        self.trainer: TrainingHandler | None = None
+        self.bucket = TokenBucket(config.rate, config.burst)
+        self.opened_at = self.last_used = time.monotonic()
+        self.in_use = 0        # requests holding this tenant (see TenantRegistry.hold)
+        self.evicted = False
+
+    def open_db(self):
+        try:
+            self.db = MenuDatabase(self.config.sheet_id)
+            logger.info("Google Sheets connected (%s).", self.config.id)
+        except Exception:
+            logger.exception("Google Sheets init failed (%s)", self.config.id)
+
+    def build_handlers(self):
+        """Build the chat and training models from the current snapshot."""
+        db = self.db
+        try:
+            self.ai = AIHandler(
+                menu_context=db.get_menu_context() if db else "",
+                staff_context=db.get_staff_context() if db else "",
+                restaurant_info=db.get_store_info_context() if db else "",
+                window_contexts=db.get_window_menu_contexts() if db else None,
+                restaurant_name=self.config.restaurant_name,
+            )
+            logger.info("Gemini AI ready (%s).", self.config.id)
+        except Exception:
+            logger.exception("Gemini init failed (%s)", self.config.id)
+        try:
+            self.trainer = TrainingHandler(menu_context=db.get_menu_context() if db else "")
+            logger.info("Training AI ready (%s).", self.config.id)
+        except Exception:
+            logger.exception("Training init failed (%s)", self.config.id)
+
+    def sync_ai_context(self):
+        """Push the current menu/staff/store snapshot into the chat model (rebuilds on change)."""
+        self.ai.update_menu_context(self.db.get_menu_context(), self.db.get_window_menu_contexts())
+        self.ai.update_staff_context(self.db.get_staff_context())
+        self.ai.update_restaurant_info(self.db.get_store_info_context())
+
+
+class TenantRegistry:
+    """LRU of loaded tenants with lazy, single-flight loading. Runs on the event loop."""
+
+    def __init__(self, configs: dict[str, TenantConfig], default_id: str | None,
+                 max_loaded: int = TENANT_MAX_LOADED, idle_ttl: float = TENANT_IDLE_TTL):
+        self.configs = configs
+        self.default_id = default_id
+        self.max_loaded = max_loaded
+        self.idle_ttl = idle_ttl
+        self.hosts = {host: config.id for config in configs.values() for host in config.hosts}
+        self._loaded: OrderedDict[str, Tenant] = OrderedDict()
+        self._loading: dict[str, asyncio.Future] = {}
+        self._swept = time.monotonic()
+        TENANTS_LOADED.labels().set_function(lambda: len(self._loaded))
+
+    def resolve(self, path: str, host: str) -> tuple[str | None, str]:
+        """(tenant id, path without the tenant prefix); id None = no tenant, "" = unknown prefix."""
+        if path.startswith(PATH_PREFIX):
+            tenant_id, _, rest = path[len(PATH_PREFIX):].partition("/")
+            return (tenant_id if tenant_id in self.configs else ""), "/" + rest
+        return self.hosts.get(host.split(":", 1)[0].lower(), self.default_id), path
+
+    def loaded(self) -> list[Tenant]:
+        return list(self._loaded.values())
+
+    def databases(self) -> list[MenuDatabase]:
+        return [tenant.db for tenant in self._loaded.values() if tenant.db is not None]
+
+    def cache_age(self) -> float:
+        """Age of the stalest loaded menu snapshot."""
+        return max((db.cache_age() for db in self.databases()), default=0.0)
+
+    async def preload(self):
+        """Open the pinned tenants' sheets; build_handlers() follows once the SDKs are imported."""
+        pinned = [Tenant(config) for config in self.configs.values() if config.pinned]
+        await asyncio.gather(*(asyncio.to_thread(tenant.open_db) for tenant in pinned))
+        for tenant in pinned:
+            self._loaded[tenant.config.id] = tenant
+
+    def build_handlers(self):
+        """Build models for the preloaded tenants (runs in a thread)."""
+        for tenant in self.loaded():
+            if tenant.ai is None:
+                tenant.build_handlers()
+
+    def close(self, timeout: float = 0):
+        """Stop every loaded store's sheet sync after a last push (runs in a thread at shutdown)."""
+        for db in self.databases():
+            db.close(timeout)
+
+    @asynccontextmanager
+    async def hold(self, tenant_id: str):
+        """The loaded tenant, kept open for the block even if it is evicted meanwhile."""
+        tenant = await self.get(tenant_id)
+        tenant.in_use += 1
+        try:
+            yield tenant
+        finally:
+            tenant.in_use -= 1
+            if tenant.evicted and not tenant.in_use:
+                self._close(tenant)
+
+    async def get(self, tenant_id: str) -> Tenant:
+        """The loaded tenant, loading it first if needed."""
+        now = time.monotonic()
+        if now - self._swept > SWEEP_INTERVAL:
+            self._evict(now)
+        tenant = self._loaded.get(tenant_id)
+        if tenant is not None and not self._needs_retry(tenant, now):
+            tenant.last_used = now
+            self._loaded.move_to_end(tenant_id)
+            TENANT_EVENTS.labels(event="hit").inc()
+            return tenant
+        future = self._loading.get(tenant_id)
+        if future is None:
+            TENANT_EVENTS.labels(event="load").inc()
+            future = self._loading[tenant_id] = asyncio.ensure_future(self._load(self.configs[tenant_id]))
+            future.add_done_callback(lambda _: self._loading.pop(tenant_id, None))
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _needs_retry(tenant: Tenant, now: float) -> bool:
+        return tenant.db is None and bool(tenant.config.sheet_id) and now - tenant.opened_at > TENANT_RETRY
+
+    async def _load(self, config: TenantConfig) -> Tenant:
+        start = time.perf_counter()
+        tenant = Tenant(config)
+        await asyncio.to_thread(tenant.open_db)
+        await asyncio.to_thread(tenant.build_handlers)
+        self._loaded[config.id] = tenant
+        self._loaded.move_to_end(config.id)
+        self._evict(time.monotonic())
+        logger.info("Tenant %s loaded in %.1fs (%d loaded)", config.id,
+                    time.perf_counter() - start, len(self._loaded))
+        return tenant
+
+    def _evict(self, now: float):
+        """Drop idle tenants, then the least recently used ones past max_loaded."""
+        self._swept = now
+        for tenant_id, tenant in list(self._loaded.items()):
+            if tenant.config.pinned:
+                continue
+            if len(self._loaded) > self.max_loaded or now - tenant.last_used > self.idle_ttl:
+                del self._loaded[tenant_id]
+                tenant.evicted = True
+                if not tenant.in_use:
+                    self._close(tenant)  # else the last request holding it closes it
+                TENANT_EVENTS.labels(event="evicted").inc()
+                logger.info("Tenant %s evicted (idle %.0fs)", tenant_id, now - tenant.last_used)
+
+    @staticmethod
+    def _close(tenant: Tenant):
+        if tenant.db is not None:
+            tenant.db.close()  # its sync thread pushes queued writes, then exits
+
+
+class TenantMiddleware:
+    """Pure ASGI middleware: resolves the tenant into request.state.tenant_id and
+    strips the /t/{tenant} prefix, so routes and route metrics stay tenant-free.
+    """
+
+    def __init__(self, app, registry: TenantRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        host = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"host"), "")
+        tenant_id, path = self.registry.resolve(scope["path"], host)
+        if tenant_id == "":
+            TENANT_EVENTS.labels(event="unknown").inc()
+            return await JSONResponse({"detail": "Unknown restaurant"}, status_code=404)(scope, receive, send)
+        if path != scope["path"]:
+            # In place, not a copy: outer middleware reads the matched route from this scope
+            raw_path = scope.get("raw_path") or scope["path"].encode("utf-8")
+            scope["path"] = path
+            scope["raw_path"] = b"/" + raw_path[len(PATH_PREFIX):].partition(b"/")[2]
+        scope.setdefault("state", {})["tenant_id"] = tenant_id
+        await self.app(scope, receive, send)
+
+
+registry = TenantRegistry(*load_configs())
@@ -0,0 +1,14 @@
+"""
+SUMI X Orator - Token estimation
+Cheap, dependency-free token estimate for prompt-size accounting.
+Gemini spends roughly one token per 4 ASCII characters and about one token
+per CJK character, which is close enough for budgeting and logging.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the Gemini token count of a string."""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
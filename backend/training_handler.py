@@ -3,16 +3,24 @@ SUMI X Orator - Training AI Handler
 Simulates a Canadian customer for staff English conversation training.
 """
 
-import os
 import json
 import logging
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-import google.generativeai as genai
+import usage
+from gemini_client import get_genai
+from history import HistoryManager
+from metrics import track_upstream
+from resilience import GEMINI, CircuitOpenError
+from tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# Customer lines served when the reply can't be parsed or Gemini is unavailable
+RETRY_REPLY = "Sorry, could you say that again?"
+FALLBACK_REPLY = "Sorry, I'm having trouble understanding. Could you repeat that?"
+
 TRAINING_PROMPT = """\
 You are a Canadian customer visiting "Guu Original Thurlow" izakaya in Vancouver for the first time.
 The user is a Japanese staff member practicing their English service skills.
@@ -43,11 +51,9 @@ class TrainingHandler:
     """AI that plays a customer for staff English training."""
 
     def __init__(self, menu_context: str = ""):
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY is not set")
-        genai.configure(api_key=api_key)
+        get_genai()  # fail fast if GEMINI_API_KEY is missing
         self._menu_context = menu_context
+        self._history = HistoryManager("training")
         self._build_model()
 
     def _build_model(self):
@@ -55,6 +61,8 @@ class TrainingHandler:
             menu_context=self._menu_context or "No menu items registered yet.",
         )
 
+        genai = get_genai()
+        self._system_tokens = estimate_tokens(system_instruction)
         self.model = genai.GenerativeModel(
             model_name="gemini-2.5-flash",
             system_instruction=system_instruction,
@@ -74,17 +82,20 @@ class TrainingHandler:
     def generate_response(self, user_message: str, history: list[dict] | None = None) -> dict:
         """Generate a training response as JSON."""
         try:
-            gemini_history = []
-            if history:
-                for msg in history[-20:]:
-                    role = "model" if msg["role"] == "assistant" else "user"
-                    gemini_history.append({"role": role, "parts": [msg["content"]]})
+            gemini_history = self._history.build(history)
 
-            turn_count = len(gemini_history) // 2 + 1
+            turn_count = len(history or []) // 2 + 1
             time_hint = f"[Turn {turn_count}] "
 
-            chat = self.model.start_chat(history=gemini_history)
-            response = chat.send_message(time_hint + user_message)
+            def attempt():
+                chat = self.model.start_chat(history=gemini_history)
+                with track_upstream("gemini", "training"):
+                    return chat.send_message(time_hint + user_message,
+                                             request_options={"timeout": GEMINI.timeout})
+
+            usage.check("gemini")
+            response = GEMINI.call(attempt, hedge=False)
+            usage.record_gemini(response, "gemini-2.5-flash", self._system_tokens)
             raw = response.text.strip()
 
             parsed = json.loads(raw)
@@ -95,12 +106,18 @@ class TrainingHandler:
         except json.JSONDecodeError:
             logger.exception("Training JSON parse error: %s", raw if 'raw' in dir() else "no response")
             return {
-                "customer_reply": "Sorry, could you say that again?",
+                "customer_reply": RETRY_REPLY,
+                "feedback_to_staff": "",
+            }
+        except (CircuitOpenError, usage.BudgetExhausted):
+            logger.warning("Gemini unavailable or over budget, serving training fallback")
+            return {
+                "customer_reply": FALLBACK_REPLY,
                 "feedback_to_staff": "",
             }
         except Exception:
             logger.exception("Training API error")
             return {
-                "customer_reply": "Sorry, I'm having trouble understanding. Could you repeat that?",
+                "customer_reply": FALLBACK_REPLY,
                 "feedback_to_staff": "",
             }
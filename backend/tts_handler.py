@@ -1,27 +1,88 @@
 """
 SUMI X Orator - TTS Handler
-Google Cloud Text-to-Speech with Neural2 voices.
+Google Cloud Text-to-Speech with Neural2 voices. Predictable utterances (menu
+names, phrase lessons, fallback replies) are pre-synthesized into a warm cache
+by tts_prewarm and served from memory.
+
+Audio comes in several encodings (AUDIO_FORMATS): MP3 plays everywhere, Ogg
+Opus is smaller at the same voice quality, and opus-low (16 kHz) is smaller
+still for congested restaurant Wi-Fi. The API has no bitrate
+setting, so the low profile lowers the sample rate. Callers choose a profile
+with a `format` field or the Accept header (see negotiate); the default is
+TTS_FORMAT.
+
+Environment:
+  TTS_FORMAT=mp3   profile used when the client doesn't ask for one
 """
 
 import os
 import json
 import base64
 import logging
+from typing import NamedTuple
 
-from google.cloud import texttospeech
 from google.oauth2.service_account import Credentials
 
+import usage
+from coalesce import SingleFlight
+from metrics import CACHE_EVENTS, track_upstream
+from resilience import TTS
+
 logger = logging.getLogger(__name__)
 
-# Natural-sounding Neural2 voices per language
+# Natural-sounding Neural2 voices per language. Japanese is spoken a little
+# slower: guests hear it to learn menu names and phrases.
 VOICE_MAP = {
-    "ja-JP": {"name": "ja-JP-Neural2-B", "language_code": "ja-JP"},
-    "en-US": {"name": "en-US-Neural2-F", "language_code": "en-US"},
-    "ko-KR": {"name": "ko-KR-Neural2-A", "language_code": "ko-KR"},
-    "zh-CN": {"name": "cmn-CN-Neural2-A", "language_code": "cmn-CN"},
-    "es-ES": {"name": "es-ES-Neural2-A", "language_code": "es-ES"},
-    "pt-BR": {"name": "pt-BR-Neural2-A", "language_code": "pt-BR"},
+    "ja-JP": {"name": "ja-JP-Neural2-B", "language_code": "ja-JP", "speaking_rate": 0.9},
+    "en-US": {"name": "en-US-Neural2-F", "language_code": "en-US", "speaking_rate": 1.0},
+    "ko-KR": {"name": "ko-KR-Neural2-A", "language_code": "ko-KR", "speaking_rate": 1.0},
+    "zh-CN": {"name": "cmn-CN-Neural2-A", "language_code": "cmn-CN", "speaking_rate": 1.0},
+    "es-ES": {"name": "es-ES-Neural2-A", "language_code": "es-ES", "speaking_rate": 1.0},
+    "pt-BR": {"name": "pt-BR-Neural2-A", "language_code": "pt-BR", "speaking_rate": 1.0},
+}
+
+
+class AudioFormat(NamedTuple):
+    encoding: str               # texttospeech.AudioEncoding member
+    media_type: str
+    sample_rate_hertz: int = 0  # 0 = the voice's native rate (24 kHz)
+
+
+AUDIO_FORMATS = {
+    "mp3": AudioFormat("MP3", "audio/mpeg"),
+    "opus": AudioFormat("OGG_OPUS", "audio/ogg; codecs=opus"),
+    "opus-low": AudioFormat("OGG_OPUS", "audio/ogg; codecs=opus", 16000),
 }
+TTS_FORMAT = os.getenv("TTS_FORMAT", "mp3")
+if TTS_FORMAT not in AUDIO_FORMATS:
+    raise ValueError(f"TTS_FORMAT must be one of {', '.join(AUDIO_FORMATS)}")
+
+# Accept media types -> profile
+_ACCEPT_FORMATS = {"audio/mpeg": "mp3", "audio/mp3": "mp3", "audio/ogg": "opus", "audio/opus": "opus"}
+
+
+def negotiate(requested: str | None = None, accept: str = "") -> str:
+    """Audio profile for a request: an explicit format wins, then the Accept
+    header's most preferred audio type; wildcards and ties get TTS_FORMAT.
+    """
+    if requested in AUDIO_FORMATS:
+        return requested
+    best, best_q = TTS_FORMAT, 0.0
+    for part in accept.split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        fmt = _ACCEPT_FORMATS.get(media_type) or (TTS_FORMAT if media_type in ("*/*", "audio/*") else None)
+        if fmt and (q > best_q or (q == best_q and fmt == TTS_FORMAT)):
+            best, best_q = fmt, q
+    return best
 
 
 class TTSHandler:
@@ -29,7 +90,14 @@ class TTSHandler:
 
     def __init__(self):
         creds = self._load_credentials()
+        # Imported here so grpc/protobuf load only when TTS is actually built
+        from google.cloud import texttospeech
+        self._texttospeech = texttospeech
         self.client = texttospeech.TextToSpeechClient(credentials=creds)
+        # Double taps / retries of the same text share one synthesis
+        self._flight = SingleFlight("tts", max_entries=64)
+        # (normalized text, voice name, format) -> audio, filled by tts_prewarm
+        self._warm: dict[tuple[str, str, str], bytes] = {}
         logger.info("Google Cloud TTS client initialized.")
 
     @staticmethod
@@ -51,20 +119,66 @@ class TTSHandler:
 
         raise RuntimeError("No Google credentials found for TTS")
 
-    def synthesize(self, text: str, lang: str = "ja-JP") -> bytes:
-        """Convert text to speech audio (MP3)."""
+    @staticmethod
+    def warm_key(text: str, lang: str, fmt: str = TTS_FORMAT) -> tuple[str, str, str]:
+        return " ".join(text.split()), VOICE_MAP.get(lang, VOICE_MAP["en-US"])["name"], fmt
+
+    def synthesize(self, text: str, lang: str = "ja-JP", idempotency_key: str | None = None,
+                   fmt: str = TTS_FORMAT) -> bytes:
+        """Convert text to speech audio in the given AUDIO_FORMATS profile."""
+        audio = self._warm.get(self.warm_key(text, lang, fmt))
+        CACHE_EVENTS.labels(cache="tts_warm", result="hit" if audio else "miss").inc()
+        if audio:
+            return audio
+        return self._synthesize(text, lang, fmt, idempotency_key)
+
+    def _synthesize(self, text: str, lang: str, fmt: str, idempotency_key: str | None = None) -> bytes:
         voice_config = VOICE_MAP.get(lang, VOICE_MAP["en-US"])
+        audio_format = AUDIO_FORMATS[fmt]
+        texttospeech = self._texttospeech
+
+        def attempt():
+            with track_upstream("tts", "synthesize"):
+                return self.client.synthesize_speech(
+                    input=texttospeech.SynthesisInput(text=text),
+                    voice=texttospeech.VoiceSelectionParams(
+                        language_code=voice_config["language_code"],
+                        name=voice_config["name"],
+                    ),
+                    audio_config=texttospeech.AudioConfig(
+                        audio_encoding=texttospeech.AudioEncoding[audio_format.encoding],
+                        sample_rate_hertz=audio_format.sample_rate_hertz,
+                        speaking_rate=voice_config["speaking_rate"],
+                        pitch=0.0,
+                    ),
+                    timeout=TTS.timeout,
+                )
+
+        def synthesize() -> bytes:
+            usage.check("tts")  # past the daily budget only replays are served
+            audio = TTS.guard(attempt).audio_content
+            usage.record_tts(text)
+            return audio
+
+        return self._flight.do({"text": text, "voice": voice_config, "format": fmt}, synthesize, idempotency_key)
+
+    # ------------------------------------------------------------------
+    # Warm cache (see tts_prewarm)
+    # ------------------------------------------------------------------
+    def is_warm(self, text: str, lang: str, fmt: str = TTS_FORMAT) -> bool:
+        return self.warm_key(text, lang, fmt) in self._warm
+
+    def warm(self, text: str, lang: str, fmt: str = TTS_FORMAT, audio: bytes | None = None) -> bytes:
+        """Put one utterance in the warm cache, synthesizing it unless its audio is given."""
+        if audio is None:
+            audio = self._synthesize(text, lang, fmt)
+        self._warm[self.warm_key(text, lang, fmt)] = audio
+        return audio
+
+    def retain_warm(self, keys: set[tuple[str, str, str]]) -> int:
+        """Drop warm entries outside `keys` (e.g. items taken off the menu); returns bytes held."""
+        self._warm = {k: v for k, v in self._warm.items() if k in keys}
+        return self.warm_bytes()
 
-        response = self.client.synthesize_speech(
-            input=texttospeech.SynthesisInput(text=text),
-            voice=texttospeech.VoiceSelectionParams(
-                language_code=voice_config["language_code"],
-                name=voice_config["name"],
-            ),
-            audio_config=texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=1.0,
-                pitch=0.0,
-            ),
-        )
-        return response.audio_content
+    def warm_bytes(self) -> int:
+        return sum(len(audio) for audio in self._warm.values())
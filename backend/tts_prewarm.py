@@ -0,0 +1,202 @@
+"""
+SUMI X Orator - TTS pre-warming
+The most frequently spoken strings are predictable: every menu item's name,
+the Japanese phrase lessons the chat prompt teaches (Onegaishimasu, Oishii,
+Gochisosama, Otsukaresama) and the fallback replies. Once after startup and
+whenever the menu snapshot changes, they are pre-synthesized for every voice
+in VOICE_MAP into TTSHandler's warm cache, so they play instantly even on the
+first request after a deploy.
+
+With several stores loaded (tenants.py) their names are merged; warm audio is
+shared, so a dish two stores both serve is synthesized once.
+
+Each utterance is warmed in every TTS_PREWARM_FORMATS profile (by default just
+TTS_FORMAT); requests for other profiles are synthesized on demand.
+
+Only utterances that are not already warm are synthesized (a menu change costs
+just its new names), with bounded concurrency and start rate so live /api/tts
+traffic keeps most of the TTS quota. The job stands down while the TTS budget
+is not in normal mode or the breaker is open, and retries on the next check.
+
+The job is opt-in: a full round is several hundred paid syntheses. With
+TTS_PREWARM_DIR on a persistent volume, warm audio is also written there and
+read back first, so a restart or another instance sharing the volume only
+synthesizes what changed since (delete the directory to drop stale clips).
+
+Environment:
+  TTS_PREWARM=0                   1 enables the job
+  TTS_PREWARM_DIR=                directory warm audio persists in (unset = memory only)
+  TTS_PREWARM_INTERVAL=60         seconds between menu snapshot checks
+  TTS_PREWARM_CONCURRENCY=2       syntheses in flight
+  TTS_PREWARM_RATE=4              syntheses started per second
+  TTS_PREWARM_MAX_BYTES=20000000  warm audio kept in memory
+  TTS_PREWARM_FORMATS=mp3         comma-separated AUDIO_FORMATS profiles to warm (default TTS_FORMAT)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable
+
+import usage
+from ai_handler import FALLBACK_REPLY, SYSTEM_TEMPLATE
+from menu_export import snapshot_hash
+from metrics import Counter
+from resilience import CircuitOpenError
+from training_handler import FALLBACK_REPLY as TRAINING_FALLBACK_REPLY, RETRY_REPLY
+from tts_handler import AUDIO_FORMATS, TTS_FORMAT, VOICE_MAP
+
+logger = logging.getLogger(__name__)
+
+TTS_PREWARM = os.getenv("TTS_PREWARM", "0") == "1"
+TTS_PREWARM_DIR = os.getenv("TTS_PREWARM_DIR", "")
+TTS_PREWARM_INTERVAL = float(os.getenv("TTS_PREWARM_INTERVAL", "60"))
+TTS_PREWARM_CONCURRENCY = int(os.getenv("TTS_PREWARM_CONCURRENCY", "2"))
+TTS_PREWARM_RATE = float(os.getenv("TTS_PREWARM_RATE", "4"))
+TTS_PREWARM_MAX_BYTES = int(os.getenv("TTS_PREWARM_MAX_BYTES", "20000000"))
+TTS_PREWARM_FORMATS = tuple(
+    fmt.strip() for fmt in os.getenv("TTS_PREWARM_FORMATS", TTS_FORMAT).split(",") if fmt.strip() in AUDIO_FORMATS)
+
+# 'Oishii!', '〇〇, Onegaishimasu!' ... as written in the chat prompt
+LESSON_PHRASES = tuple(dict.fromkeys(re.findall(r"'(?:〇〇, )?([A-Z][a-z]+!)'", SYSTEM_TEMPLATE)))
+FIXED_UTTERANCES = LESSON_PHRASES + (FALLBACK_REPLY, TRAINING_FALLBACK_REPLY, RETRY_REPLY)
+
+PREWARM_EVENTS = Counter(
+    "sumi_tts_prewarm_total", "TTS pre-warm utterances by outcome (loaded, synthesized, failed, skipped).",
+    ("outcome",))
+
+
+def utterances(dbs) -> list[tuple[str, str]]:
+    """(text, lang) pairs to keep warm, fixed lines first; Japanese names only in the ja-JP voice."""
+    texts = list(FIXED_UTTERANCES)
+    items = [item for db in dbs for item in db.get_all_items()]
+    texts += [item.name for item in items if item.name]
+    pairs = [(text, lang) for lang in VOICE_MAP for text in dict.fromkeys(texts)]
+    pairs += [(name, "ja-JP") for name in dict.fromkeys(item.name_ja for item in items if item.name_ja)]
+    return pairs
+
+
+class Prewarmer:
+    def __init__(self, concurrency: int = TTS_PREWARM_CONCURRENCY, rate: float = TTS_PREWARM_RATE,
+                 max_bytes: int = TTS_PREWARM_MAX_BYTES, formats: tuple[str, ...] = TTS_PREWARM_FORMATS,
+                 directory: str = TTS_PREWARM_DIR):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self.formats = formats
+        self.directory = Path(directory) if directory else None
+        self.warmed_hash: str | None = None
+
+    def _path(self, tts, text: str, lang: str, fmt: str) -> Path:
+        key = "\x1f".join(tts.warm_key(text, lang, fmt)).encode("utf-8")
+        return self.directory / f"{hashlib.sha256(key).hexdigest()[:32]}.{fmt}"
+
+    def _load(self, tts, missing: list[tuple[str, str, str]], held: int) -> int:
+        """Warm what the directory already holds, up to max_bytes; returns the clips loaded."""
+        loaded = 0
+        for utterance in missing:
+            if held >= self.max_bytes:
+                break
+            try:
+                audio = self._path(tts, *utterance).read_bytes()
+            except FileNotFoundError:
+                continue
+            if audio:
+                held += len(tts.warm(*utterance, audio=audio))
+                loaded += 1
+        return loaded
+
+    def _save(self, tts, text: str, lang: str, fmt: str, audio: bytes):
+        path = self._path(tts, text, lang, fmt)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(audio)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Cannot persist warm audio to %s", self.directory, exc_info=True)
+
+    async def run_once(self, tts, dbs) -> bool:
+        """Warm everything missing; False if the round stopped early."""
+        wanted = [(text, lang, fmt) for fmt in self.formats for text, lang in utterances(dbs)]
+        held = tts.retain_warm({tts.warm_key(*utterance) for utterance in wanted})
+        missing = [utterance for utterance in wanted if not tts.is_warm(*utterance)]
+        if missing and self.directory:
+            loaded = await asyncio.to_thread(self._load, tts, missing, held)
+            PREWARM_EVENTS.labels(outcome="loaded").inc(loaded)
+            if loaded:
+                logger.info("TTS pre-warm: %d clips loaded from %s", loaded, self.directory)
+                held = tts.warm_bytes()
+                missing = [utterance for utterance in missing if not tts.is_warm(*utterance)]
+        if not missing:
+            return True
+        start = time.perf_counter()
+        slots = asyncio.Semaphore(self.concurrency)
+        stats = {"synthesized": 0, "failed": 0, "chars": 0}
+        stop: list[str] = []
+
+        async def warm(text: str, lang: str, fmt: str):
+            nonlocal held
+            try:
+                with usage.scope("tts_prewarm", lang):
+                    audio = await asyncio.to_thread(tts.warm, text, lang, fmt)
+                if self.directory:
+                    await asyncio.to_thread(self._save, tts, text, lang, fmt, audio)
+                held += len(audio)
+                stats["synthesized"] += 1
+                stats["chars"] += len(text)
+                PREWARM_EVENTS.labels(outcome="synthesized").inc()
+            except (CircuitOpenError, usage.BudgetExhausted) as exc:
+                stop.append(type(exc).__name__)
+            except Exception:
+                stats["failed"] += 1
+                PREWARM_EVENTS.labels(outcome="failed").inc()
+                logger.warning("TTS pre-warm failed for %r (%s)", text[:40], lang, exc_info=True)
+            finally:
+                slots.release()
+
+        tasks = []
+        for text, lang, fmt in missing:
+            await slots.acquire()
+            if not stop and usage.mode("tts") != "normal":
+                stop.append("budget")
+            if not stop and held >= self.max_bytes:
+                stop.append("memory cap")
+            if stop:
+                slots.release()
+                break
+            tasks.append(asyncio.create_task(warm(text, lang, fmt)))
+            await asyncio.sleep(1 / self.rate)
+        await asyncio.gather(*tasks)
+
+        skipped = len(missing) - len(tasks)
+        PREWARM_EVENTS.labels(outcome="skipped").inc(skipped)
+        # A round that only stood down again (e.g. budget still exhausted) is logged quietly
+        log = logger.info if stats["synthesized"] or stats["failed"] else logger.debug
+        log("TTS pre-warm: %d utterances, %d synthesized (%d chars), %d failed, %d skipped%s; %.0f KB warm, %.1fs",
+            len(wanted), stats["synthesized"], stats["chars"], stats["failed"], skipped,
+            f" ({stop[0]})" if stop else "", held / 1024, time.perf_counter() - start)
+        return not stop
+
+    async def run_forever(self, get_tts: Callable, get_dbs: Callable):
+        """Re-warm after startup and whenever a loaded menu snapshot changes."""
+        while True:
+            tts, dbs = get_tts(), get_dbs()
+            if tts is not None:
+                menu_hash = ",".join(sorted(snapshot_hash(db) for db in dbs))
+                if menu_hash != self.warmed_hash:
+                    try:
+                        if await self.run_once(tts, dbs):
+                            self.warmed_hash = menu_hash
+                    except Exception:
+                        logger.exception("TTS pre-warm round failed")
+            await asyncio.sleep(TTS_PREWARM_INTERVAL)
+
+
+prewarmer = Prewarmer()
@@ -0,0 +1,243 @@
+"""
+SUMI X Orator - Usage and cost accounting
+Records Gemini usage_metadata (input, output and thinking tokens, plus an
+estimate of how much of the input is the system prompt) and TTS character
+counts for every upstream call, aggregated per endpoint, language and hour
+(restaurant time). Daily spend is checked against optional budgets: past
+BUDGET_SHORT_AT of a budget, chat answers come from the light model; at
+100% only cached/replayed results are served until midnight.
+
+Endpoints set the scope (endpoint, lang) with usage.scope(); handlers call
+record_gemini()/record_tts() in the request thread after the upstream returns.
+
+Environment:
+  GEMINI_DAILY_BUDGET=0    USD per day for all Gemini calls (0 = unlimited)
+  TTS_DAILY_BUDGET=0       USD per day for Text-to-Speech
+  BUDGET_SHORT_AT=0.8      share of a budget that switches to shorter answers
+  USAGE_PRICES             JSON merged into the price table (USD per 1M tokens/chars)
+  USAGE_LOG_INTERVAL=900   seconds between usage summary log lines (0 = off)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+TZ = ZoneInfo("America/Vancouver")
+
+DAILY_BUDGETS = {
+    "gemini": float(os.getenv("GEMINI_DAILY_BUDGET", "0") or 0),
+    "tts": float(os.getenv("TTS_DAILY_BUDGET", "0") or 0),
+}
+BUDGET_SHORT_AT = float(os.getenv("BUDGET_SHORT_AT", "0.8"))
+USAGE_LOG_INTERVAL = float(os.getenv("USAGE_LOG_INTERVAL", "900"))
+KEEP_HOURS = 72
+
+# USD per 1M tokens (Gemini, thinking billed as output) or characters (TTS)
+PRICES: dict[str, dict[str, float]] = {
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "gemini-2.5-flash-lite": {"input": 0.10, "output": 0.40},
+    "gemini-2.5-pro": {"input": 1.25, "output": 10.00},
+    "tts-neural2": {"chars": 16.00},
+}
+PRICES.update(json.loads(os.getenv("USAGE_PRICES", "{}") or "{}"))
+
+MODES = ("normal", "short", "cache_only")
+
+LLM_TOKENS = Counter(
+    "sumi_llm_tokens_total", "Gemini tokens by endpoint and kind (input, output, system).", ("endpoint", "kind"))
+TTS_CHARS = Counter(
+    "sumi_tts_characters_total", "Characters sent to Text-to-Speech by endpoint.", ("endpoint",))
+UPSTREAM_COST = Counter(
+    "sumi_upstream_cost_usd_total", "Estimated upstream spend in USD.", ("upstream", "endpoint"))
+BUDGET_MODE = Gauge(
+    "sumi_budget_mode", "Budget mode per upstream (0 normal, 1 short, 2 cache only).", ("upstream",))
+
+_scope: ContextVar[tuple[str, str]] = ContextVar("usage_scope", default=("other", "unknown"))
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of an upstream call once today's budget is spent."""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"{upstream} daily budget reached")
+        self.upstream = upstream
+
+
+@contextmanager
+def scope(endpoint: str, lang: str = "unknown"):
+    """Attribute upstream calls made inside the block (and its threadpool calls)."""
+    token = _scope.set((endpoint, lang))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def _empty() -> dict[str, float]:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "thinking_tokens": 0,
+            "system_tokens": 0, "tts_chars": 0, "cost_usd": 0.0}
+
+
+class UsageLedger:
+    """Hourly usage rows plus per-day spend; thread-safe and in memory."""
+
+    def __init__(self, budgets: dict[str, float] | None = None):
+        self.budgets = dict(DAILY_BUDGETS if budgets is None else budgets)
+        self._hours: dict[tuple[str, str, str], dict[str, float]] = defaultdict(_empty)
+        self._spend: dict[tuple[str, str], float] = defaultdict(float)
+        self._modes: dict[str, str] = {}
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+        for upstream in self.budgets:
+            BUDGET_MODE.labels(upstream=upstream).set_function(
+                lambda upstream=upstream: MODES.index(self.mode(upstream)))
+
+    def record(self, upstream: str, cost: float, **amounts: int):
+        endpoint, lang = _scope.get()
+        now = datetime.now(TZ)
+        hour, day = now.strftime("%Y-%m-%dT%H"), now.strftime("%Y-%m-%d")
+        with self._lock:
+            row = self._hours[(hour, endpoint, lang)]
+            row["calls"] += 1
+            row["cost_usd"] += cost
+            for key, value in amounts.items():
+                row[key] += value
+            self._spend[(day, upstream)] += cost
+            if len(self._hours) > 2000:
+                self._prune(now)
+        UPSTREAM_COST.labels(upstream=upstream, endpoint=endpoint).inc(cost)
+        self._check_mode(upstream)
+        self._maybe_log()
+
+    def _prune(self, now: datetime):
+        cutoff = (now - timedelta(hours=KEEP_HOURS)).strftime("%Y-%m-%dT%H")
+        for key in [k for k in self._hours if k[0] < cutoff]:
+            del self._hours[key]
+        day_cutoff = cutoff[:10]
+        for key in [k for k in self._spend if k[0] < day_cutoff]:
+            del self._spend[key]
+
+    def spent_today(self, upstream: str) -> float:
+        day = datetime.now(TZ).strftime("%Y-%m-%d")
+        with self._lock:
+            return self._spend.get((day, upstream), 0.0)
+
+    def mode(self, upstream: str) -> str:
+        """normal, short (past BUDGET_SHORT_AT of the budget) or cache_only."""
+        budget = self.budgets.get(upstream, 0)
+        if budget <= 0:
+            return "normal"
+        used = self.spent_today(upstream) / budget
+        if used >= 1:
+            return "cache_only"
+        return "short" if used >= BUDGET_SHORT_AT else "normal"
+
+    def _check_mode(self, upstream: str):
+        mode = self.mode(upstream)
+        if self._modes.get(upstream, "normal") != mode:
+            logger.warning("%s budget mode: %s ($%.2f of $%.2f today)", upstream, mode,
+                           self.spent_today(upstream), self.budgets.get(upstream, 0))
+        self._modes[upstream] = mode
+
+    def check(self, upstream: str):
+        """Raise BudgetExhausted when only cached results may be served."""
+        if self.mode(upstream) == "cache_only":
+            raise BudgetExhausted(upstream)
+
+    def _maybe_log(self):
+        if USAGE_LOG_INTERVAL <= 0 or time.monotonic() - self._last_log < USAGE_LOG_INTERVAL:
+            return
+        self._last_log = time.monotonic()
+        totals = self.snapshot(hours=1)["by_endpoint"]
+        logger.info("Usage last hour: %s", ", ".join(
+            f"{endpoint} {t['calls']:.0f} calls {t['input_tokens']:.0f}/{t['output_tokens']:.0f} tok "
+            f"{t['tts_chars']:.0f} chars ${t['cost_usd']:.4f}" for endpoint, t in sorted(totals.items())) or "none")
+
+    def snapshot(self, hours: int = 24) -> dict:
+        """Totals by endpoint, language and hour for the last `hours` hours, plus budgets."""
+        cutoff = (datetime.now(TZ) - timedelta(hours=hours - 1)).strftime("%Y-%m-%dT%H")
+        by_endpoint: dict[str, dict[str, float]] = defaultdict(_empty)
+        by_lang: dict[str, dict[str, float]] = defaultdict(_empty)
+        by_hour: dict[str, dict[str, float]] = defaultdict(_empty)
+        with self._lock:
+            rows = [(k, dict(v)) for k, v in self._hours.items() if k[0] >= cutoff]
+        for (hour, endpoint, lang), row in rows:
+            for bucket in (by_endpoint[endpoint], by_lang[lang], by_hour[hour]):
+                for key, value in row.items():
+                    bucket[key] += value
+        for totals in by_endpoint.values():
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+            totals["system_share"] = round(
+                totals["system_tokens"] / totals["input_tokens"], 3) if totals["input_tokens"] else 0.0
+        return {
+            "hours": hours,
+            "by_endpoint": dict(by_endpoint),
+            "by_lang": dict(by_lang),
+            "by_hour": dict(sorted(by_hour.items())),
+            "budgets": {upstream: {"daily_usd": budget, "spent_usd": round(self.spent_today(upstream), 6),
+                                   "mode": self.mode(upstream)}
+                        for upstream, budget in self.budgets.items()},
+        }
+
+
+ledger = UsageLedger()
+
+
+def mode(upstream: str) -> str:
+    return ledger.mode(upstream)
+
+
+def check(upstream: str):
+    ledger.check(upstream)
+
+
+def _price(name: str) -> dict[str, float]:
+    if name in PRICES:
+        return PRICES[name]
+    # Versioned names (gemini-2.5-flash-001) use their family's price
+    family = max((k for k in PRICES if name.startswith(k)), key=len, default="gemini-2.5-flash")
+    return PRICES[family]
+
+
+def record_gemini(response, model_name: str, system_tokens: int = 0):
+    """Record one Gemini response's usage_metadata; never raises."""
+    try:
+        meta = getattr(response, "usage_metadata", None)
+        input_tokens = int(getattr(meta, "prompt_token_count", 0) or 0)
+        output_tokens = int(getattr(meta, "candidates_token_count", 0) or 0)
+        thinking_tokens = int(getattr(meta, "thoughts_token_count", 0) or 0)
+        price = _price(model_name)
+        cost = (input_tokens * price.get("input", 0)
+                + (output_tokens + thinking_tokens) * price.get("output", 0)) / 1e6
+        endpoint = _scope.get()[0]
+        LLM_TOKENS.labels(endpoint=endpoint, kind="input").inc(input_tokens)
+        LLM_TOKENS.labels(endpoint=endpoint, kind="output").inc(output_tokens + thinking_tokens)
+        LLM_TOKENS.labels(endpoint=endpoint, kind="system").inc(min(system_tokens, input_tokens))
+        ledger.record("gemini", cost, input_tokens=input_tokens, output_tokens=output_tokens,
+                      thinking_tokens=thinking_tokens, system_tokens=min(system_tokens, input_tokens))
+    except Exception:
+        logger.warning("Could not record Gemini usage", exc_info=True)
+
+
+def record_tts(text: str, voice: str = "tts-neural2"):
+    """Record one synthesis; TTS bills per input character."""
+    try:
+        chars = len(text)
+        cost = chars * _price(voice).get("chars", 0) / 1e6
+        TTS_CHARS.labels(endpoint=_scope.get()[0]).inc(chars)
+        ledger.record("tts", cost, tts_chars=chars)
+    except Exception:
+        logger.warning("Could not record TTS usage", exc_info=True)
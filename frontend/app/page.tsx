@@ -111,6 +111,7 @@ const LANGUAGES = [
 // Types
 // ---------------------------------------------------------------------------
 interface MenuItem {
+  id?: string;
   "メニュー名(英)": string;
   "メニュー名(日)"?: string;
   カテゴリ?: string;
@@ -121,6 +122,7 @@ interface MenuItem {
   アレルギー情報?: string;
   写真URL?: string;
   担当シェフ名?: string;
+  images?: { thumb: string; detail: string };
 }
 
 interface AvailabilityItem {
@@ -137,8 +139,26 @@ interface Message {
 }
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+
+// Resized photo variants are served by the backend; its URLs are relative to it
+function withApiImages(items: MenuItem[] = []): MenuItem[] {
+  return items.map((item) =>
+    item.images
+      ? { ...item, images: { thumb: API_URL + item.images.thumb, detail: API_URL + item.images.detail } }
+      : item
+  );
+}
 const POLL_INTERVAL = 60_000;
 
+// Ogg Opus replies are smaller; browsers that can't play it get the MP3 default
+function preferredAudioFormat(): string | undefined {
+  try {
+    return new Audio().canPlayType('audio/ogg; codecs="opus"') ? "opus" : undefined;
+  } catch {
+    return undefined;
+  }
+}
+
 function getSessionId(): string {
   try {
     let id = sessionStorage.getItem("guu_session");
@@ -152,11 +172,16 @@ function getSessionId(): string {
   }
 }
 
+// Session header lets the backend rate-limit per phone, not per restaurant Wi-Fi IP
+function jsonHeaders(): Record<string, string> {
+  return { "Content-Type": "application/json", "X-Session-ID": getSessionId() };
+}
+
 function trackEvent(event: string, data = "", lang = "") {
   try {
     fetch(`${API_URL}/api/analytics`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: jsonHeaders(),
       body: JSON.stringify({ session_id: getSessionId(), event, data, lang }),
     }).catch(() => {});
   } catch {}
@@ -182,13 +207,21 @@ export default function Home() {
   const [activeTab, setActiveTab] = useState<"chat" | "menu">("menu");
   const [menuRegular, setMenuRegular] = useState<MenuItem[]>([]);
   const [menuSpecial, setMenuSpecial] = useState<MenuItem[]>([]);
+  // Hash of the menu copy above; sent with chat so replies can name dishes by id
+  const [menuHash, setMenuHash] = useState<string | null>(null);
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
   const recognitionRef = useRef<any>(null);
-  const sendMessageRef = useRef<(text: string) => void>();
+  const sendMessageRef = useRef<(text: string, spoken?: boolean) => void>();
 
   const t = useMemo(() => I18N[sttLang] || I18N["en-US"], [sttLang]);
+  const menuById = useMemo(
+    () => new Map<string, MenuItem>(
+      [...menuRegular, ...menuSpecial].filter((item) => item.id).map((item): [string, MenuItem] => [item.id!, item])
+    ),
+    [menuRegular, menuSpecial]
+  );
 
   // ------------------------------------------------------------------
   // Check if a menu item is currently available
@@ -230,29 +263,40 @@ export default function Home() {
 
     // Load menu: localStorage cache → static fallback → backend API
     const cached = (() => { try { const c = localStorage.getItem("guu_menu"); return c ? JSON.parse(c) : null; } catch { return null; } })();
+    const local: Promise<{ regular?: MenuItem[]; special?: MenuItem[]; hash?: string } | null> = cached
+      ? Promise.resolve(cached)
+      // First-time visitor: load static cache from same origin (instant); its hash is in the version file
+      : Promise.all([
+          fetch("/menu-cache.json").then((r) => r.ok ? r.json() : null).catch(() => null),
+          fetch("/menu-cache.version.json").then((r) => r.ok ? r.json() : null).catch(() => null),
+        ]).then(([menu, version]) => menu ? { ...menu, hash: version?.hash } : null);
     if (cached) {
-      setMenuRegular(cached.regular || []);
-      setMenuSpecial(cached.special || []);
-    } else {
-      // First-time visitor: load static cache from same origin (instant)
-      fetch("/menu-cache.json")
-        .then((r) => r.ok ? r.json() : null)
-        .then((data) => {
-          if (data) {
-            setMenuRegular(data.regular || []);
-            setMenuSpecial(data.special || []);
-          }
-        })
-        .catch(() => {});
+      setMenuRegular(withApiImages(cached.regular));
+      setMenuSpecial(withApiImages(cached.special));
+      setMenuHash(cached.hash ?? null);
     }
 
-    // Always fetch fresh data from backend in background
-    fetch(`${API_URL}/api/menu`)
-      .then((r) => r.ok ? r.json() : null)
+    // Then refresh from the backend, unless the local copy is already current
+    local
+      .then(async (data) => {
+        if (data && !cached) {
+          setMenuRegular(withApiImages(data.regular));
+          setMenuSpecial(withApiImages(data.special));
+          setMenuHash(data.hash ?? null);
+        }
+        const v = await fetch(`${API_URL}/api/menu/version`).then((r) => r.ok ? r.json() : null).catch(() => null);
+        if (data?.hash && v?.hash === data.hash) {
+          if (!cached) { try { localStorage.setItem("guu_menu", JSON.stringify(data)); } catch {} }
+          return null;
+        }
+        const r = await fetch(`${API_URL}/api/menu`);
+        return r.ok ? r.json() : null;
+      })
       .then((data) => {
         if (data) {
-          setMenuRegular(data.regular || []);
-          setMenuSpecial(data.special || []);
+          setMenuRegular(withApiImages(data.regular));
+          setMenuSpecial(withApiImages(data.special));
+          setMenuHash(data.hash ?? null);
           try { localStorage.setItem("guu_menu", JSON.stringify(data)); } catch {}
         }
       })
@@ -297,7 +341,7 @@ export default function Home() {
     const texts = assistantMsgs.map((m) => m.content);
     fetch(`${API_URL}/api/translate`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: jsonHeaders(),
       body: JSON.stringify({ texts, lang: sttLang }),
     })
       .then((r) => (r.ok ? r.json() : null))
@@ -325,8 +369,10 @@ export default function Home() {
   // ------------------------------------------------------------------
   // Send message (with energy level)
   // ------------------------------------------------------------------
+  // A turn spoken into the mic is answered aloud: the backend synthesizes the reply
+  // during /api/chat (speak) and we play its audio_url, with no separate TTS request
   const sendMessage = useCallback(
-    async (text: string) => {
+    async (text: string, spoken = false) => {
       if (!text.trim() || isLoading) return;
 
       const userMsg: Message = {
@@ -352,29 +398,38 @@ export default function Home() {
 
         const res = await fetch(`${API_URL}/api/chat`, {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: jsonHeaders(),
           body: JSON.stringify({
             message: text.trim(),
             history,
             lang: sttLang,
             energy_context: { message_count: messageCount, drink_mentions: drinkMentions },
+            ...(menuHash && menuById.size > 0 ? { menu_version: menuHash } : {}),
+            ...(spoken ? { speak: true, audio_format: preferredAudioFormat() } : {}),
           }),
         });
 
         if (res.status === 429) throw new Error("RATE_LIMIT");
         if (!res.ok) throw new Error("API error");
         const data = await res.json();
+        // Dishes in our menu copy come back as ids (menu_item_ids), the rest as full rows
+        const menuItems: MenuItem[] = [
+          ...(data.menu_item_ids ?? []).flatMap((id: string) => menuById.get(id) ?? []),
+          ...withApiImages(data.menu_items),
+        ];
 
         const aiMsg: Message = {
           id: (Date.now() + 1).toString(),
           role: "assistant",
           content: data.reply,
-          menuItems:
-            data.menu_items?.length > 0 ? data.menu_items : undefined,
+          menuItems: menuItems.length > 0 ? menuItems : undefined,
           allergyQuery: data.allergy_query || false,
         };
         setMessages((prev) => [...prev, aiMsg]);
         setBackendDown(false);
+        if (data.audio_url) {
+          new Audio(API_URL + data.audio_url).play().catch(() => {});
+        }
       } catch (err) {
         const isRateLimit = err instanceof Error && err.message === "RATE_LIMIT";
         if (!isRateLimit) setBackendDown(true);
@@ -390,7 +445,7 @@ export default function Home() {
         setIsLoading(false);
       }
     },
-    [isLoading, messages, t, sttLang]
+    [isLoading, messages, t, sttLang, menuHash, menuById]
   );
 
   useEffect(() => {
@@ -437,7 +492,7 @@ export default function Home() {
       setIsRecording(false);
       setTimeout(() => {
         const text = inputRef.current?.value || "";
-        if (text.trim()) sendMessageRef.current?.(text);
+        if (text.trim()) sendMessageRef.current?.(text, true);
       }, 300);
     };
     recognition.onerror = () => setIsRecording(false);
@@ -456,7 +511,7 @@ export default function Home() {
     try {
       await fetch(`${API_URL}/api/rating`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ rating, message_count: msgCount, lang: sttLang }),
       });
     } catch {}
@@ -467,7 +522,7 @@ export default function Home() {
     try {
       await fetch(`${API_URL}/api/rating`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ rating, message_count: 0, lang: `menu_${sttLang}` }),
       });
     } catch {}
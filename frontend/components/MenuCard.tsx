@@ -9,13 +9,14 @@ interface MenuCardProps {
     アレルギー情報?: string;
     写真URL?: string;
     担当シェフ名?: string;
+    images?: { thumb: string; detail: string };
   };
   soldOut?: boolean;
   allergyOnly?: boolean;
 }
 
 export default function MenuCard({ item, soldOut, allergyOnly }: MenuCardProps) {
-  const photoUrl = item["写真URL"];
+  const photoUrl = item.images?.detail || item["写真URL"];
 
   if (allergyOnly) {
     return (
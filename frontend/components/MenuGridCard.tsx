@@ -7,6 +7,7 @@ interface MenuItem {
   写真URL?: string;
   担当シェフ名?: string;
   おすすめフラグ?: boolean | string;
+  images?: { thumb: string; detail: string };
 }
 
 interface MenuGridCardProps {
@@ -40,7 +41,7 @@ export default function MenuGridCard({ item, soldOut, recommended, onTap }: Menu
       {item["写真URL"] ? (
         <div className={`w-full h-28 overflow-hidden ${isDrink ? "bg-[#EDE4D8]" : ""}`}>
           <img
-            src={item["写真URL"]}
+            src={item.images?.thumb || item["写真URL"]}
             alt={item["メニュー名(英)"]}
             loading="lazy"
             decoding="async"
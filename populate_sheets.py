@@ -1,25 +1,18 @@
 """
-Populate Google Sheets with Guu Original Thurlow menu data (v2 schema).
-Creates sheets: レギュラーメニュー / スペシャルメニュー / 店舗情報
-Keeps existing: Staff / Ratings
-Run once: python populate_sheets.py
-"""
+Seed Google Sheets with Guu Original Thurlow menu data (v2 schema).
+Syncs sheets: レギュラーメニュー / スペシャルメニュー / 店舗情報
+Keeps existing: Staff / Ratings, and the staff's live 提供中 / おすすめフラグ / 常駐フラグ
+Only changed cells are written (see backend/sheet_sync.py); safe to re-run.
 
-import gspread
-from google.oauth2.service_account import Credentials
+  GOOGLE_SHEET_ID=... GOOGLE_SHEETS_CREDENTIALS_FILE=key.json python populate_sheets.py --dry-run
+"""
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+import os
+import sys
 
-# --- Credentials ---
-CREDS_FILE = "/Users/takamineyasuyuki/Downloads/sumi-x-brand/guu/guu2026-bf7c5f3119f8.json"
-SHEET_ID = "1_f6FvqFl8DOVebscUNO8-fQwsEpiKYjQHHlOxJTaCdk"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 
-creds = Credentials.from_service_account_file(CREDS_FILE, scopes=SCOPES)
-client = gspread.authorize(creds)
-spreadsheet = client.open_by_key(SHEET_ID)
+from sheet_sync import TabSpec, main_cli  # noqa: E402
 
 # =====================================================================
 # Sheet 1: レギュラーメニュー
@@ -268,75 +261,13 @@ STORE_INFO = [
 
 
 # =====================================================================
-# Write sheets
+# Sync
 # =====================================================================
+TABS = [
+    TabSpec("レギュラーメニュー", REGULAR_HEADER, REGULAR_MENU, checkboxes=("提供中",)),
+    TabSpec("スペシャルメニュー", SPECIAL_HEADER, SPECIAL_MENU, checkboxes=("おすすめフラグ", "常駐フラグ")),
+    TabSpec("店舗情報", STORE_HEADER, STORE_INFO, key="項目名", cols=2),
+]
 
-def get_or_create_sheet(title: str, rows: int = 1000, cols: int = 12):
-    try:
-        return spreadsheet.worksheet(title)
-    except gspread.WorksheetNotFound:
-        return spreadsheet.add_worksheet(title, rows=rows, cols=cols)
-
-
-def setup_checkboxes(sheet, col_letter: str, data_rows: int):
-    """Set checkbox data validation on a column (rows 2 to data_rows+1)."""
-    range_str = f"{col_letter}2:{col_letter}{data_rows + 1}"
-    body = {
-        "requests": [{
-            "setDataValidation": {
-                "range": {
-                    "sheetId": sheet.id,
-                    "startRowIndex": 1,
-                    "endRowIndex": data_rows + 1,
-                    "startColumnIndex": ord(col_letter) - ord("A"),
-                    "endColumnIndex": ord(col_letter) - ord("A") + 1,
-                },
-                "rule": {
-                    "condition": {"type": "BOOLEAN"},
-                    "showCustomUi": True,
-                },
-            }
-        }]
-    }
-    spreadsheet.batch_update(body)
-
-
-# --- レギュラーメニュー ---
-print("Setting up レギュラーメニュー sheet...")
-regular_sheet = get_or_create_sheet("レギュラーメニュー", rows=1000, cols=12)
-regular_sheet.clear()
-regular_sheet.append_row(REGULAR_HEADER)
-regular_sheet.append_rows(REGULAR_MENU)
-# Set checkboxes on A (提供中)
-setup_checkboxes(regular_sheet, "A", len(REGULAR_MENU))
-print(f"  {len(REGULAR_MENU)} items written (with checkbox on A).")
-
-# --- スペシャルメニュー ---
-print("Setting up スペシャルメニュー sheet...")
-special_sheet = get_or_create_sheet("スペシャルメニュー", rows=200, cols=12)
-special_sheet.clear()
-special_sheet.append_row(SPECIAL_HEADER)
-special_sheet.append_rows(SPECIAL_MENU)
-# Set checkboxes on J (おすすめフラグ) and K (常駐フラグ)
-setup_checkboxes(special_sheet, "J", len(SPECIAL_MENU))
-setup_checkboxes(special_sheet, "K", len(SPECIAL_MENU))
-print(f"  {len(SPECIAL_MENU)} items written (with checkboxes on J & K).")
-
-# --- 店舗情報 ---
-print("Setting up 店舗情報 sheet...")
-store_sheet = get_or_create_sheet("店舗情報", rows=50, cols=2)
-store_sheet.clear()
-store_sheet.append_row(STORE_HEADER)
-store_sheet.append_rows(STORE_INFO)
-print(f"  {len(STORE_INFO)} entries written.")
-
-# --- Delete old sheets (Menu, Config) if they exist ---
-for old_name in ["Menu", "Config"]:
-    try:
-        old_sheet = spreadsheet.worksheet(old_name)
-        print(f"Deleting old '{old_name}' sheet...")
-        spreadsheet.del_worksheet(old_sheet)
-    except gspread.WorksheetNotFound:
-        pass
-
-print(f"\nDone! https://docs.google.com/spreadsheets/d/{SHEET_ID}")
+if __name__ == "__main__":
+    main_cli(TABS, description=__doc__)